@@ -0,0 +1,107 @@
+"""
+Замер времени выборки корзины пользователя при росте таблицы "cart".
+
+Запуск: python -m benchmarks.cart_lookup [--sizes 10000 100000 1000000]
+
+Для каждого размера таблица заполняется синтетическими позициями, затем
+измеряется среднее время запроса корзины (как в sql_select_cart_lines) и
+выводится план запроса. С индексами время не зависит от размера таблицы.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+for _name in ('BOT_TOKEN', 'CREATOR_ID', 'GROUP_ID', 'PAY_TOKEN', 'PROXY'):
+    os.environ.setdefault(_name, '0')
+
+import migrations  # noqa: E402
+from sqlite_db import (  # noqa: E402
+    CART_LINE_QUERY,
+    PRAGMA_PROFILE,
+    Database,
+)
+
+
+LOOKUP_QUERY = f"{CART_LINE_QUERY} WHERE c.user_id = ? ORDER BY c.product_id"
+
+PRODUCTS = 1000
+LINES_PER_USER = 5
+
+
+async def create_schema(database: Database) -> None:
+    """Создаёт таблицы магазина и применяет миграции."""
+    connection = database.connection
+    await migrations.create_base_tables(connection)
+    await connection.executemany(
+        "INSERT INTO products (img, name, description, price) "
+        "VALUES (?, ?, ?, ?)",
+        ((f'img{i}', f'Товар {i}', 'Описание', 100 + i)
+         for i in range(PRODUCTS))
+    )
+    await connection.commit()
+    await migrations.migrate(connection)
+
+
+async def fill_cart(database: Database, start: int, size: int) -> None:
+    """Дозаполняет таблицу "cart" до size строк."""
+    connection = database.connection
+    users = range(start // LINES_PER_USER, size // LINES_PER_USER)
+    await connection.executemany(
+        "INSERT INTO users (user_id, name) VALUES (?, ?)",
+        ((user_id, 'user') for user_id in users)
+    )
+    await connection.executemany(
+        "INSERT INTO cart (user_id, product_id, quantity) VALUES (?, ?, ?)",
+        ((user_id, product_id, 1)
+         for user_id in users
+         for product_id in random.sample(range(1, PRODUCTS + 1),
+                                         LINES_PER_USER))
+    )
+    await connection.commit()
+
+
+async def measure(database: Database, users: int, lookups: int) -> float:
+    """Среднее время выборки корзины случайного пользователя в мс."""
+    connection = database.connection
+    started = time.perf_counter()
+    for _ in range(lookups):
+        async with connection.execute(
+                LOOKUP_QUERY, (random.randrange(users),)
+        ) as cursor:
+            await cursor.fetchall()
+    return (time.perf_counter() - started) / lookups * 1000
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--lookups', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        pragmas = {**PRAGMA_PROFILE, 'foreign_keys': 'OFF'}
+        async with Database(os.path.join(directory, 'bench.db'),
+                            pragmas=pragmas) as database:
+            await create_schema(database)
+            async with database.connection.execute(
+                    f"EXPLAIN QUERY PLAN {LOOKUP_QUERY}", (0,)
+            ) as cursor:
+                for row in await cursor.fetchall():
+                    print(f'План: {row[-1]}')
+
+            print(f'{"строк в cart":>14} | {"мс на выборку":>14}')
+            filled = 0
+            for size in sorted(args.sizes):
+                await fill_cart(database, filled, size)
+                filled = size
+                latency = await measure(database, size // LINES_PER_USER,
+                                        args.lookups)
+                print(f'{size:>14} | {latency:>14.4f}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
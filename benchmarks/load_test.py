@@ -0,0 +1,472 @@
+"""
+Нагрузочный тест бота целиком: подменный Telegram Bot API и синтетические
+пользователи.
+
+Запуск: python -m benchmarks.load_test [--users 2000] [--think 0.5]
+
+Поднимается локальный aiohttp-сервер, который отвечает на методы Bot API
+как Telegram: getUpdates выдаёт обновления синтетических пользователей,
+остальные методы (sendMessage, sendPhoto, editMessageMedia, sendInvoice...)
+возвращают правдоподобные результаты. Бот - настоящий Dispatcher с
+роутерами и middleware из bot.py - опрашивает сервер через long polling,
+база - временная SQLite с тестовым каталогом.
+
+Каждый пользователь проходит сценарий покупки: /start, /search, /shop,
+листание стрелками, добавление в корзину, /cart, /pay, pre-checkout и
+успешная оплата. Кнопки нажимаются по callback_data из последней
+клавиатуры, которую бот прислал в чат. Следующий шаг пользователь делает
+после обработки предыдущего и паузы think.
+
+В конце выводятся обновления в секунду, перцентили задержки по шагам (от
+появления обновления в getUpdates до конца его обработки), запросы к БД и
+к Bot API на обновление. Лимиты запросов к Bot API (API_RATE,
+API_CHAT_RATE) по умолчанию сняты, чтобы мерить сам бот. Сервер работает в
+том же процессе, что и бот, поэтому результат - нижняя оценка пропускной
+способности.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import deque
+
+_directory = tempfile.TemporaryDirectory()
+os.environ['DB_PATH'] = os.path.join(_directory.name, 'load.db')
+os.environ.setdefault('BOT_TOKEN', '1:load-test')
+for _name in ('CREATOR_ID', 'GROUP_ID', 'PAY_TOKEN', 'PROXY'):
+    os.environ.setdefault(_name, '0')
+for _name in ('API_RATE', 'API_BURST', 'API_CHAT_RATE', 'API_CHAT_BURST'):
+    os.environ.setdefault(_name, '1000000')
+
+from aiogram import Bot, Dispatcher  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.enums.parse_mode import ParseMode  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+from aiohttp import web  # noqa: E402
+
+import sqlite_db  # noqa: E402
+from bot import create_scheduler, setup_dispatcher, setup_session  # noqa
+from cart_buffer import cart_buffer  # noqa: E402
+from config import config  # noqa: E402
+from core.utils.callback_data import Op, codec  # noqa: E402
+from metrics import metrics  # noqa: E402
+from user_cache import known_users  # noqa: E402
+
+
+"""Виды шагов сценария"""
+COMMAND, PRESS, PRE_CHECKOUT, PAYMENT = range(4)
+
+FIRST_USER_ID = 10_000_000
+WORDS = ('чайник', 'кружка', 'лампа', 'рюкзак', 'зонт', 'плед', 'термос',
+         'блокнот')
+
+
+class FakeTelegram:
+    """
+    Подменный Bot API. Хранит очередь обновлений для getUpdates и последнее
+    сообщение бота с inline-клавиатурой в каждом чате, по которому строятся
+    нажатия кнопок.
+
+    :ivar calls: Количество вызовов по методам Bot API
+    """
+    def __init__(self) -> None:
+        self.calls: dict[str, int] = {}
+        self._updates: deque[dict] = deque()
+        self._ready = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._query_ids = itertools.count(1)
+        self._chats: dict[int, dict] = {}
+        self._invoices: dict[int, int] = {}
+        self._paid: dict[int, int] = {}
+
+    def app(self) -> web.Application:
+        """aiohttp-приложение с методами Bot API."""
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Ответ на вызов метода Bot API."""
+        method = request.match_info['method']
+        data = await request.post()
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if method == 'getUpdates':
+            result = await self.get_updates(data)
+        else:
+            result = self.answer(method, data)
+        return web.json_response({'ok': True, 'result': result})
+
+    async def get_updates(self, data) -> list[dict]:
+        """Long polling: обновления начиная с offset, не больше limit."""
+        offset = int(data.get('offset', 0))
+        while self._updates and self._updates[0]['update_id'] < offset:
+            self._updates.popleft()
+        if not self._updates:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(),
+                                       int(data.get('timeout', 0)) or 1)
+            except asyncio.TimeoutError:
+                pass
+        return list(itertools.islice(self._updates,
+                                     int(data.get('limit', 100))))
+
+    def push(self, update: dict) -> None:
+        """Ставит обновление в очередь getUpdates."""
+        self._updates.append(update)
+        self._ready.set()
+
+    def answer(self, method: str, data) -> object:
+        """Результат метода Bot API, кроме getUpdates."""
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Shop',
+                    'username': 'shop_bot'}
+        if method == 'sendMessage':
+            return self._remember(self._message(
+                int(data['chat_id']), data, text=data['text']
+            ))
+        if method == 'sendPhoto':
+            return self._remember(self._message(
+                int(data['chat_id']), data, photo=self._photo(data['photo']),
+                caption=data.get('caption', '')
+            ))
+        if method == 'editMessageMedia':
+            chat_id = int(data['chat_id'])
+            message = self._message(chat_id, data, photo=self._photo(
+                json.loads(data['media'])['media']
+            ))
+            message['message_id'] = int(data['message_id'])
+            return self._remember(message)
+        if method == 'sendMediaGroup':
+            return [
+                self._message(int(data['chat_id']), {},
+                              photo=self._photo(photo['media']))
+                for photo in json.loads(data['media'])
+            ]
+        if method == 'sendInvoice':
+            chat_id = int(data['chat_id'])
+            total = sum(price['amount']
+                        for price in json.loads(data['prices']))
+            self._invoices[chat_id] = total
+            return self._message(chat_id, {}, invoice={
+                'title': data['title'], 'description': data['description'],
+                'start_parameter': '', 'currency': data['currency'],
+                'total_amount': total
+            })
+        return True
+
+    def command(self, user_id: int, text: str) -> dict:
+        """Обновление: пользователь отправил текст (команду)."""
+        return self._update(message=self._user_message(user_id, text=text))
+
+    def press(self, user_id: int, op: Op) -> dict | None:
+        """
+        Обновление: пользователь нажал кнопку с кодом действия op в
+        последнем сообщении бота. None, если такой кнопки нет.
+        """
+        message = self._chats.get(user_id)
+        if message is None:
+            return None
+        for row in message['reply_markup']['inline_keyboard']:
+            for button in row:
+                data = button.get('callback_data')
+                if data and codec.unpack(user_id, data)[0] == op:
+                    return self._update(callback_query={
+                        'id': str(next(self._query_ids)),
+                        'from': self._user(user_id),
+                        'chat_instance': str(user_id),
+                        'message': message,
+                        'data': data
+                    })
+        return None
+
+    def pre_checkout(self, user_id: int) -> dict | None:
+        """
+        Обновление: пользователь оплачивает выставленный счёт. None, если
+        счёта нет (корзина была пуста).
+        """
+        total = self._invoices.pop(user_id, None)
+        if total is None:
+            return None
+        self._paid[user_id] = total
+        return self._update(pre_checkout_query={
+            'id': str(next(self._query_ids)),
+            'from': self._user(user_id),
+            'currency': 'RUB',
+            'total_amount': total,
+            'invoice_payload': 'Payment through a bot',
+            'order_info': {
+                'name': f'Покупатель {user_id}',
+                'phone_number': '+70000000000',
+                'email': f'{user_id}@example.com',
+                'shipping_address': {
+                    'country_code': 'RU', 'state': '',
+                    'city': 'Санкт-Петербург', 'street_line1': 'Невский, 1',
+                    'street_line2': '', 'post_code': '190000'
+                }
+            }
+        })
+
+    def payment(self, user_id: int) -> dict | None:
+        """Обновление: сообщение об успешной оплате счёта."""
+        total = self._paid.pop(user_id, None)
+        if total is None:
+            return None
+        return self._update(message=self._user_message(
+            user_id, successful_payment={
+                'currency': 'RUB', 'total_amount': total,
+                'invoice_payload': 'Payment through a bot',
+                'telegram_payment_charge_id': f'tg{user_id}',
+                'provider_payment_charge_id': f'pr{user_id}'
+            }
+        ))
+
+    def _update(self, **content) -> dict:
+        return {'update_id': next(self._update_ids), **content}
+
+    def _message(self, chat_id: int, data, **content) -> dict:
+        message = {'message_id': next(self._message_ids),
+                   'date': int(time.time()),
+                   'chat': {'id': chat_id, 'type': 'private'}, **content}
+        markup = json.loads(data.get('reply_markup') or 'null')
+        if markup and 'inline_keyboard' in markup:
+            message['reply_markup'] = markup
+        return message
+
+    def _remember(self, message: dict) -> dict:
+        """Запоминает сообщение с inline-клавиатурой как последнее в чате."""
+        if 'reply_markup' in message:
+            self._chats[message['chat']['id']] = message
+        return message
+
+    def _user_message(self, user_id: int, **content) -> dict:
+        return {'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': self._user(user_id), **content}
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False,
+                'first_name': f'Пользователь {user_id}'}
+
+    @staticmethod
+    def _photo(file_id: str) -> list[dict]:
+        return [{'file_id': file_id, 'file_unique_id': file_id,
+                 'width': 1280, 'height': 960}]
+
+
+class LoadTestDispatcher(Dispatcher):
+    """
+    Dispatcher, сообщающий о завершении обработки каждого обновления: по
+    update_id завершается ожидание в pending.
+    """
+    def __init__(self, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.pending: dict[int, asyncio.Future] = {}
+
+    async def feed_update(self, bot: Bot, update: Update, **kwargs):
+        try:
+            return await super().feed_update(bot, update, **kwargs)
+        finally:
+            waiter = self.pending.pop(update.update_id, None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(None)
+
+
+def user_script(rng: random.Random, browse: int) -> list[tuple]:
+    """Сценарий покупки: шаги (название, вид, аргумент)."""
+    word = rng.choice(WORDS)
+    script = [('/start', COMMAND, '/start'),
+              ('/search', COMMAND, f'/search {word}'),
+              ('/shop', COMMAND, '/shop')]
+    for _ in range(rng.randint(1, 2)):
+        script += [('SHOP_NEXT', PRESS, Op.SHOP_NEXT)] * rng.randint(1,
+                                                                    browse)
+        script.append(('ADD_CART', PRESS, Op.ADD_CART))
+    script += [('/cart', COMMAND, '/cart'),
+               ('CART_INC', PRESS, Op.CART_INC),
+               ('/pay', COMMAND, '/pay'),
+               ('pre_checkout', PRE_CHECKOUT, None),
+               ('successful_payment', PAYMENT, None)]
+    return script
+
+
+class LoadTest:
+    """
+    Прогон сценариев пользователей через бота.
+
+    :ivar latencies: Задержки обработки в секундах по шагам сценария
+    :ivar skipped: Шаги, для которых не нашлось кнопки или счёта
+    """
+    def __init__(self, server: FakeTelegram, dp: LoadTestDispatcher,
+                 think: float) -> None:
+        self.server = server
+        self.dp = dp
+        self.think = think
+        self.latencies: dict[str, list[float]] = {}
+        self.skipped = 0
+
+    async def run_user(self, user_id: int, script: list[tuple],
+                       rng: random.Random) -> None:
+        """Проходит сценарий одного пользователя шаг за шагом."""
+        await asyncio.sleep(rng.uniform(0, self.think))
+        for name, kind, argument in script:
+            if kind == COMMAND:
+                update = self.server.command(user_id, argument)
+            elif kind == PRESS:
+                update = self.server.press(user_id, argument)
+            elif kind == PRE_CHECKOUT:
+                update = self.server.pre_checkout(user_id)
+            else:
+                update = self.server.payment(user_id)
+            if update is None:
+                self.skipped += 1
+                continue
+
+            waiter = asyncio.get_running_loop().create_future()
+            self.dp.pending[update['update_id']] = waiter
+            started = time.perf_counter()
+            self.server.push(update)
+            await waiter
+            self.latencies.setdefault(name, []).append(
+                time.perf_counter() - started
+            )
+            await asyncio.sleep(self.think * rng.uniform(0.5, 1.5))
+
+
+async def seed_catalog(products: int) -> None:
+    """Заполняет каталог тестовыми товарами."""
+    for number in range(1, products + 1):
+        word = WORDS[number % len(WORDS)]
+        await sqlite_db.sql_add_product({
+            'photo': f'photo-{number}',
+            'name': f'{word.capitalize()} {number}',
+            'description': f'Отличный {word} для дома',
+            'price': 100 + number,
+            'photos': [(320, 240, f'photo-{number}-s'),
+                       (1280, 960, f'photo-{number}')]
+        })
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Перцентиль q (0..1) отсортированного списка."""
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def report(test: LoadTest, server: FakeTelegram, elapsed: float,
+           dropped: dict[str, int]) -> None:
+    """Выводит итоги прогона."""
+    updates = sum(len(values) for values in test.latencies.values())
+    print(f'Обновлений: {updates} за {elapsed:.2f} с '
+          f'({updates / elapsed:.0f} в секунду), пропущено шагов: '
+          f'{test.skipped}, отброшено ограничением частоты: '
+          f'{sum(dropped.values())} {dropped or ""}')
+
+    print(f'\n{"шаг":<20} | {"n":>7} | {"p50 мс":>8} | {"p95 мс":>8} | '
+          f'{"p99 мс":>8} | {"max мс":>8}')
+    everything = []
+    for name, values in [*test.latencies.items(), ('всего', everything)]:
+        if name != 'всего':
+            everything += values
+        values.sort()
+        print(f'{name:<20} | {len(values):>7} | '
+              + ' | '.join(f'{percentile(values, q) * 1000:>8.2f}'
+                           for q in (0.5, 0.95, 0.99, 1.0)))
+
+    print(f'\n{"запрос к БД":<30} | {"вызовов":>8} | {"на обн.":>7} | '
+          f'{"ср. мс":>7} | {"p99 мс":>7}')
+    queries = 0
+    for labels, histogram in sorted(
+            metrics.histogram('db_seconds').items(),
+            key=lambda item: -item[1].count
+    ):
+        queries += histogram.count
+        print(f'{dict(labels)["function"]:<30} | {histogram.count:>8} | '
+              f'{histogram.count / updates:>7.2f} | '
+              f'{histogram.sum / histogram.count * 1000:>7.3f} | '
+              f'{histogram.quantile(0.99) * 1000:>7.3f}')
+    print(f'{"всего":<30} | {queries:>8} | {queries / updates:>7.2f}')
+
+    api_calls = sum(calls for method, calls in server.calls.items()
+                    if method != 'getUpdates')
+    errors = sum(metrics.counter('handler_errors_total').values())
+    print(f'\nЗапросов к Bot API: {api_calls} ({api_calls / updates:.2f} на '
+          f'обновление), опросов getUpdates: '
+          f'{server.calls.get("getUpdates", 0)}, ошибок обработчиков: '
+          f'{errors}')
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--browse', type=int, default=3,
+                        help='наибольшее число нажатий стрелки подряд')
+    parser.add_argument('--think', type=float, default=0.5,
+                        help='средняя пауза пользователя между шагами, с')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    server = FakeTelegram()
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', 0).start()
+    port = runner.addresses[0][1]
+
+    await sqlite_db.sql_start()
+    await seed_catalog(args.products)
+    metrics.reset()
+
+    bot = Bot(token=config.bot_token.get_secret_value(),
+              parse_mode=ParseMode.HTML,
+              session=AiohttpSession(api=TelegramAPIServer.from_base(
+                  f'http://127.0.0.1:{port}'
+              )))
+    scheduler = create_scheduler()
+    setup_session(bot, scheduler)
+    dp = LoadTestDispatcher(storage=MemoryStorage())
+    throttling = setup_dispatcher(dp)
+    polling = asyncio.create_task(
+        dp.start_polling(bot, handle_signals=False, polling_timeout=1)
+    )
+
+    rng = random.Random(args.seed)
+    test = LoadTest(server, dp, args.think)
+    started = time.perf_counter()
+    users = asyncio.ensure_future(asyncio.gather(*(
+        test.run_user(FIRST_USER_ID + number,
+                      user_script(rng, args.browse),
+                      random.Random(rng.random()))
+        for number in range(args.users)
+    )))
+    try:
+        await asyncio.wait((users, polling),
+                           return_when=asyncio.FIRST_COMPLETED)
+        if not users.done():
+            raise RuntimeError('Опрос getUpdates остановился до конца теста')
+        report(test, server, time.perf_counter() - started,
+               throttling.dropped)
+    finally:
+        users.cancel()
+        if not polling.done():
+            await dp.stop_polling()
+        await polling
+        await scheduler.close()
+        await known_users.close()
+        await cart_buffer.close()
+        await sqlite_db.sql_close()
+        await runner.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
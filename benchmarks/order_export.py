@@ -0,0 +1,84 @@
+"""
+Замер памяти и времени выгрузки заказов при росте таблицы "orders".
+
+Запуск: python -m benchmarks.order_export [--sizes 10000 100000 1000000]
+
+Для каждого размера таблица дозаполняется синтетическими заказами, затем
+заказы выгружаются в CSV (в /dev/null) через export_orders. Пиковая память
+(tracemalloc) не должна зависеть от размера таблицы.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+_directory = tempfile.TemporaryDirectory()
+os.environ['DB_PATH'] = os.path.join(_directory.name, 'bench.db')
+for _name in ('BOT_TOKEN', 'CREATOR_ID', 'GROUP_ID', 'PAY_TOKEN', 'PROXY'):
+    os.environ.setdefault(_name, '0')
+
+import sqlite_db  # noqa: E402
+from core.utils.order_export import export_orders  # noqa: E402
+
+
+USERS = 1000
+
+
+async def fill_orders(start: int, size: int) -> None:
+    """Дозаполняет таблицу "orders" до size заказов."""
+    async with sqlite_db.pool.writer() as connection:
+        if start == 0:
+            await connection.executemany(
+                "INSERT INTO users (user_id, name) VALUES (?, ?)",
+                ((user_id, 'user') for user_id in range(USERS))
+            )
+        await connection.executemany(
+            """
+            INSERT INTO orders (user_id, order_id, created_at, currency,
+                                total_amount, first_name, name, phone_number,
+                                email, country_code, city, street_line1,
+                                post_code)
+            VALUES (?, ?, ?, 'RUB', ?, 'Иван', 'Иван Иванов', '+79990000000',
+                    'ivan@example.com', 'RU', 'Санкт-Петербург',
+                    'Невский проспект, 1', '190000')
+            """,
+            ((order_id % USERS, order_id, 1_700_000_000 + order_id,
+              10_000 + order_id % 5000)
+             for order_id in range(start, size))
+        )
+        await connection.commit()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    await sqlite_db.sql_start()
+    try:
+        print(f'{"заказов":>10} | {"пик памяти, КБ":>15} | {"секунд":>8}')
+        filled = 0
+        for size in sorted(args.sizes):
+            await fill_orders(filled, size)
+            filled = size
+
+            tracemalloc.start()
+            started = time.perf_counter()
+            with open(os.devnull, 'w', encoding='utf-8', newline='') as file:
+                count = await export_orders(file)
+            elapsed = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            assert count == size
+            print(f'{size:>10} | {peak / 1024:>15.1f} | {elapsed:>8.2f}')
+    finally:
+        await sqlite_db.sql_close()
+        _directory.cleanup()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
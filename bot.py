@@ -2,12 +2,27 @@ import asyncio
 import logging
 
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.enums.parse_mode import ParseMode
 
 import sqlite_db
+from cart_buffer import cart_buffer
 from config import config
-from core.handlers import basic, admin, cart, pay
+from core.handlers import basic, admin, callbacks, cart, pay, search
+from core.middlewares.message_tracker import MessageTrackerMiddleware
+from core.middlewares.metrics import (
+    ApiMetricsMiddleware,
+    HandlerMetricsMiddleware,
+)
+from core.middlewares.request_scheduler import RequestSchedulerMiddleware
+from core.middlewares.throttling import ThrottlingMiddleware
+from core.utils.broadcast import broadcaster
+from core.utils.fsm_storage import create_storage
+from core.utils.message_registry import registry
+from core.utils.metrics_server import start_metrics_server
+from core.utils.request_scheduler import RequestScheduler
+from core.utils.webhook import run_webhook
+from metrics import metrics
+from user_cache import known_users
 
 
 logging.basicConfig(
@@ -16,24 +31,86 @@ logging.basicConfig(
 )
 
 
-async def main():
-    """Запуск бота и регистрация хэндлеров/роутеров"""
-    storage = MemoryStorage()
-    bot = Bot(token=config.bot_token.get_secret_value(),
-              parse_mode=ParseMode.HTML)
-    dp = Dispatcher(storage=storage)
+def create_scheduler() -> RequestScheduler:
+    """Планировщик запросов к Bot API с лимитами из настроек."""
+    return RequestScheduler(rate=config.api_rate,
+                            burst=config.api_burst,
+                            chat_rate=config.api_chat_rate,
+                            chat_burst=config.api_chat_burst)
+
+
+def setup_session(bot: Bot, scheduler: RequestScheduler) -> None:
+    """Регистрация middleware сессии бота (запросов к Bot API)."""
+    bot.session.middleware(MessageTrackerMiddleware(registry))
+    bot.session.middleware(
+        RequestSchedulerMiddleware(scheduler,
+                                   max_retries=config.api_max_retries)
+    )
+    bot.session.middleware(ApiMetricsMiddleware(metrics))
+
+
+def setup_dispatcher(dp: Dispatcher) -> ThrottlingMiddleware:
+    """
+    Регистрация middleware и роутеров диспетчера. Возвращает middleware
+    ограничения частоты обновлений (для статистики отброшенных).
+    """
+    throttling = ThrottlingMiddleware(config.throttle_limits)
+    dp.update.outer_middleware(throttling)
+    handler_metrics = HandlerMetricsMiddleware(metrics)
+    for observer in (dp.message, dp.callback_query, dp.inline_query,
+                     dp.shipping_query, dp.pre_checkout_query):
+        observer.middleware(handler_metrics)
 
     dp.include_routers(
         basic.router,
         cart.router,
         pay.router,
-        admin.router
+        admin.router,
+        search.router,
+        callbacks.router
     )
+    return throttling
+
+
+async def main():
+    """Запуск бота и регистрация хэндлеров/роутеров"""
+    storage = await create_storage(config.fsm_storage,
+                                   ttl=config.fsm_ttl,
+                                   redis_url=config.redis_url,
+                                   db_path=config.db_path)
+    bot = Bot(token=config.bot_token.get_secret_value(),
+              parse_mode=ParseMode.HTML)
+    scheduler = create_scheduler()
+    setup_session(bot, scheduler)
+    dp = Dispatcher(storage=storage)
+    throttling = setup_dispatcher(dp)
 
+    maintenance = metrics_server = None
     try:
+        if config.metrics_port:
+            metrics_server = await start_metrics_server(
+                metrics, config.metrics_host, config.metrics_port
+            )
         await sqlite_db.sql_start()
         logging.info("✅ База данных успешно подключена")
-        await dp.start_polling(bot)
+        await known_users.warm()
+        maintenance = asyncio.create_task(
+            sqlite_db.sql_maintenance(config.db_checkpoint_interval)
+        )
+        await broadcaster.resume(bot)
+        if config.run_mode == 'webhook':
+            await run_webhook(
+                dp,
+                bot,
+                host=config.webhook_host,
+                port=config.webhook_port,
+                path=config.webhook_path,
+                url=config.webhook_url,
+                secret=config.webhook_secret.get_secret_value()
+            )
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
     except asyncio.CancelledError:
         logging.info("🛑 Работа бота остановлена по запросу")
     except RuntimeError:
@@ -42,9 +119,21 @@ async def main():
         logging.error(f"💥 Критическая ошибка в работе бота: {ex}",
                       exc_info=True)
     finally:
+        if maintenance:
+            maintenance.cancel()
+        await broadcaster.close()
+        await scheduler.close()
+        logging.info(f"Планировщик запросов к API: {scheduler.metrics()}")
+        logging.info(f"Отброшено обновлений: {throttling.dropped}")
         await bot.session.close()
         await storage.close()
-        await sqlite_db.db.close()
+        await known_users.close()
+        await cart_buffer.close()
+        await sqlite_db.sql_close()
+        if metrics_server:
+            await metrics_server.cleanup()
+        if config.metrics_dump:
+            logging.info(f"Метрики за время работы:\n{metrics.summary()}")
         logging.info("📴 Сессия бота корректно завершена")
 
 
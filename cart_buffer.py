@@ -0,0 +1,110 @@
+import asyncio
+import logging
+
+import sqlite_db
+from config import config
+from user_cache import known_users
+
+
+class CartBuffer:
+    """
+    Буфер отложенной записи корзины (write-behind). Нажатия "добавить в
+    корзину" и удаления копятся в памяти, изменения одной позиции
+    схлопываются, а раз в window секунд всё накопленное записывается в
+    таблицу "cart" одной транзакцией. Перед чтением корзины (/cart, /pay)
+    и при остановке бота буфер сбрасывается принудительно.
+
+    :ivar window: Окно накопления изменений в секундах
+    """
+    def __init__(self, window: float = 0.5) -> None:
+        self.window = window
+        self._deltas: dict[tuple[int, int], int] = {}
+        self._deletions: set[tuple[int, int]] = set()
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        """Количество позиций корзины с незаписанными изменениями."""
+        return len(self._deltas.keys() | self._deletions)
+
+    def add(self, user_id: int, product_id: int, quantity: int = 1) -> None:
+        """Изменяет количество товара в корзине на quantity (отложенно)."""
+        key = (int(user_id), int(product_id))
+        self._deltas[key] = self._deltas.get(key, 0) + quantity
+        self._schedule()
+
+    def delete(self, user_id: int, product_id: int) -> None:
+        """Удаляет позицию из корзины (отложенно)."""
+        key = (int(user_id), int(product_id))
+        self._deltas.pop(key, None)
+        self._deletions.add(key)
+        self._schedule()
+
+    async def flush(self, user_id: int | None = None) -> None:
+        """
+        Записывает накопленные изменения одной транзакцией: только корзины
+        user_id или, без аргумента, все. Сначала записываются новые
+        пользователи (known_users), на которых ссылается корзина: если их
+        записать не удалось, изменения остаются в буфере до повторной
+        записи, иначе строки корзины были бы пропущены как ссылки на
+        несуществующих пользователей.
+        """
+        if not await known_users.flush():
+            self._schedule()
+            return
+        async with self._lock:
+            if user_id is None:
+                deltas, self._deltas = self._deltas, {}
+                deletions, self._deletions = self._deletions, set()
+            else:
+                deltas = {key: self._deltas.pop(key)
+                          for key in list(self._deltas) if key[0] == user_id}
+                deletions = {key for key in self._deletions
+                             if key[0] == user_id}
+                self._deletions -= deletions
+
+            changes = [(*key, delta) for key, delta in deltas.items()
+                       if delta]
+            if not await sqlite_db.sql_apply_cart_changes(changes,
+                                                          list(deletions)):
+                self._restore(deltas, deletions)
+
+    def _restore(self, deltas: dict[tuple[int, int], int],
+                 deletions: set[tuple[int, int]]) -> None:
+        """
+        Возвращает в буфер изменения, которые не удалось записать, и
+        планирует повторную запись. Изменения, накопленные за время записи,
+        применяются после возвращённых: удаление позиции, сделанное позже,
+        отменяет её возвращённые изменения.
+        """
+        deleted_since = set(self._deletions)
+        self._deletions |= deletions
+        for key, delta in deltas.items():
+            if key not in deleted_since:
+                self._deltas[key] = self._deltas.get(key, 0) + delta
+        self._schedule()
+
+    async def close(self) -> None:
+        """Останавливает таймер и записывает все изменения."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+    def _schedule(self) -> None:
+        """Запускает отложенную запись, если она ещё не запланирована."""
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        """Записывает изменения по истечении окна накопления."""
+        await asyncio.sleep(self.window)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logging.error(f"Ошибка записи буфера корзины: {e}", exc_info=True)
+
+
+cart_buffer = CartBuffer(config.cart_flush_window)
@@ -0,0 +1,162 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterable
+
+
+class Product:
+    """
+    Компактная запись товара каталога.
+
+    :ivar id: Идентификатор товара в таблице "products"
+    :ivar img: file_id изображения товара в Telegram
+    :ivar name: Название товара
+    :ivar description: Описание товара
+    :ivar price: Цена товара
+    :ivar category_id: Идентификатор категории в таблице "categories"
+    """
+    __slots__ = ('id', 'img', 'name', 'description', 'price', 'category_id')
+
+    def __init__(
+            self,
+            id: int,
+            img: str | None,
+            name: str,
+            description: str | None,
+            price: int | float,
+            category_id: int | None = None
+    ) -> None:
+        self.id = id
+        self.img = img
+        self.name = name
+        self.description = description
+        self.price = price
+        self.category_id = category_id
+
+    def __repr__(self) -> str:
+        return f'Product(id={self.id}, name={self.name!r})'
+
+
+SORT_ID = 0
+SORT_PRICE = 1
+SORT_PRICE_DESC = 2
+
+
+class ProductFilter:
+    """
+    Условия выборки товаров каталога. Нулевое значение поля - условие не
+    задано. Поля передаются в callback_data кнопок как целые числа.
+
+    :ivar category_id: Только товары категории
+    :ivar tag_id: Только товары с тегом
+    :ivar sort: Порядок товаров (SORT_ID, SORT_PRICE, SORT_PRICE_DESC)
+    :ivar min_price: Цена не меньше
+    :ivar max_price: Цена не больше
+    """
+    __slots__ = ('category_id', 'tag_id', 'sort', 'min_price', 'max_price')
+
+    def __init__(
+            self,
+            category_id: int = 0,
+            tag_id: int = 0,
+            sort: int = SORT_ID,
+            min_price: int = 0,
+            max_price: int = 0
+    ) -> None:
+        self.category_id = category_id
+        self.tag_id = tag_id
+        self.sort = sort
+        self.min_price = min_price
+        self.max_price = max_price
+
+    def fields(self) -> tuple[int, int, int, int, int]:
+        """Поля фильтра для callback_data (обратно - ProductFilter(*поля))."""
+        return (self.category_id, self.tag_id, self.sort, self.min_price,
+                self.max_price)
+
+    def sorted_by(self, sort: int) -> 'ProductFilter':
+        """Тот же фильтр с другим порядком товаров."""
+        return ProductFilter(self.category_id, self.tag_id, sort,
+                             self.min_price, self.max_price)
+
+    def __repr__(self) -> str:
+        return f'ProductFilter{self.fields()}'
+
+
+class Catalog:
+    """
+    Кэш каталога товаров в памяти процесса. Хранит товары по id и
+    упорядоченный список id, что даёт соседние товары (keyset по id) и
+    номер товара для карусели без обращения к БД. Обновляется при добавлении и удалении товаров
+    (write-through из sqlite_db).
+
+    :ivar loaded: Загружен ли каталог из БД
+    :ivar version: Счётчик изменений каталога
+    """
+    def __init__(self) -> None:
+        self._products: dict[int, Product] = {}
+        self._ids: list[int] = []
+        self.loaded = False
+        self.version = 0
+
+    @property
+    def count(self) -> int:
+        """Количество товаров в каталоге."""
+        return len(self._ids)
+
+    def load(self, rows: Iterable[tuple]) -> None:
+        """Заполняет кэш строками таблицы "products"."""
+        products = [Product(*row) for row in rows]
+        self._products = {product.id: product for product in products}
+        self._ids = sorted(self._products)
+        self.loaded = True
+        self.version += 1
+
+    def add(self, product: Product) -> None:
+        """Добавляет товар в кэш (или заменяет товар с тем же id)."""
+        if product.id not in self._products:
+            insort(self._ids, product.id)
+        self._products[product.id] = product
+        self.version += 1
+
+    def remove(self, product_id: int) -> None:
+        """Удаляет товар из кэша, если он там есть."""
+        if self._products.pop(product_id, None) is None:
+            return
+        del self._ids[bisect_left(self._ids, product_id)]
+        self.version += 1
+
+    def get(self, product_id: int) -> Product | None:
+        """Возвращает товар по id или None."""
+        return self._products.get(product_id)
+
+    def index_of(self, product_id: int) -> int | None:
+        """
+        Возвращает порядковый номер товара (с 1, в порядке id) или None,
+        если товара нет в каталоге.
+        """
+        position = bisect_left(self._ids, product_id)
+        if position == len(self._ids) or self._ids[position] != product_id:
+            return None
+        return position + 1
+
+    def next_after(self, product_id: int) -> Product | None:
+        """
+        Возвращает товар, следующий по id за product_id, а после последнего -
+        первый товар. None, если каталог пуст.
+        """
+        if not self._ids:
+            return None
+        position = bisect_right(self._ids, product_id) % len(self._ids)
+        return self._products[self._ids[position]]
+
+    def prev_before(self, product_id: int) -> Product | None:
+        """
+        Возвращает товар, предшествующий по id товару product_id, а перед
+        первым - последний товар. None, если каталог пуст.
+        """
+        if not self._ids:
+            return None
+        position = bisect_left(self._ids, product_id) - 1
+        return self._products[self._ids[position]]
+
+
+catalog = Catalog()
@@ -9,6 +9,49 @@ class Settings(BaseSettings):
     group_id: SecretStr
     pay_token: SecretStr
     proxy: SecretStr
+    callback_secret: SecretStr = SecretStr('')
+    db_path: str = 'data/shop.db'
+    db_pool_size: int = 4
+    db_journal_mode: str = 'WAL'
+    db_synchronous: str = 'NORMAL'
+    db_mmap_size: int = 256 * 1024 * 1024
+    db_cache_size: int = -16000
+    db_temp_store: str = 'MEMORY'
+    db_busy_timeout: int = 5000
+    db_statement_cache: int = 256
+    db_checkpoint_interval: int = 300
+    cart_flush_window: float = 0.5
+    user_flush_window: float = 1.0
+    user_cache_size: int = 1_000_000
+    api_rate: float = 30
+    api_burst: int = 30
+    api_chat_rate: float = 1
+    api_chat_burst: int = 3
+    api_max_retries: int = 3
+    broadcast_workers: int = 10
+    broadcast_rate: float = 20
+    broadcast_batch: int = 200
+    search_page_size: int = 5
+    search_cache_size: int = 256
+    render_cache_size: int = 4096
+    throttle_limits: dict[str, tuple[float, int]] = {
+        'command': (1, 5),
+        'message': (1, 5),
+        'callback': (3, 6),
+        'inline': (2, 5),
+    }
+    run_mode: str = 'polling'
+    webhook_url: str = ''
+    webhook_path: str = '/webhook'
+    webhook_host: str = '0.0.0.0'
+    webhook_port: int = 8080
+    webhook_secret: SecretStr = SecretStr('')
+    metrics_host: str = '127.0.0.1'
+    metrics_port: int = 0
+    metrics_dump: bool = True
+    fsm_storage: str = 'memory'
+    fsm_ttl: int = 24 * 3600
+    redis_url: str = 'redis://localhost:6379/0'
     model_config = SettingsConfigDict(env_file='.env',
                                       env_file_encoding='utf-8')
 
@@ -1,18 +1,32 @@
+import gzip
+import html
+import logging
+import os
+import tempfile
+import time
+
 from aiogram import Bot, Router, F
-from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import (
     CallbackQuery,
-    InlineKeyboardButton,
-    InlineKeyboardMarkup,
+    FSInputFile,
     Message,
+    ReplyKeyboardRemove,
 )
 
 import sqlite_db
 from config import config
-from core.handlers.basic import delete_messages
+from core.handlers.basic import delete_messages, send_carousel
+from core.handlers.callbacks import callback_handler
+from core.utils.broadcast import broadcaster
+from core.utils.callback_data import Op
+from core.utils.order_export import EXPORT_FORMATS, export_orders
+from core.utils.render_cache import render_cache
 from core.keyboards import keyboards
+from media import FULL, media
 
 
 router = Router()
@@ -24,6 +38,8 @@ class FSMAdmin(StatesGroup):
     name = State()
     description = State()
     price = State()
+    category = State()
+    tags = State()
 
 
 @router.message(Command(commands='administrator'))
@@ -40,7 +56,7 @@ async def make_changes_command(message: Message, bot: Bot):
             'Предоставлены права администратора',
             reply_markup=keyboards.admin_keyboard
         )
-        await delete_messages(message, bot, 1)
+        await delete_messages(message, bot, keep_current=True)
     else:
         await message.answer(
             'Только администраторы могут использовать эту команду.')
@@ -49,7 +65,7 @@ async def make_changes_command(message: Message, bot: Bot):
 @router.message(F.text.lower() == 'добавить')
 async def fsm_start(message: Message, bot: Bot, state: FSMContext):
     """Начало диалога загрузки нового товара(запуск машины состояний)."""
-    await delete_messages(message, bot, 1)
+    await delete_messages(message, bot, keep_current=True)
     if message.from_user.id == message.chat.id:
         await state.set_state(FSMAdmin.photo)
         await message.reply('Загрузить фото')
@@ -58,7 +74,7 @@ async def fsm_start(message: Message, bot: Bot, state: FSMContext):
 @router.message(F.text.lower() == 'отмена')
 async def cancel_handler(message: Message, bot: Bot, state: FSMContext):
     """Выход из машины состояний."""
-    await delete_messages(message, bot, 1)
+    await delete_messages(message, bot, keep_current=True)
     if message.from_user.id == message.chat.id:
         current_state = await state.get_state()
 
@@ -72,9 +88,13 @@ async def cancel_handler(message: Message, bot: Bot, state: FSMContext):
 @router.message(FSMAdmin.photo)
 async def load_photo(message: Message, bot: Bot, state: FSMContext):
     """Принимает фото товара из машины состояний"""
-    await delete_messages(message, bot, 1)
+    await delete_messages(message, bot, keep_current=True)
     if message.from_user.id == message.chat.id:
-        await state.update_data(photo=message.photo[0].file_id)
+        await state.update_data(
+            photo=message.photo[-1].file_id,
+            photos=[(size.width, size.height, size.file_id)
+                    for size in message.photo]
+        )
         await state.set_state(FSMAdmin.name)
         await message.reply('Теперь введи название')
 
@@ -82,7 +102,7 @@ async def load_photo(message: Message, bot: Bot, state: FSMContext):
 @router.message(FSMAdmin.name)
 async def load_name(message: Message, bot: Bot, state: FSMContext):
     """Принимает имя товара из машины состояний."""
-    await delete_messages(message, bot, 1)
+    await delete_messages(message, bot, keep_current=True)
     if message.from_user.id == message.chat.id:
         await state.update_data(name=message.text)
         await state.set_state(FSMAdmin.description)
@@ -92,7 +112,7 @@ async def load_name(message: Message, bot: Bot, state: FSMContext):
 @router.message(FSMAdmin.description)
 async def load_description(message: Message, bot: Bot, state: FSMContext):
     """Принимает описание товара из машины состояний."""
-    await delete_messages(message, bot, 1)
+    await delete_messages(message, bot, keep_current=True)
     if message.from_user.id == message.chat.id:
         await state.update_data(description=message.text)
         await state.set_state(FSMAdmin.price)
@@ -101,69 +121,214 @@ async def load_description(message: Message, bot: Bot, state: FSMContext):
 
 @router.message(FSMAdmin.price)
 async def load_price(message: Message, bot: Bot, state: FSMContext):
-    """Принимает цену товара из машины состояний и всё сохраняем в SQL"""
-    await delete_messages(message, bot, 1)
+    """Принимает цену товара из машины состояний."""
+    await delete_messages(message, bot, keep_current=True)
     if message.from_user.id == message.chat.id:
         await state.update_data(price=float(message.text))
+        await state.set_state(FSMAdmin.category)
+        await message.reply(
+            'Выбери категорию или введи новую',
+            reply_markup=keyboards.category_reply_keyboard(
+                await sqlite_db.sql_select_categories()
+            )
+        )
+
+
+@router.message(FSMAdmin.category)
+async def load_category(message: Message, bot: Bot, state: FSMContext):
+    """Принимает категорию товара из машины состояний."""
+    await delete_messages(message, bot, keep_current=True)
+    if message.from_user.id == message.chat.id:
+        name = message.text.strip()
+        category_id = None
+        if name != keyboards.NO_CATEGORY:
+            category_id = await sqlite_db.sql_add_category(name)
+        await state.update_data(category_id=category_id)
+        await state.set_state(FSMAdmin.tags)
+        await message.reply('Введи теги через запятую (или "-" без тегов)',
+                            reply_markup=ReplyKeyboardRemove())
+
+
+@router.message(FSMAdmin.tags)
+async def load_tags(message: Message, bot: Bot, state: FSMContext):
+    """Принимает теги товара из машины состояний и всё сохраняем в SQL"""
+    await delete_messages(message, bot, keep_current=True)
+    if message.from_user.id == message.chat.id:
+        tags = {tag.strip().lower() for tag in message.text.split(',')}
+        await state.update_data(tags=sorted(tags - {'', '-'}))
         data = await state.get_data()
         await sqlite_db.sql_add_product(data)
-        await message.reply('Успешно добавлено.')
+        await message.reply('Успешно добавлено.',
+                            reply_markup=keyboards.admin_keyboard)
         await state.clear()
 
 
-@router.callback_query(lambda x: x.data and x.data.startswith((
-        '←delete_item ', 'delete_item→ ')))
-async def arrow_button_delete_item(query: CallbackQuery, bot: Bot):
+@callback_handler(Op.DEL_ITEM_PREV, Op.DEL_ITEM_NEXT)
+async def arrow_button_delete_item(query: CallbackQuery, bot: Bot, op: Op,
+                                   product_id: int, new_index: int):
     """Переключение между товарами в магазине при удалении."""
-    direction, new_index = query.data.split()
-    await show_delete_item_command(query.message, bot, index=int(new_index))
+    if op == Op.DEL_ITEM_PREV:
+        product = await sqlite_db.sql_select_product_prev(product_id)
+    else:
+        product = await sqlite_db.sql_select_product_next(product_id)
+    await show_delete_item_command(query.message, bot, index=new_index,
+                                   product=product, edit=True)
 
 
-@router.callback_query(lambda x: x.data and x.data.startswith('del_product '))
-async def del_product_callback_run(query: CallbackQuery, bot: Bot):
+@callback_handler(Op.DEL_PRODUCT)
+async def del_product_callback_run(query: CallbackQuery, bot: Bot, op: Op,
+                                   product_id: int, index: int, page: int):
     """Удаление товара из БД."""
-    item = query.data.replace('del_product ', '').split(', ')
-    await sqlite_db.sql_delete_product(item[0])
-    await query.answer(text=f'"{item[1]}" удалено.', show_alert=True)
-    new_index = int(item[2]) - 1 if int(item[2]) != 1 else int(item[-1]) - 1
-    await show_delete_item_command(query.message, bot, index=int(new_index))
+    product = await sqlite_db.sql_select_products_id(product_id)
+    await sqlite_db.sql_delete_product(product_id)
+    await query.answer(
+        text=f'"{product[2] if product else "Товар"}" удалено.',
+        show_alert=True
+    )
+    new_index = index - 1 if index != 1 else page - 1
+    product = await sqlite_db.sql_select_product_prev(product_id)
+    await show_delete_item_command(query.message, bot, index=new_index,
+                                   product=product, edit=True)
 
 
 @router.message(F.text.lower() == 'удалить')
-async def show_delete_item_command(message: Message, bot: Bot, index=1):
-    """Вывод в чат списка товаров для выбора удаления."""
-    await delete_messages(message, bot, 0)
-    read = await sqlite_db.sql_select_products()
-    page = len(read)
-    product = read[index-1]
-    await bot.send_photo(
-        chat_id=message.chat.id,
-        photo=product[1],
-        caption=
-        f'Название: {product[2]}\nОписание: {product[3]}\nЦена: {product[-1]}',
-        reply_markup=InlineKeyboardMarkup(
-            inline_keyboard=[
-                [
-                    InlineKeyboardButton(
-                        text='← ',
-                        callback_data=
-                        f'←delete_item {index - 1 if index != 1 else page}'
-                    ),
-                    InlineKeyboardButton(
-                        text=f'{index}/{page}',
-                        callback_data=f' '
-                    ),
-                    InlineKeyboardButton(
-                        text=' →',
-                        callback_data=
-                        f'delete_item→ {index + 1 if index != page else 1}'
-                    )
-                ],
-                [InlineKeyboardButton(
-                    text=f'Удалить продукт "{product[2]}"',
-                    callback_data=f'del_product {read[index - 1][0]}, '
-                                  f'{product[2]}, {index}, {page}'
-                )]
-            ]
-        )
+async def show_delete_item_command(message: Message, bot: Bot, index=1,
+                                   product=None, edit=False):
+    """
+    Вывод в чат списка товаров для выбора удаления. При edit=True страница
+    выводится на месте сообщения message.
+    """
+    if not edit:
+        await delete_messages(message, bot)
+    page = await sqlite_db.sql_count_products()
+    if product is None:
+        index = 1
+        product = await sqlite_db.sql_select_product_next()
+
+    if product is None:
+        if edit:
+            await delete_messages(message, bot)
+        return await bot.send_message(message.chat.id, 'Товаров пока нет')
+
+    caption = render_cache.caption(
+        product.id,
+        lambda: keyboards.product_caption(product.name, product.description,
+                                          product.price)
+    )
+    await send_carousel(message, bot, edit=edit, caption=caption,
+                        photo=media.file_id(product.id, FULL, product.img),
+                        reply_markup=keyboards.delete_item_keyboard(
+                            message.chat.id, product, index, page
+                        ))
+
+
+async def is_admin(bot: Bot, user_id: int) -> bool:
+    """Проверяет, что пользователь - администратор группы магазина."""
+    chat_member = await bot.get_chat_member(
+        int(config.group_id.get_secret_value()), user_id
+    )
+    return chat_member.status in ('administrator', 'creator')
+
+
+@router.message(Command(commands='export'))
+@router.message(F.text.lower() == 'выгрузка')
+async def export_orders_command(message: Message, bot: Bot,
+                                command: CommandObject | None = None):
+    """
+    Выгрузка заказов администратору файлом CSV или JSONL (/export jsonl),
+    сжатым gzip. Заказы читаются из БД и пишутся в файл порциями.
+    """
+    if message.from_user.id != message.chat.id or \
+            not await is_admin(bot, message.from_user.id):
+        return await message.answer(
+            'Только администраторы могут использовать эту команду.')
+
+    fmt = (command.args or 'csv').strip().lower() if command else 'csv'
+    if fmt not in EXPORT_FORMATS:
+        return await message.answer(
+            f'Форматы выгрузки: {", ".join(EXPORT_FORMATS)}')
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory,
+                            f'orders_{time.strftime("%Y%m%d")}.{fmt}.gz')
+        try:
+            with gzip.open(path, 'wt', encoding='utf-8', newline='') as file:
+                count = await export_orders(file, fmt)
+        except Exception as e:
+            logging.error(f"Ошибка выгрузки заказов: {e}", exc_info=True)
+            return await message.answer('Не удалось выгрузить заказы.')
+
+        await bot.send_document(message.chat.id, FSInputFile(path),
+                                caption=f'Заказов: {count}')
+
+
+@router.message(Command(commands='report'))
+@router.message(F.text.lower() == 'отчёт')
+async def sales_report_command(message: Message, bot: Bot,
+                               command: CommandObject | None = None):
+    """
+    Отчёт о продажах за последние N дней (/report N, по умолчанию 30,
+    /report 0 - за всё время): выручка, продажи по дням и топ товаров.
+    """
+    if message.from_user.id != message.chat.id or \
+            not await is_admin(bot, message.from_user.id):
+        return await message.answer(
+            'Только администраторы могут использовать эту команду.')
+
+    args = command.args.strip() if command and command.args else ''
+    days = int(args) if args.isdigit() else 30
+    report = await sqlite_db.sql_sales_report(
+        int(time.time()) - days * 86400 if days else None
     )
+
+    lines = [f'<b>Продажи за {days} дн.</b>' if days
+             else '<b>Продажи за всё время</b>']
+    for currency, count, amount in report.get('totals', []):
+        lines.append(f'{currency or "-"}: {count} заказов на сумму '
+                     f'{(amount or 0) / 100:.2f}')
+
+    if report.get('days'):
+        lines.append('\n<b>По дням:</b>')
+        for day, count, amount in report['days'][-31:]:
+            lines.append(f'{day}: {count} заказов, {(amount or 0) / 100:.2f}')
+
+    if report.get('products'):
+        lines.append('\n<b>Топ товаров:</b>')
+        for place, (product_id, name, quantity, amount) in enumerate(
+                report['products'], 1
+        ):
+            lines.append(
+                f'{place}. {html.escape(name or f"Товар {product_id}")}: '
+                f'{quantity} шт., {(amount or 0) / 100:.2f}'
+            )
+
+    if len(lines) == 1:
+        lines.append('Заказов нет.')
+    await message.answer('\n'.join(lines))
+
+
+@router.message(Command(commands='broadcast'))
+async def broadcast_command(message: Message, bot: Bot,
+                            command: CommandObject):
+    """
+    Рассылка сообщения всем пользователям бота (/broadcast текст). Текст
+    сначала отправляется администратору для проверки разметки.
+    """
+    if message.from_user.id != message.chat.id or \
+            not await is_admin(bot, message.from_user.id):
+        return await message.answer(
+            'Только администраторы могут использовать эту команду.')
+
+    if not command.args:
+        return await message.answer('Укажите текст: /broadcast текст')
+
+    try:
+        await message.answer(command.args)
+    except TelegramBadRequest as e:
+        return await message.answer(f'Текст не отправлен: {e.message}')
+
+    broadcast_id = await sqlite_db.sql_add_broadcast(message.chat.id,
+                                                     command.args)
+    if broadcast_id is None:
+        return await message.answer('Не удалось создать рассылку.')
+    broadcaster.start(bot, broadcast_id, message.chat.id, command.args)
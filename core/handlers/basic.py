@@ -1,13 +1,19 @@
+import re
+
 from aiogram import Bot, Router
-from aiogram.filters import Command
-from aiogram.types import (
-    CallbackQuery,
-    InlineKeyboardButton,
-    InlineKeyboardMarkup,
-    Message,
-)
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
+from aiogram.types import CallbackQuery, InlineKeyboardMarkup, Message
 
 import sqlite_db
+from catalog import SORT_ID, ProductFilter
+from core.handlers.callbacks import callback_handler
+from core.keyboards import keyboards
+from core.utils.callback_data import Op
+from core.utils.message_registry import registry
+from core.utils.render_cache import render_cache
+from media import DETAIL, media
+from user_cache import known_users
 
 
 router = Router()
@@ -19,74 +25,224 @@ async def user_start_bot(message: Message, bot: Bot):
     Запуск взаимодействия с ботом. Приветствие пользователей и добавление
     новых пользователей в БД по их id пользователя из тг
     """
-    await delete_messages(message, bot, 0)
+    await delete_messages(message, bot)
 
     if message.from_user.id == message.chat.id:
         await bot.send_message(
             message.from_user.id,
             f'Добро пожаловать в наш магазин, {message.from_user.first_name}.'
         )
-        await sqlite_db.sql_add_user((message.from_user.id,
-                                      message.from_user.first_name))
+        known_users.add(message.from_user.id, message.from_user.first_name)
     else:
         await message.answer('Общение с ботом через ЛС, напишите ему:\n'
                              'https://t.me/NewDiplomaBot')
 
 
-@router.callback_query(lambda x: x.data and x.data.startswith(('←shop ',
-                                                               'shop→ ')))
-async def arrow_button_shop(query: CallbackQuery, bot: Bot):
+@callback_handler(Op.SHOP_PREV, Op.SHOP_NEXT)
+async def arrow_button_shop(query: CallbackQuery, bot: Bot, op: Op,
+                            product_id: int, new_index: int):
     """Переключение между товарами в магазине."""
-    direction, new_index = query.data.split()
-    await show_shop_command(query.message, bot, index=int(new_index))
+    if op == Op.SHOP_PREV:
+        product = await sqlite_db.sql_select_product_prev(product_id)
+    else:
+        product = await sqlite_db.sql_select_product_next(product_id)
+    await show_shop_command(query.message, bot, index=new_index,
+                            product=product, edit=True)
 
 
 @router.message(Command('shop'))
-async def show_shop_command(message: Message, bot: Bot, index=1):
-    """Вывод в чат товаров."""
-    await delete_messages(message, bot, 0)
-    read = await sqlite_db.sql_select_products()
-    page = len(read)
-    product = read[index-1]
-    await bot.send_photo(
-        chat_id=message.chat.id,
-        photo=product[1],
-        caption=
-        f'Название: {product[2]}\nОписание: {product[3]}\nЦена: {product[-1]}',
-        reply_markup=InlineKeyboardMarkup(
-            inline_keyboard=[
-                [
-                    InlineKeyboardButton(
-                        text='← ',
-                        callback_data=
-                        f'←shop {index - 1 if index != 1 else page}'
-                    ),
-                    InlineKeyboardButton(
-                        text=f'{index}/{page}',
-                        callback_data=f' '
-                    ),
-                    InlineKeyboardButton(
-                        text=' →',
-                        callback_data=
-                        f'shop→ {index + 1 if index != page else 1}'
-                    )
-                ],
-                [InlineKeyboardButton(
-                    text=f'Добавить в корзину "{product[2]}"',
-                    callback_data=
-                    f'add_cart {message.chat.id}, {product[0]}, {product[2]}'
-                )]
-            ]
+async def show_shop_command(message: Message, bot: Bot, index=1,
+                            product=None, edit=False):
+    """
+    Вывод в чат товаров. При edit=True страница выводится на месте
+    сообщения message (переключение стрелками).
+    """
+    if not edit:
+        await delete_messages(message, bot)
+    page = await sqlite_db.sql_count_products()
+    if product is None:
+        index = 1
+        product = await sqlite_db.sql_select_product_next()
+
+    if product is None:
+        if edit:
+            await delete_messages(message, bot)
+        return await bot.send_message(message.chat.id, 'Товаров пока нет')
+
+    caption = render_cache.caption(
+        product.id,
+        lambda: keyboards.product_caption(product.name, product.description,
+                                          product.price)
+    )
+    await send_carousel(message, bot, edit=edit, caption=caption,
+                        photo=media.file_id(product.id, DETAIL, product.img),
+                        reply_markup=keyboards.shop_keyboard(
+                            message.chat.id, product, index, page
+                        ))
+
+
+def parse_price_range(text: str | None) -> tuple[int, int]:
+    """
+    Разбирает ценовой диапазон "100-500", "100-", "-500" или "100" (от 100).
+    Возвращает (мин, макс), 0 - граница не задана.
+    """
+    match = re.fullmatch(r'\s*(\d*)\s*(-?)\s*(\d*)\s*', text or '')
+    if match is None:
+        return 0, 0
+    low, _, high = match.groups()
+    return int(low or 0), int(high or 0)
+
+
+@router.message(Command('categories'))
+async def show_categories_command(message: Message, bot: Bot,
+                                  command: CommandObject | None = None,
+                                  product_filter=None):
+    """
+    Вывод в чат категорий товаров. Аргумент команды - ценовой диапазон
+    (/categories 100-500), он применяется к товарам выбранной категории.
+    """
+    await delete_messages(message, bot)
+    if product_filter is None:
+        product_filter = ProductFilter(
+            0, 0, SORT_ID, *parse_price_range(command.args if command
+                                              else None)
         )
+    categories = await sqlite_db.sql_select_categories()
+    await bot.send_message(
+        message.chat.id,
+        'Выберите категорию' if categories else 'Категорий пока нет',
+        reply_markup=keyboards.category_keyboard(message.chat.id,
+                                                 categories, product_filter)
+    )
+
+
+@router.message(Command('tag'))
+async def show_tag_command(message: Message, bot: Bot,
+                           command: CommandObject):
+    """Вывод в чат товаров с тегом (/tag название)."""
+    tag_id = await sqlite_db.sql_select_tag_id(
+        (command.args or '').strip().lower()
+    )
+    if tag_id is None:
+        await delete_messages(message, bot)
+        return await bot.send_message(message.chat.id, 'Тег не найден')
+    await show_filtered_shop(message, bot, ProductFilter(tag_id=tag_id))
+
+
+@callback_handler(Op.CATEGORIES)
+async def categories_callback_run(query: CallbackQuery, bot: Bot, op: Op,
+                                  *fields: int):
+    """Возврат к выбору категории из отфильтрованного каталога."""
+    await query.answer()
+    await show_categories_command(query.message, bot,
+                                  product_filter=ProductFilter(*fields))
+
+
+@callback_handler(Op.FILTER_PAGE)
+async def filter_page_callback_run(query: CallbackQuery, bot: Bot, op: Op,
+                                   *fields: int):
+    """
+    Выбор категории или порядка товаров: вывод первого товара выборки.
+    Поля сверх полей фильтра (номер страницы в старых кнопках)
+    игнорируются.
+    """
+    await query.answer()
+    await show_filtered_shop(query.message, bot, ProductFilter(*fields[:5]),
+                             edit=query.message.photo is not None)
+
+
+@callback_handler(Op.FILTER_PREV, Op.FILTER_NEXT)
+async def arrow_button_filter(query: CallbackQuery, bot: Bot, op: Op,
+                              category_id: int, tag_id: int, sort: int,
+                              min_price: int, max_price: int,
+                              product_id: int, new_index: int):
+    """Переключение между товарами в отфильтрованном каталоге."""
+    await query.answer()
+    await show_filtered_shop(
+        query.message, bot,
+        ProductFilter(category_id, tag_id, sort, min_price, max_price),
+        index=new_index, product_id=product_id,
+        backward=op == Op.FILTER_PREV, edit=query.message.photo is not None
+    )
+
+
+async def show_filtered_shop(message: Message, bot: Bot,
+                             product_filter: ProductFilter, index=1,
+                             product_id=0, backward=False, edit=False):
+    """
+    Вывод в чат товаров, выбранных фильтром (категория, тег, цена) в
+    порядке фильтра. Выводится товар, соседний с product_id (keyset
+    пагинация, при backward=True - предыдущий), без product_id - первый.
+    Условия и сортировка выполняются в SQL.
+    """
+    if not edit:
+        await delete_messages(message, bot)
+    page = await sqlite_db.sql_count_products_filtered(product_filter)
+    product = await sqlite_db.sql_select_product_filtered(
+        product_filter, product_id, backward
+    )
+    if product is not None and not product_id:
+        index = 1
+    index = min(max(index, 1), page)
+
+    if product is None:
+        if edit:
+            await delete_messages(message, bot)
+        return await bot.send_message(message.chat.id, 'Товаров не найдено')
+
+    caption = render_cache.caption(
+        product.id,
+        lambda: keyboards.product_caption(product.name, product.description,
+                                          product.price)
     )
+    await send_carousel(message, bot, edit=edit, caption=caption,
+                        photo=media.file_id(product.id, DETAIL, product.img),
+                        reply_markup=keyboards.filter_keyboard(
+                            message.chat.id, product, product_filter, index,
+                            page
+                        ))
 
 
-async def delete_messages(message: Message, bot: Bot, count=0):
-    """Удаляет все предыдущие сообщения в чате"""
-    while True:
+async def send_carousel(message: Message, bot: Bot, photo: str, caption: str,
+                        reply_markup: InlineKeyboardMarkup, edit=False):
+    """
+    Выводит страницу карусели (фото, подпись и клавиатура). При edit=True
+    обновляет сообщение message на месте одним вызовом "editMessageMedia",
+    а если отредактировать его нельзя (удалено, слишком старое, без фото) -
+    удаляет старые сообщения и отправляет страницу заново.
+    """
+    if edit:
         try:
-            await bot.delete_message(message.chat.id,
-                                     message.message_id - count)
-            count += 1
-        except Exception:
-            break
+            await bot.edit_message_media(
+                media=media.input_photo(photo, caption),
+                chat_id=message.chat.id,
+                message_id=message.message_id,
+                reply_markup=reply_markup
+            )
+            return
+        except TelegramBadRequest as e:
+            if 'message is not modified' in e.message:
+                return
+        await delete_messages(message, bot)
+
+    await bot.send_photo(
+        chat_id=message.chat.id,
+        photo=photo,
+        caption=caption,
+        reply_markup=reply_markup
+    )
+
+
+async def delete_messages(message: Message, bot: Bot, keep_current=False):
+    """
+    Удаляет предыдущие сообщения бота в чате (по реестру отправленных
+    сообщений) и текущее сообщение. При keep_current=True текущее сообщение
+    остаётся и будет удалено при следующей очистке.
+    """
+    if keep_current:
+        registry.track(message.chat.id, message.message_id)
+        await registry.delete(bot, message.chat.id,
+                              exclude=message.message_id)
+    else:
+        await registry.delete(bot, message.chat.id,
+                              extra=[message.message_id])
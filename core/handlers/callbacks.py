@@ -0,0 +1,60 @@
+import logging
+from typing import Awaitable, Callable
+
+from aiogram import Bot, Router
+from aiogram.types import CallbackQuery
+
+from core.utils.callback_data import Op, codec
+from metrics import metrics
+
+
+router = Router()
+
+CallbackHandler = Callable[..., Awaitable[object]]
+handlers: dict[Op, CallbackHandler] = {}
+
+
+def callback_handler(*ops: Op) -> Callable[[CallbackHandler],
+                                           CallbackHandler]:
+    """
+    Регистрирует обработчик нажатий кнопок с кодами действий ops. Обработчик
+    вызывается как handler(query, bot, op, *поля callback_data).
+    """
+    def register(handler: CallbackHandler) -> CallbackHandler:
+        for op in ops:
+            handlers[op] = handler
+        return handler
+    return register
+
+
+def callback_chat_id(query: CallbackQuery) -> int:
+    """Чат, к которому привязана подпись кнопки."""
+    return query.message.chat.id if query.message else query.from_user.id
+
+
+@router.callback_query()
+async def dispatch_callback(query: CallbackQuery, bot: Bot):
+    """
+    Единая точка входа нажатий inline-кнопок: декодирует callback_data и
+    вызывает обработчик по коду действия (поиск в словаре). Время
+    обработки пишется в метрику "callback_seconds" по коду действия.
+    """
+    try:
+        op, fields = codec.unpack(callback_chat_id(query), query.data or '')
+    except ValueError as e:
+        logging.warning(
+            f"Отклонена кнопка от пользователя {query.from_user.id}: {e}"
+        )
+        return await query.answer('Кнопка устарела, откройте меню заново.')
+
+    handler = handlers.get(op)
+    if handler is None:
+        return await query.answer()
+    with metrics.timer('callback_seconds', op=op.name):
+        await handler(query, bot, op, *fields)
+
+
+@callback_handler(Op.NOOP)
+async def noop_callback(query: CallbackQuery, bot: Bot, op: Op):
+    """Кнопка без действия (номер страницы)."""
+    await query.answer()
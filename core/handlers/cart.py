@@ -1,97 +1,122 @@
 from aiogram import Bot, Router
 from aiogram.filters import Command
-from aiogram.types import (
-    Message,
-    CallbackQuery,
-    InlineKeyboardMarkup,
-    InlineKeyboardButton,
-)
+from aiogram.types import Message, CallbackQuery
 
 import sqlite_db
-from core.handlers.basic import delete_messages
+from cart_buffer import cart_buffer
+from core.handlers.basic import delete_messages, send_carousel
+from core.handlers.callbacks import callback_handler
+from core.keyboards import keyboards
+from core.utils.callback_data import Op
+from core.utils.render_cache import render_cache
+from media import DETAIL, media
+from user_cache import known_users
 
 
 router = Router()
 
 
-@router.callback_query(lambda x: x.data and x.data.startswith('add_cart '))
-async def add_cart_callback_run(query: CallbackQuery, bot: Bot):
+@callback_handler(Op.ADD_CART)
+async def add_cart_callback_run(query: CallbackQuery, bot: Bot, op: Op,
+                                product_id: int):
     """Добавление товара в корзину."""
-    item = query.data.replace('add_cart ', '').split(', ')
-
     if query.from_user.id == query.message.chat.id:
-        await sqlite_db.sql_add_cart(tuple(item[:-1]))
-        await query.answer(text=f'"{item[-1]}" добавлено в корзину.')
+        product = await sqlite_db.sql_select_products_id(product_id)
+        if product is None:
+            return await query.answer(text='Товар больше не продаётся.')
+        known_users.add(query.from_user.id, query.from_user.first_name)
+        cart_buffer.add(query.from_user.id, product_id)
+        await query.answer(text=f'"{product[2]}" добавлено в корзину.')
     else:
         await bot.send_message(
-            chat_id=int(item[0]),
+            chat_id=query.message.chat.id,
             text='Взаимодействие с ботом через ЛС, напишите ему:\n'
                  'https://t.me/NewDiplomaBot')
 
 
-@router.callback_query(lambda x: x.data and x.data.startswith(('←cart ',
-                                                               'cart→ ')))
-async def arrow_button_cart(query: CallbackQuery, bot: Bot):
+@callback_handler(Op.CART_PREV, Op.CART_NEXT)
+async def arrow_button_cart(query: CallbackQuery, bot: Bot, op: Op,
+                            product_id: int, new_index: int):
     """Переключение между товарами в корзине."""
-    direction, new_index = query.data.split()
-    await show_cart_command(query.message, bot, index=int(new_index))
+    if op == Op.CART_PREV:
+        line = await sqlite_db.sql_select_cart_prev(query.message.chat.id,
+                                                    product_id)
+    else:
+        line = await sqlite_db.sql_select_cart_next(query.message.chat.id,
+                                                    product_id)
+    await show_cart_command(query.message, bot, index=new_index,
+                            line=line, edit=True)
 
 
-@router.callback_query(lambda x: x.data and x.data.startswith('del_cart '))
-async def del_cart_callback_run(query: CallbackQuery, bot: Bot):
+@callback_handler(Op.DEL_CART)
+async def del_cart_callback_run(query: CallbackQuery, bot: Bot, op: Op,
+                                product_id: int, index: int, page: int):
     """Удаление товара из корзины."""
-    print(query.data)
-    item = query.data.replace('del_cart ', '').split(', ')
-    print(item)
-    await sqlite_db.sql_delete_cart(item[0])
+    product = await sqlite_db.sql_select_products_id(product_id)
+    cart_buffer.delete(query.message.chat.id, product_id)
+    await cart_buffer.flush(query.message.chat.id)
     await query.answer(
-        text=f'"{item[1]}" удалено из вашей корзины.',
+        text=f'"{product[2] if product else "Товар"}" удалено из вашей '
+             f'корзины.',
         show_alert=True
     )
-    new_index = int(item[2]) - 1 if int(item[2]) != 1 else int(item[-1]) - 1
-    await show_cart_command(query.message, bot, index=int(new_index))
+    new_index = index - 1 if index != 1 else page - 1
+    line = await sqlite_db.sql_select_cart_prev(query.message.chat.id,
+                                                product_id)
+    await show_cart_command(query.message, bot, index=new_index,
+                            line=line, edit=True)
+
+
+@callback_handler(Op.CART_INC, Op.CART_DEC)
+async def change_quantity_callback_run(query: CallbackQuery, bot: Bot, op: Op,
+                                       product_id: int, index: int,
+                                       page: int):
+    """Изменение количества товара в корзине кнопками +/-."""
+    chat_id = query.message.chat.id
+    delta = 1 if op == Op.CART_INC else -1
+    cart_buffer.add(chat_id, product_id, delta)
+    await cart_buffer.flush(chat_id)
+    line = await sqlite_db.sql_select_cart_line(chat_id, product_id)
+    if line is None:
+        await query.answer(text='Товар удалён из вашей корзины.')
+        index = index - 1 if index != 1 else page - 1
+        line = await sqlite_db.sql_select_cart_prev(chat_id, product_id)
+    else:
+        await query.answer()
+    await show_cart_command(query.message, bot, index=index, line=line,
+                            edit=True)
 
 
 @router.message(Command(commands='cart'))
-async def show_cart_command(message: Message, bot: Bot, index=1):
-    """Вывод в чат товаров из корзины и встроенной клавиатуры."""
-    await delete_messages(message, bot, 0)
-    read = await sqlite_db.sql_select_cart_user(message.chat.id)
-    page = len(read)
+async def show_cart_command(message: Message, bot: Bot, index=1, line=None,
+                            edit=False):
+    """
+    Вывод в чат товаров из корзины и встроенной клавиатуры. При edit=True
+    страница выводится на месте сообщения message.
+    """
+    if not edit:
+        await delete_messages(message, bot)
+        await cart_buffer.flush(message.chat.id)
+    page = await sqlite_db.sql_count_cart(message.chat.id)
+    if line is None:
+        index = 1
+        line = await sqlite_db.sql_select_cart_next(message.chat.id)
 
-    if not read:
+    if not line:
+        if edit:
+            await delete_messages(message, bot)
         await bot.send_message(message.chat.id, 'Корзина пуста')
     else:
-        product = await sqlite_db.sql_select_products_id(read[index-1][1])
-        await bot.send_photo(
-            chat_id=message.chat.id,
-            photo=product[1],
-            caption=f'Название: {product[2]}\n'
-                    f'Описание: {product[3]}\n'
-                    f'Цена: {product[-1]}',
-            reply_markup=InlineKeyboardMarkup(
-                inline_keyboard=[
-                    [
-                        InlineKeyboardButton(
-                            text='← ',
-                            callback_data=
-                            f'←cart {index - 1 if index != 1 else page}'
-                        ),
-                        InlineKeyboardButton(
-                            text=f'{index}/{page}',
-                            callback_data=f' '
-                        ),
-                        InlineKeyboardButton(
-                            text=' →',
-                            callback_data=
-                            f'cart→ {index + 1 if index != page else 1}'
-                        )
-                    ],
-                    [InlineKeyboardButton(
-                        text=f'Удалить из корзины "{product[2]}"',
-                        callback_data=f'del_cart {read[index-1][0]}, '
-                                      f'{product[2]}, {index}, {page}'
-                    )]
-                ]
-            )
+        product_id, name, description, price, img, quantity = line
+        caption = render_cache.caption(
+            product_id,
+            lambda: keyboards.product_caption(name, description, price,
+                                              quantity),
+            quantity
         )
+        await send_carousel(message, bot, edit=edit, caption=caption,
+                            photo=media.file_id(product_id, DETAIL, img),
+                            reply_markup=keyboards.cart_keyboard(
+                                message.chat.id, product_id, name, quantity,
+                                index, page
+                            ))
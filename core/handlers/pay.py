@@ -1,3 +1,5 @@
+import time
+
 from aiogram import Bot, Router, F
 from aiogram.filters import Command
 from aiogram.types import (
@@ -10,6 +12,7 @@ from aiogram.types import (
 
 from config import config
 import sqlite_db
+from cart_buffer import cart_buffer
 from core.handlers.basic import delete_messages
 from core.keyboards import keyboards
 
@@ -20,17 +23,19 @@ router = Router()
 @router.message(Command(commands='pay'))
 async def buy_process(message: Message, bot: Bot):
     """Оплата товаров из корзины."""
-    await delete_messages(message, bot, 0)
-    rows = await sqlite_db.sql_select_cart_user(message.from_user.id)
-    if not rows:
+    await delete_messages(message, bot)
+    await cart_buffer.flush(message.from_user.id)
+    lines = await sqlite_db.sql_select_cart_lines(message.from_user.id)
+    if not lines:
         return await bot.send_message(message.from_user.id, 'Корзина пуста')
 
-    prices = []
-
-    for row in rows:
-        prod = await sqlite_db.sql_select_products_id(row[1])
-        prices.append(LabeledPrice(label=f'{prod[2]}',
-                                   amount=int(float(prod[-1]) * 100)))
+    prices = [
+        LabeledPrice(
+            label=f'{name} x{quantity}' if quantity > 1 else f'{name}',
+            amount=round(float(price) * 100) * quantity
+        )
+        for _, name, _, price, _, quantity in lines
+    ]
 
     await bot.send_invoice(
         chat_id=message.chat.id,
@@ -80,8 +85,16 @@ async def shipping_process(shipping_query: ShippingQuery, bot: Bot):
 
 @router.pre_checkout_query(lambda q: True)
 async def checkout_process(pre_checkout_query: PreCheckoutQuery, bot: Bot):
-    """Ответ для авто-проверки. Сохраняем инф о заказе в БД."""
-    order_info = {
+    """
+    Ответ для авто-проверки. Сохраняем инф о заказе в БД, если сохранить
+    не удалось - отклоняем оплату.
+    """
+    info = pre_checkout_query.order_info
+    address = info.shipping_address
+    order = {
+        'user_id': pre_checkout_query.from_user.id,
+        'order_id': pre_checkout_query.id,
+        'created_at': int(time.time()),
         'first_name': pre_checkout_query.from_user.first_name,
         'last_name': pre_checkout_query.from_user.last_name,
         'username': pre_checkout_query.from_user.username,
@@ -89,29 +102,39 @@ async def checkout_process(pre_checkout_query: PreCheckoutQuery, bot: Bot):
         'total_amount': pre_checkout_query.total_amount,
         'invoice_payload': pre_checkout_query.invoice_payload,
         'shipping_option_id': pre_checkout_query.shipping_option_id,
-        'name': pre_checkout_query.order_info.name,
-        'phone_number': pre_checkout_query.order_info.phone_number,
-        'email': pre_checkout_query.order_info.email,
-        'country_code':
-            pre_checkout_query.order_info.shipping_address.country_code,
-        'state': pre_checkout_query.order_info.shipping_address.state,
-        'city': pre_checkout_query.order_info.shipping_address.city,
-        'street_line1':
-            pre_checkout_query.order_info.shipping_address.street_line1,
-        'street_line2':
-            pre_checkout_query.order_info.shipping_address.street_line2,
-        'post_code': pre_checkout_query.order_info.shipping_address.post_code
+        'name': info.name,
+        'phone_number': info.phone_number,
+        'email': info.email,
+        'country_code': address.country_code,
+        'state': address.state,
+        'city': address.city,
+        'street_line1': address.street_line1,
+        'street_line2': address.street_line2,
+        'post_code': address.post_code
     }
-    order = (pre_checkout_query.from_user.id, pre_checkout_query.id,
-             f'{order_info}')
-    await sqlite_db.sql_add_order(order)
+    await cart_buffer.flush(pre_checkout_query.from_user.id)
+    lines = await sqlite_db.sql_select_cart_lines(
+        pre_checkout_query.from_user.id
+    )
+    items = [
+        (product_id, quantity, round(float(price) * 100))
+        for product_id, _, _, price, _, quantity in lines
+    ]
+    try:
+        await sqlite_db.sql_add_order(order, items)
+    except RuntimeError:
+        return await bot.answer_pre_checkout_query(
+            pre_checkout_query.id, ok=False,
+            error_message='Не удалось оформить заказ, попробуйте позже'
+        )
     await bot.answer_pre_checkout_query(pre_checkout_query.id, ok=True)
 
 
 @router.message(F.successful_payment)
 async def successful_pay(message: Message, bot: Bot):
     """Сообщение об успешной оплате."""
-    await delete_messages(message, bot, 0)
+    await delete_messages(message, bot)
+    await cart_buffer.flush(message.from_user.id)
     await sqlite_db.sql_delete_all_cart(message.from_user.id)
     await bot.send_message(
         message.chat.id,
@@ -0,0 +1,141 @@
+import html
+
+from aiogram import Bot, Router
+from aiogram.filters import Command, CommandObject
+from aiogram.types import (
+    CallbackQuery,
+    InlineQuery,
+    InlineQueryResultArticle,
+    InlineQueryResultCachedPhoto,
+    InputTextMessageContent,
+    Message,
+)
+
+from catalog import catalog
+from config import config
+from core.handlers.basic import delete_messages, show_shop_command
+from core.handlers.callbacks import callback_handler
+from core.keyboards import keyboards
+from core.utils.callback_data import Op
+from core.utils.product_search import product_search
+from media import DETAIL, THUMBNAIL, media
+
+
+router = Router()
+
+"""Наибольшее число результатов в ответе на inline-запрос (лимит API)"""
+INLINE_PAGE_SIZE = 20
+
+
+@router.message(Command(commands='search'))
+async def search_command(message: Message, bot: Bot,
+                         command: CommandObject):
+    """Поиск товаров по названию и описанию (/search запрос)."""
+    if not command.args:
+        await delete_messages(message, bot)
+        return await bot.send_message(message.chat.id,
+                                      'Укажите запрос: /search чайник')
+
+    product_search.remember(message.chat.id, command.args)
+    await show_search_results(message, bot, command.args)
+
+
+@callback_handler(Op.SEARCH_PAGE)
+async def search_page_callback_run(query: CallbackQuery, bot: Bot, op: Op,
+                                   page: int):
+    """Переключение страниц результатов поиска."""
+    text = product_search.last_query(query.message.chat.id)
+    if text is None:
+        return await query.answer('Поиск устарел, повторите /search.')
+    await query.answer()
+    await show_search_results(query.message, bot, text,
+                              (page - 1) * config.search_page_size)
+
+
+@callback_handler(Op.SEARCH_OPEN)
+async def search_open_callback_run(query: CallbackQuery, bot: Bot, op: Op,
+                                   product_id: int):
+    """Открытие найденного товара в карусели магазина."""
+    product = catalog.get(product_id)
+    if product is None:
+        return await query.answer('Товар больше не продаётся.')
+    await query.answer()
+    await show_shop_command(query.message, bot,
+                            index=catalog.index_of(product_id),
+                            product=product)
+
+
+async def show_search_results(message: Message, bot: Bot, text: str,
+                              offset=0):
+    """
+    Вывод страницы результатов поиска: альбом миниатюр товаров страницы,
+    кнопка на каждый товар и стрелки между страницами. Предыдущая
+    страница удаляется.
+    """
+    await delete_messages(message, bot)
+    limit = config.search_page_size
+    total, products = await product_search.search(text, offset, limit)
+    if not products:
+        return await bot.send_message(
+            message.chat.id,
+            f'По запросу «{html.escape(text)}» ничего не найдено'
+        )
+
+    album = media.media_group(
+        ((product.id, product.img, html.escape(product.name))
+         for product in products),
+        THUMBNAIL
+    )
+    if len(album) > 1:
+        await bot.send_media_group(message.chat.id, album)
+
+    page, pages = offset // limit + 1, (total + limit - 1) // limit
+    await bot.send_message(
+        message.chat.id,
+        f'Найдено по запросу «{html.escape(text)}»: {total}',
+        reply_markup=keyboards.search_keyboard(message.chat.id, products,
+                                               page, pages)
+    )
+
+
+@router.inline_query()
+async def search_inline_query(inline_query: InlineQuery):
+    """
+    Поиск товаров в inline-режиме (@бот запрос в любом чате). Результаты
+    выдаются страницами, следующая страница запрашивается клиентом по
+    next_offset. Inline-режим включается у @BotFather (/setinline).
+    """
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    total, products = await product_search.search(inline_query.query, offset,
+                                                  INLINE_PAGE_SIZE)
+
+    results = []
+    for product in products:
+        caption = (f'Название: {html.escape(product.name)}\n'
+                   f'Описание: {html.escape(product.description or "")}\n'
+                   f'Цена: {product.price}')
+        photo = media.file_id(product.id, DETAIL, product.img)
+        if photo:
+            results.append(InlineQueryResultCachedPhoto(
+                id=str(product.id),
+                photo_file_id=photo,
+                title=product.name,
+                description=f'{product.price}',
+                caption=caption
+            ))
+        else:
+            results.append(InlineQueryResultArticle(
+                id=str(product.id),
+                title=product.name,
+                description=f'{product.price}',
+                input_message_content=InputTextMessageContent(
+                    message_text=caption
+                )
+            ))
+
+    next_offset = offset + len(products)
+    await inline_query.answer(
+        results,
+        cache_time=60,
+        next_offset=str(next_offset) if next_offset < total else ''
+    )
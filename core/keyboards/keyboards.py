@@ -5,11 +5,21 @@ from aiogram.types import (
     InlineKeyboardMarkup
 )
 
+from catalog import (
+    SORT_ID,
+    SORT_PRICE,
+    SORT_PRICE_DESC,
+    Product,
+    ProductFilter,
+)
+from core.utils.callback_data import Op, codec
+
 """Клавиатура админа"""
 admin_keyboard = ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton(text='Добавить')],
-        [KeyboardButton(text='Удалить')]
+        [KeyboardButton(text='Удалить')],
+        [KeyboardButton(text='Выгрузка'), KeyboardButton(text='Отчёт')]
     ],
     resize_keyboard=True
 )
@@ -19,6 +29,214 @@ pay_keyboard = InlineKeyboardMarkup(
     inline_keyboard=[[InlineKeyboardButton(text='Оплатить заказ', pay=True)]]
 )
 
+"""Кнопки порядка товаров в отфильтрованном каталоге"""
+SORT_BUTTONS = (
+    (SORT_ID, 'По порядку'),
+    (SORT_PRICE, 'Дешевле'),
+    (SORT_PRICE_DESC, 'Дороже'),
+)
+
+
+def product_caption(name: str, description: str | None,
+                    price: int | float, quantity: int | None = None) -> str:
+    """Подпись карточки товара (с количеством - для корзины)."""
+    caption = (f'Название: {name}\n'
+               f'Описание: {description}\n'
+               f'Цена: {price}')
+    if quantity is not None:
+        caption += f'\nКоличество: {quantity}'
+    return caption
+
+
+def carousel_row(chat_id: int, prev_op: Op, next_op: Op, index: int,
+                 page: int, *fields: int) -> list[InlineKeyboardButton]:
+    """
+    Ряд стрелок карусели "← index/page →". Стрелки передают поля fields и
+    номер соседней страницы (по кругу).
+    """
+    return [
+        InlineKeyboardButton(
+            text='← ',
+            callback_data=codec.pack(chat_id, prev_op, *fields,
+                                     index - 1 if index != 1 else page)
+        ),
+        InlineKeyboardButton(
+            text=f'{index}/{page}',
+            callback_data=codec.pack(chat_id, Op.NOOP)
+        ),
+        InlineKeyboardButton(
+            text=' →',
+            callback_data=codec.pack(chat_id, next_op, *fields,
+                                     index + 1 if index != page else 1)
+        )
+    ]
+
+
+def shop_keyboard(chat_id: int, product: Product, index: int,
+                  page: int) -> InlineKeyboardMarkup:
+    """Клавиатура карусели магазина."""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            carousel_row(chat_id, Op.SHOP_PREV, Op.SHOP_NEXT, index, page,
+                         product.id),
+            [InlineKeyboardButton(
+                text=f'Добавить в корзину "{product.name}"',
+                callback_data=codec.pack(chat_id, Op.ADD_CART, product.id)
+            )]
+        ]
+    )
+
+
+def filter_keyboard(chat_id: int, product: Product,
+                    product_filter: ProductFilter, index: int,
+                    page: int) -> InlineKeyboardMarkup:
+    """
+    Клавиатура карусели отфильтрованного каталога: стрелки, порядок
+    товаров, добавление в корзину и возврат к категориям.
+    """
+    fields = product_filter.fields()
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            carousel_row(chat_id, Op.FILTER_PREV, Op.FILTER_NEXT, index,
+                         page, *fields, product.id),
+            [
+                InlineKeyboardButton(
+                    text=f'• {text}' if sort == product_filter.sort
+                    else text,
+                    callback_data=codec.pack(
+                        chat_id, Op.FILTER_PAGE,
+                        *product_filter.sorted_by(sort).fields()
+                    )
+                )
+                for sort, text in SORT_BUTTONS
+            ],
+            [InlineKeyboardButton(
+                text=f'Добавить в корзину "{product.name}"',
+                callback_data=codec.pack(chat_id, Op.ADD_CART, product.id)
+            )],
+            [InlineKeyboardButton(
+                text='Категории',
+                callback_data=codec.pack(chat_id, Op.CATEGORIES, *fields)
+            )]
+        ]
+    )
+
+
+def cart_keyboard(chat_id: int, product_id: int, name: str, quantity: int,
+                  index: int, page: int) -> InlineKeyboardMarkup:
+    """Клавиатура карусели корзины: стрелки, количество и удаление."""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            carousel_row(chat_id, Op.CART_PREV, Op.CART_NEXT, index, page,
+                         product_id),
+            [
+                InlineKeyboardButton(
+                    text='−',
+                    callback_data=codec.pack(chat_id, Op.CART_DEC,
+                                             product_id, index, page)
+                ),
+                InlineKeyboardButton(
+                    text=f'{quantity} шт.',
+                    callback_data=codec.pack(chat_id, Op.NOOP)
+                ),
+                InlineKeyboardButton(
+                    text='+',
+                    callback_data=codec.pack(chat_id, Op.CART_INC,
+                                             product_id, index, page)
+                )
+            ],
+            [InlineKeyboardButton(
+                text=f'Удалить из корзины "{name}"',
+                callback_data=codec.pack(chat_id, Op.DEL_CART, product_id,
+                                         index, page)
+            )]
+        ]
+    )
+
+
+def delete_item_keyboard(chat_id: int, product: Product, index: int,
+                         page: int) -> InlineKeyboardMarkup:
+    """Клавиатура карусели удаления товаров (админ)."""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            carousel_row(chat_id, Op.DEL_ITEM_PREV, Op.DEL_ITEM_NEXT, index,
+                         page, product.id),
+            [InlineKeyboardButton(
+                text=f'Удалить продукт "{product.name}"',
+                callback_data=codec.pack(chat_id, Op.DEL_PRODUCT, product.id,
+                                         index, page)
+            )]
+        ]
+    )
+
+
+def search_keyboard(chat_id: int, products: list[Product], page: int,
+                    pages: int) -> InlineKeyboardMarkup:
+    """
+    Клавиатура результатов поиска: кнопка на каждый товар и стрелки между
+    страницами.
+    """
+    keyboard = [
+        [InlineKeyboardButton(
+            text=f'{product.name} - {product.price}',
+            callback_data=codec.pack(chat_id, Op.SEARCH_OPEN, product.id)
+        )]
+        for product in products
+    ]
+    if pages > 1:
+        keyboard.append(carousel_row(chat_id, Op.SEARCH_PAGE,
+                                     Op.SEARCH_PAGE, page, pages))
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+"""Вариант "без категории" при добавлении товара"""
+NO_CATEGORY = 'Без категории'
+
+
+def category_keyboard(
+        chat_id: int,
+        categories: list[tuple[int, str, int]],
+        product_filter: ProductFilter | None = None
+) -> InlineKeyboardMarkup:
+    """
+    Клавиатура выбора категории: кнопка на каждую категорию (id, название,
+    количество товаров) и кнопка "Все товары". Ценовой диапазон и порядок
+    из product_filter сохраняются в кнопках.
+    """
+    product_filter = product_filter or ProductFilter()
+    _, tag_id, sort, min_price, max_price = product_filter.fields()
+    keyboard = [
+        [InlineKeyboardButton(
+            text=f'{name} ({count})',
+            callback_data=codec.pack(chat_id, Op.FILTER_PAGE, category_id,
+                                     tag_id, sort, min_price, max_price)
+        )]
+        for category_id, name, count in categories
+    ]
+    keyboard.append([InlineKeyboardButton(
+        text='Все товары',
+        callback_data=codec.pack(chat_id, Op.FILTER_PAGE, 0, tag_id, sort,
+                                 min_price, max_price)
+    )])
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+def category_reply_keyboard(
+        categories: list[tuple[int, str, int]]
+) -> ReplyKeyboardMarkup:
+    """
+    Клавиатура админа для выбора категории нового товара: существующие
+    категории по две в ряд и вариант "без категории". Новую категорию
+    можно ввести текстом.
+    """
+    names = [name for _, name, _ in categories]
+    keyboard = [[KeyboardButton(text=name) for name in names[i:i + 2]]
+                for i in range(0, len(names), 2)]
+    keyboard.append([KeyboardButton(text=NO_CATEGORY)])
+    return ReplyKeyboardMarkup(keyboard=keyboard, resize_keyboard=True,
+                               one_time_keyboard=True)
+
+
 # """Клавиатура основная"""
 # client_keyboard = ReplyKeyboardMarkup(keyboard=[
 #     [KeyboardButton(text='Привет, БотМэн!')],
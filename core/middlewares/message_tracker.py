@@ -0,0 +1,35 @@
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Message
+
+from core.utils.message_registry import MessageRegistry, track_messages
+
+
+class MessageTrackerMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: запоминает в реестре id всех сообщений,
+    отправленных ботом, чтобы затем удалить именно их. Запросы задач, в
+    которых track_messages выключен, не отслеживаются.
+    """
+    def __init__(self, registry: MessageRegistry) -> None:
+        self.registry = registry
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        result = await make_request(bot, method)
+        if not track_messages.get():
+            return result
+        messages = result if isinstance(result, list) else [result]
+        for message in messages:
+            if isinstance(message, Message):
+                self.registry.track(message.chat.id, message.message_id)
+        return result
@@ -0,0 +1,86 @@
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject
+
+from metrics import Metrics
+
+
+def handler_name(handler: HandlerObject | None) -> str:
+    """Имя обработчика для метрик: "модуль.функция" (basic.user_start_bot)."""
+    if handler is None:
+        return 'unknown'
+    callback = handler.callback
+    module = getattr(callback, '__module__', '').rsplit('.', 1)[-1]
+    return f'{module}.{getattr(callback, "__name__", type(callback).__name__)}'
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Внутренний middleware диспетчера: замеряет время каждого обработчика
+    (гистограмма "handler_seconds" с метками event и handler) и считает
+    ошибки обработчиков ("handler_errors_total").
+    """
+    def __init__(self, metrics: Metrics) -> None:
+        self.metrics = metrics
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict[str, Any]],
+                              Awaitable[Any]],
+            event: TelegramObject,
+            data: dict[str, Any]
+    ) -> Any:
+        name = handler_name(data.get('handler'))
+        event_type = type(event).__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            self.metrics.inc('handler_errors_total', event=event_type,
+                             handler=name, error=type(e).__name__)
+            raise
+        finally:
+            self.metrics.observe('handler_seconds',
+                                 time.perf_counter() - started,
+                                 event=event_type, handler=name)
+
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: считает запросы к Bot API и ошибки по методам
+    ("api_requests_total", "api_errors_total") и замеряет время ответа
+    Telegram ("api_seconds"). Регистрируется после планировщика запросов,
+    поэтому ожидание лимита в время не входит, а каждый повтор после
+    ответа 429 считается отдельным запросом.
+    """
+    def __init__(self, metrics: Metrics) -> None:
+        self.metrics = metrics
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        api_method = method.__api_method__
+        self.metrics.inc('api_requests_total', method=api_method)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            self.metrics.inc('api_errors_total', method=api_method,
+                             error=type(e).__name__)
+            raise
+        finally:
+            self.metrics.observe('api_seconds',
+                                 time.perf_counter() - started,
+                                 method=api_method)
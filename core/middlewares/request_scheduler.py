@@ -0,0 +1,85 @@
+import logging
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType,
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from core.utils.request_scheduler import (
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    PRIORITY_NORMAL,
+    RequestScheduler,
+    request_priority,
+)
+
+
+"""Служебные методы, которые не ограничиваются (long polling и т.п.)"""
+UNTHROTTLED_METHODS = frozenset({
+    'getUpdates', 'getMe', 'getWebhookInfo', 'setWebhook', 'deleteWebhook',
+    'logOut', 'close',
+})
+
+"""Приоритеты методов: ответы на оплату - первыми, удаление - последним"""
+METHOD_PRIORITIES = {
+    'answerPreCheckoutQuery': PRIORITY_HIGH,
+    'answerShippingQuery': PRIORITY_HIGH,
+    'answerCallbackQuery': PRIORITY_HIGH,
+    'deleteMessage': PRIORITY_LOW,
+    'deleteMessages': PRIORITY_LOW,
+}
+
+"""Методы, которые учитываются в лимите сообщений чата"""
+CHAT_LIMITED_PREFIXES = ('send', 'edit', 'copy', 'forward')
+
+
+class RequestSchedulerMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: пропускает запросы к Bot API через планировщик
+    (общий лимит, лимит на чат, приоритеты) и при ответе 429 повторяет
+    запрос после паузы retry_after. Приоритет берётся из request_priority,
+    если он задан для текущей задачи, иначе - по методу.
+    """
+    def __init__(
+            self,
+            scheduler: RequestScheduler,
+            max_retries: int = 3
+    ) -> None:
+        self.scheduler = scheduler
+        self.max_retries = max_retries
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        api_method = method.__api_method__
+        if api_method in UNTHROTTLED_METHODS:
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, 'chat_id', None)
+        priority = request_priority.get()
+        if priority is None:
+            priority = METHOD_PRIORITIES.get(api_method, PRIORITY_NORMAL)
+        per_chat = api_method.startswith(CHAT_LIMITED_PREFIXES)
+
+        attempt = 0
+        while True:
+            await self.scheduler.acquire(chat_id, priority, per_chat)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                logging.warning(
+                    f"Flood control Telegram ({api_method}, чат {chat_id}): "
+                    f"повтор через {e.retry_after} с"
+                )
+                self.scheduler.retry_after(chat_id, e.retry_after)
+                per_chat = chat_id is not None
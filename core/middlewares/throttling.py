@@ -0,0 +1,117 @@
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramAPIError
+from aiogram.types import TelegramObject, Update, User
+
+from core.utils.request_scheduler import TokenBucket
+
+
+"""Обновления, которые не ограничиваются (оплата должна пройти всегда)"""
+UNTHROTTLED_EVENTS = frozenset({
+    'pre_checkout_query', 'shipping_query', 'payment',
+})
+
+
+def update_kind(update: Update) -> str:
+    """
+    Класс обновления для лимита: "command", "message", "callback",
+    "inline", "payment" (сообщение об оплате или счёт) или тип события.
+    """
+    if update.message is not None:
+        if update.message.successful_payment is not None or \
+                update.message.invoice is not None:
+            return 'payment'
+        text = update.message.text or ''
+        return 'command' if text.startswith('/') else 'message'
+    if update.callback_query is not None:
+        return 'callback'
+    if update.inline_query is not None:
+        return 'inline'
+    return update.event_type
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Внешний middleware диспетчера: ограничивает частоту обновлений от
+    каждого пользователя. Для каждого пользователя и класса обновлений
+    (команды, сообщения, нажатия кнопок, inline-запросы) ведётся своё ведро
+    токенов с лимитом из limits, обновления сверх лимита молча
+    отбрасываются. Нажатие кнопки, пришедшее, пока в том же чате ещё
+    обрабатывается нажатие той же кнопки (те же callback_data), тоже
+    отбрасывается - повторные нажатия стрелок не порождают очередь правок
+    одного сообщения. На отброшенное повторное нажатие бот отвечает
+    пустым answerCallbackQuery, чтобы у клиента не зависал индикатор.
+
+    :ivar limits: Лимиты по классам обновлений: (запросов в секунду,
+        максимальная серия)
+    :ivar dropped: Количество отброшенных обновлений по классам
+    """
+    def __init__(
+            self,
+            limits: dict[str, tuple[float, int]],
+            max_users: int = 10_000
+    ) -> None:
+        self.limits = limits
+        self.max_users = max_users
+        self._buckets: OrderedDict[tuple[int, str], TokenBucket] = \
+            OrderedDict()
+        self._in_flight: set[tuple[int, str | None]] = set()
+        self.dropped: dict[str, int] = {}
+
+    async def __call__(
+            self,
+            handler: Callable[[TelegramObject, dict[str, Any]],
+                              Awaitable[Any]],
+            event: Update,
+            data: dict[str, Any]
+    ) -> Any:
+        kind = update_kind(event)
+        if kind in UNTHROTTLED_EVENTS:
+            return await handler(event, data)
+
+        user: User | None = data.get('event_from_user')
+        limit = self.limits.get(kind)
+        if user is not None and limit is not None:
+            bucket = self._bucket(user.id, kind, limit)
+            if bucket.delay() > 0:
+                return self._drop(kind, user.id)
+            bucket.take()
+
+        if kind != 'callback' or event.callback_query.message is None:
+            return await handler(event, data)
+
+        query = event.callback_query
+        key = (query.message.chat.id, query.data)
+        if key in self._in_flight:
+            self._drop('callback_in_flight', query.message.chat.id)
+            try:
+                await query.answer()
+            except TelegramAPIError as e:
+                logging.debug(f"Нажатие {query.id} не подтверждено: {e}")
+            return
+        self._in_flight.add(key)
+        try:
+            return await handler(event, data)
+        finally:
+            self._in_flight.discard(key)
+
+    def _bucket(self, user_id: int, kind: str,
+                limit: tuple[float, int]) -> TokenBucket:
+        """Возвращает ведро пользователя, давно неактивные вытесняются."""
+        key = (user_id, kind)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(*limit)
+            if len(self._buckets) > self.max_users:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _drop(self, kind: str, source_id: int) -> None:
+        """Учитывает отброшенное обновление."""
+        self.dropped[kind] = self.dropped.get(kind, 0) + 1
+        logging.debug(f"Отброшено обновление {kind} от {source_id}")
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramForbiddenError,
+)
+
+import sqlite_db
+from config import config
+from core.utils.message_registry import track_messages
+from core.utils.request_scheduler import (
+    PRIORITY_LOW,
+    TokenBucket,
+    request_priority,
+)
+
+
+class Broadcast:
+    """
+    Рассылка сообщения всем пользователям из таблицы "users". Получатели
+    читаются из БД порциями (keyset по user_id), каждая порция отправляется
+    пулом из workers одновременных задач не быстрее rate сообщений в
+    секунду и с низким приоритетом, чтобы не задерживать ответы
+    пользователям. Статусы доставки записываются в "broadcast_deliveries"
+    после каждой порции, поэтому прерванная рассылка продолжается с места
+    остановки (повторно могут получить сообщение не более batch_size
+    пользователей последней порции). Ход рассылки администратор видит в
+    сообщении, которое обновляется раз в report_interval секунд.
+    Сообщения рассылки не запоминаются в реестре сообщений бота.
+
+    :ivar id: Идентификатор рассылки в таблице "broadcasts"
+    :ivar chat_id: Чат администратора для отчёта о ходе рассылки
+    :ivar text: Текст рассылки
+    """
+    def __init__(
+            self,
+            bot: Bot,
+            broadcast_id: int,
+            chat_id: int,
+            text: str,
+            workers: int = 10,
+            rate: float = 20,
+            batch_size: int = 200,
+            report_interval: float = 10
+    ) -> None:
+        self.bot = bot
+        self.id = broadcast_id
+        self.chat_id = chat_id
+        self.text = text
+        self.workers = max(workers, 1)
+        self.batch_size = batch_size
+        self.report_interval = report_interval
+        self._bucket = TokenBucket(rate, workers)
+        self._counts: dict[str, int] = {}
+        self._started_at = time.monotonic()
+        self._sent_now = 0
+        self._report_message_id: int | None = None
+        self._reported_at = 0.0
+
+    async def run(self) -> None:
+        """Выполняет (или продолжает) рассылку до конца."""
+        request_priority.set(PRIORITY_LOW)
+        self._counts = await sqlite_db.sql_count_broadcast(self.id)
+        self._started_at = time.monotonic()
+        await self._report()
+
+        semaphore = asyncio.Semaphore(self.workers)
+        after_user_id = 0
+        while recipients := await sqlite_db.sql_select_broadcast_recipients(
+                self.id, after_user_id, self.batch_size
+        ):
+            deliveries = await asyncio.gather(
+                *(self._deliver(user_id, semaphore) for user_id in recipients)
+            )
+            await sqlite_db.sql_add_broadcast_deliveries(self.id, deliveries)
+            for _, status in deliveries:
+                self._counts[status] = self._counts.get(status, 0) + 1
+            self._sent_now += len(deliveries)
+            after_user_id = recipients[-1]
+
+            if time.monotonic() - self._reported_at >= self.report_interval:
+                await self._report()
+
+        await sqlite_db.sql_finish_broadcast(self.id)
+        await self._report(finished=True)
+
+    async def _deliver(self, user_id: int,
+                       semaphore: asyncio.Semaphore) -> tuple[int, str]:
+        """Отправляет сообщение пользователю, возвращает статус доставки."""
+        async with semaphore:
+            delay = self._bucket.take()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            token = track_messages.set(False)
+            try:
+                await self.bot.send_message(user_id, self.text)
+                return user_id, 'sent'
+            except TelegramForbiddenError:
+                return user_id, 'blocked'
+            except TelegramAPIError as e:
+                logging.debug(f"Рассылка {self.id}, пользователь {user_id}: "
+                              f"{e}")
+                return user_id, 'failed'
+            finally:
+                track_messages.reset(token)
+
+    async def _report(self, finished: bool = False) -> None:
+        """Отправляет или обновляет сообщение о ходе рассылки."""
+        self._reported_at = time.monotonic()
+        total = self._counts.get('total', 0)
+        sent = self._counts.get('sent', 0)
+        failed = self._counts.get('failed', 0) + self._counts.get('blocked',
+                                                                  0)
+        elapsed = time.monotonic() - self._started_at
+        speed = self._sent_now / elapsed if elapsed > 0 else 0.0
+        left = max(total - sent - failed, 0)
+
+        text = (f'Рассылка #{self.id}: '
+                f'{"завершена" if finished else "идёт"}\n'
+                f'Доставлено: {sent} из {total}, не доставлено: {failed}\n'
+                f'Скорость: {speed:.1f} сообщ./с')
+        if not finished and speed > 0:
+            text += f', осталось ~{int(left / speed)} с'
+
+        try:
+            if self._report_message_id is None:
+                message = await self.bot.send_message(self.chat_id, text)
+                self._report_message_id = message.message_id
+            else:
+                await self.bot.edit_message_text(
+                    text,
+                    chat_id=self.chat_id,
+                    message_id=self._report_message_id
+                )
+        except TelegramBadRequest:
+            self._report_message_id = None
+        except TelegramAPIError as e:
+            logging.warning(f"Не удалось отправить отчёт о рассылке: {e}")
+
+
+class Broadcaster:
+    """
+    Запуск рассылок фоновыми задачами: новые рассылки по команде
+    администратора и продолжение незавершённых после перезапуска бота.
+    """
+    def __init__(self, **options: int | float) -> None:
+        self.options = options
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def start(self, bot: Bot, broadcast_id: int, chat_id: int,
+              text: str) -> None:
+        """Запускает рассылку в фоне, если она ещё не выполняется."""
+        task = self._tasks.get(broadcast_id)
+        if task is not None and not task.done():
+            return
+        broadcast = Broadcast(bot, broadcast_id, chat_id, text,
+                              **self.options)
+        task = asyncio.create_task(self._run(broadcast))
+        self._tasks[broadcast_id] = task
+
+    async def resume(self, bot: Bot) -> None:
+        """Продолжает рассылки, прерванные остановкой бота."""
+        for broadcast_id, chat_id, text in \
+                await sqlite_db.sql_select_unfinished_broadcasts():
+            logging.info(f"Продолжение рассылки {broadcast_id}")
+            self.start(bot, broadcast_id, chat_id, text)
+
+    async def close(self) -> None:
+        """Останавливает выполняющиеся рассылки."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def _run(self, broadcast: Broadcast) -> None:
+        """Выполняет рассылку и снимает задачу с учёта."""
+        try:
+            await broadcast.run()
+        except asyncio.CancelledError:
+            logging.info(f"Рассылка {broadcast.id} прервана")
+            raise
+        except Exception as e:
+            logging.error(f"Ошибка рассылки {broadcast.id}: {e}",
+                          exc_info=True)
+        finally:
+            self._tasks.pop(broadcast.id, None)
+
+
+broadcaster = Broadcaster(workers=config.broadcast_workers,
+                          rate=config.broadcast_rate,
+                          batch_size=config.broadcast_batch)
@@ -0,0 +1,107 @@
+import hashlib
+import hmac
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from enum import IntEnum
+
+from config import config
+
+
+class Op(IntEnum):
+    """Коды действий inline-кнопок (первый байт callback_data)."""
+    NOOP = 0
+    SHOP_PREV = 1
+    SHOP_NEXT = 2
+    ADD_CART = 3
+    CART_PREV = 4
+    CART_NEXT = 5
+    DEL_CART = 6
+    DEL_ITEM_PREV = 7
+    DEL_ITEM_NEXT = 8
+    DEL_PRODUCT = 9
+    CART_INC = 10
+    CART_DEC = 11
+    SEARCH_PAGE = 12
+    SEARCH_OPEN = 13
+    FILTER_PAGE = 14
+    CATEGORIES = 15
+    FILTER_PREV = 16
+    FILTER_NEXT = 17
+
+
+def write_varint(value: int, buffer: bytearray) -> None:
+    """Дописывает неотрицательное целое в формате varint (LEB128)."""
+    if value < 0:
+        raise ValueError(f'Отрицательное значение поля: {value}')
+    while value > 0x7F:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def read_varints(data: bytes) -> list[int]:
+    """Читает последовательность целых в формате varint (LEB128)."""
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    if shift:
+        raise ValueError('Оборванное поле varint')
+    return values
+
+
+class CallbackCodec:
+    """
+    Компактный формат callback_data: код действия (1 байт), числовые поля
+    в формате varint и HMAC-подпись, привязанная к чату. Результат
+    кодируется в base64 и укладывается в лимит Telegram в 64 байта. Кнопку
+    нельзя подделать или переслать в другой чат - подпись не сойдётся.
+
+    :ivar tag_size: Длина подписи в байтах
+    """
+    def __init__(self, key: bytes, tag_size: int = 8) -> None:
+        self._key = key
+        self.tag_size = tag_size
+
+    def pack(self, chat_id: int, op: Op, *fields: int) -> str:
+        """Кодирует действие op с полями fields для кнопки в чате chat_id."""
+        payload = bytearray((op,))
+        for field in fields:
+            write_varint(int(field), payload)
+        payload += self._sign(chat_id, payload)
+        return urlsafe_b64encode(payload).rstrip(b'=').decode()
+
+    def unpack(self, chat_id: int, data: str) -> tuple[Op, list[int]]:
+        """
+        Декодирует callback_data кнопки из чата chat_id. Возвращает код
+        действия и поля. ValueError, если данные повреждены или подпись
+        неверна.
+        """
+        try:
+            raw = urlsafe_b64decode(data + '=' * (-len(data) % 4))
+        except (ValueError, TypeError) as e:
+            raise ValueError('callback_data не в формате base64') from e
+
+        payload, tag = raw[:-self.tag_size], raw[-self.tag_size:]
+        if not payload or not hmac.compare_digest(
+                tag, self._sign(chat_id, payload)
+        ):
+            raise ValueError('Неверная подпись callback_data')
+        return Op(payload[0]), read_varints(payload[1:])
+
+    def _sign(self, chat_id: int, payload: bytes) -> bytes:
+        """Подпись данных кнопки, привязанная к чату."""
+        message = bytes(payload) + chat_id.to_bytes(8, 'big', signed=True)
+        return hmac.new(self._key, message,
+                        hashlib.sha256).digest()[:self.tag_size]
+
+
+codec = CallbackCodec(hashlib.sha256(
+    b'callback_data:'
+    + (config.callback_secret.get_secret_value()
+       or config.bot_token.get_secret_value()).encode()
+).digest())
@@ -0,0 +1,213 @@
+import json
+import logging
+import time
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from sqlite_db import Database
+
+
+class ExpiringMemoryStorage(MemoryStorage):
+    """
+    Хранилище состояний в памяти процесса, которое забывает записи, не
+    менявшиеся дольше ttl секунд (брошенные диалоги). Устаревшие записи
+    удаляются не чаще раза в purge_interval секунд при очередной записи.
+    Подходит только для одного экземпляра бота.
+
+    :ivar ttl: Время жизни записи в секундах
+    :ivar purge_interval: Период очистки устаревших записей в секундах
+    """
+    def __init__(self, ttl: float, purge_interval: float = 60) -> None:
+        super().__init__()
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._touched: dict[StorageKey, float] = {}
+        self._purged_at = time.monotonic()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await super().set_state(key, state)
+        self._touch(key)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        record = self.storage.get(key)
+        return record.state if record else None
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        await super().set_data(key, data)
+        self._touch(key)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        record = self.storage.get(key)
+        return record.data.copy() if record else {}
+
+    def purge(self) -> None:
+        """Удаляет записи, которые не менялись дольше ttl секунд."""
+        now = time.monotonic()
+        deadline = now - self.ttl
+        for key in [key for key, touched_at in self._touched.items()
+                    if touched_at < deadline]:
+            del self._touched[key]
+            self.storage.pop(key, None)
+        self._purged_at = now
+
+    def _touch(self, key: StorageKey) -> None:
+        """Отмечает изменение записи, пустые записи удаляются сразу."""
+        record = self.storage[key]
+        if record.state is None and not record.data:
+            self.storage.pop(key, None)
+            self._touched.pop(key, None)
+        else:
+            self._touched[key] = time.monotonic()
+
+        if time.monotonic() - self._purged_at > self.purge_interval:
+            self.purge()
+
+
+class SQLiteStorage(BaseStorage):
+    """
+    Хранилище состояний в таблице "fsm_storage" файла SQLite (через
+    отдельное соединение Database). Записи, не менявшиеся дольше ttl
+    секунд, считаются отсутствующими и удаляются не чаще раза в
+    purge_interval секунд.
+
+    :ivar database: Соединение с базой данных
+    :ivar ttl: Время жизни записи в секундах
+    :ivar purge_interval: Период очистки устаревших записей в секундах
+    """
+    def __init__(
+            self,
+            database: Database,
+            ttl: float,
+            purge_interval: float = 60
+    ) -> None:
+        self.database = database
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._purged_at = 0.0
+
+    async def open(self) -> None:
+        """Подключается к БД и создаёт таблицу, если её нет."""
+        await self.database.connect()
+        await self.database.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS fsm_storage(
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        await self.database.connection.commit()
+
+    async def close(self) -> None:
+        await self.database.close()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await self._upsert(key, 'state', state)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        row = await self._select(key)
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        await self._upsert(key, 'data', json.dumps(data) if data else None)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        row = await self._select(key)
+        return json.loads(row[1]) if row and row[1] else {}
+
+    async def purge(self) -> None:
+        """Удаляет записи, которые не менялись дольше ttl секунд."""
+        try:
+            async with self.database.connection.execute(
+                    "DELETE FROM fsm_storage WHERE updated_at < ?",
+                    (time.time() - self.ttl,)
+            ) as cursor:
+                if cursor.rowcount > 0:
+                    logging.info(
+                        f"Удалено брошенных диалогов: {cursor.rowcount}"
+                    )
+            await self.database.connection.commit()
+            self._purged_at = time.monotonic()
+
+        except Exception as e:
+            logging.error(f"Ошибка очистки состояний FSM: {e}",
+                          exc_info=True)
+
+    async def _select(self, key: StorageKey) -> tuple | None:
+        """Возвращает (state, data) записи, если она не устарела."""
+        async with self.database.connection.execute(
+                """
+                SELECT state, data FROM fsm_storage
+                WHERE key = ? AND updated_at >= ?
+                """,
+                (self._key(key), time.time() - self.ttl)
+        ) as cursor:
+            return await cursor.fetchone()
+
+    async def _upsert(self, key: StorageKey, column: str,
+                      value: str | None) -> None:
+        """Записывает state или data, пустые записи удаляются."""
+        connection = self.database.connection
+        await connection.execute(
+            f"""
+            INSERT INTO fsm_storage (key, {column}, updated_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET
+                {column} = excluded.{column},
+                updated_at = excluded.updated_at
+            """,
+            (self._key(key), value, time.time())
+        )
+        await connection.execute(
+            """
+            DELETE FROM fsm_storage
+            WHERE key = ? AND state IS NULL AND data IS NULL
+            """,
+            (self._key(key),)
+        )
+        await connection.commit()
+
+        if time.monotonic() - self._purged_at > self.purge_interval:
+            await self.purge()
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        """Строковый ключ записи."""
+        return (f'{key.bot_id}:{key.chat_id}:{key.user_id}:'
+                f'{key.thread_id or ""}:{key.destiny}')
+
+
+async def create_storage(
+        kind: str,
+        ttl: float,
+        redis_url: str = '',
+        db_path: str = ''
+) -> BaseStorage:
+    """
+    Создаёт хранилище состояний FSM: "memory" (в памяти процесса),
+    "redis" (общее для нескольких экземпляров бота) или "sqlite".
+    """
+    if kind == 'redis':
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError as e:
+            raise RuntimeError(
+                'Для хранилища "redis" установите пакет redis'
+            ) from e
+        return RedisStorage.from_url(redis_url, state_ttl=int(ttl),
+                                     data_ttl=int(ttl))
+
+    if kind == 'sqlite':
+        storage = SQLiteStorage(Database(db_path), ttl)
+        await storage.open()
+        return storage
+
+    if kind != 'memory':
+        raise ValueError(f'Неизвестное хранилище состояний: {kind}')
+    return ExpiringMemoryStorage(ttl)
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramNotFound
+from aiogram.methods import TelegramMethod
+
+
+"""
+Запоминать ли сообщения, отправленные текущей задачей (рассылка их не
+запоминает, чтобы не вытеснять из реестра чаты активных пользователей)
+"""
+track_messages: ContextVar[bool] = ContextVar('track_messages', default=True)
+
+
+class DeleteMessages(TelegramMethod[bool]):
+    """
+    Метод Bot API "deleteMessages" - удаление до 100 сообщений чата одним
+    запросом (несуществующие сообщения пропускаются).
+    """
+    __returning__ = bool
+    __api_method__ = 'deleteMessages'
+
+    chat_id: int | str
+    message_ids: list[int]
+
+
+class MessageRegistry:
+    """
+    Реестр id сообщений бота по чатам. Хранит для каждого чата не более
+    max_messages последних id, id старше ttl секунд отбрасываются (Telegram
+    не даёт ботам удалять сообщения старше 48 часов). Количество чатов
+    ограничено max_chats, первыми вытесняются давно неактивные чаты.
+
+    :ivar max_messages: Максимум отслеживаемых сообщений в одном чате
+    :ivar max_chats: Максимум отслеживаемых чатов
+    :ivar ttl: Время жизни записи в секундах
+    :ivar batch_delete: Доступен ли метод "deleteMessages"
+    """
+    def __init__(
+            self,
+            max_messages: int = 20,
+            max_chats: int = 100_000,
+            ttl: float = 47 * 3600
+    ) -> None:
+        self.max_messages = max_messages
+        self.max_chats = max_chats
+        self.ttl = ttl
+        self.batch_delete = True
+        self._chats: OrderedDict[int, deque[tuple[int, float]]] = (
+            OrderedDict()
+        )
+
+    def track(self, chat_id: int, message_id: int) -> None:
+        """Запоминает id сообщения в чате."""
+        messages = self._chats.get(chat_id)
+        if messages is None:
+            messages = self._chats[chat_id] = deque(maxlen=self.max_messages)
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+            for entry in messages:
+                if entry[0] == message_id:
+                    messages.remove(entry)
+                    break
+        messages.append((message_id, time.monotonic()))
+
+    def pop(self, chat_id: int, exclude: int | None = None) -> list[int]:
+        """
+        Возвращает и забывает id ещё не устаревших сообщений чата. Сообщение
+        exclude остаётся в реестре.
+        """
+        messages = self._chats.pop(chat_id, None)
+        if not messages:
+            return []
+
+        deadline = time.monotonic() - self.ttl
+        message_ids = []
+        for message_id, tracked_at in messages:
+            if message_id == exclude:
+                self.track(chat_id, message_id)
+            elif tracked_at >= deadline:
+                message_ids.append(message_id)
+        return message_ids
+
+    async def delete(
+            self,
+            bot: Bot,
+            chat_id: int,
+            extra: list[int] | None = None,
+            exclude: int | None = None
+    ) -> None:
+        """
+        Удаляет отслеживаемые сообщения чата (кроме exclude) и сообщения
+        extra: пачками по 100 через "deleteMessages", а если метод
+        недоступен - одновременными вызовами "deleteMessage".
+        """
+        message_ids = sorted(set(self.pop(chat_id, exclude) + (extra or [])))
+        if not message_ids:
+            return
+
+        if self.batch_delete:
+            try:
+                for start in range(0, len(message_ids), 100):
+                    await bot(DeleteMessages(
+                        chat_id=chat_id,
+                        message_ids=message_ids[start:start + 100]
+                    ))
+                return
+            except TelegramNotFound:
+                self.batch_delete = False
+                logging.warning("Метод deleteMessages недоступен, удаление "
+                                "сообщений по одному")
+            except TelegramAPIError as e:
+                logging.debug(f"Ошибка пакетного удаления сообщений: {e}")
+
+        await asyncio.gather(
+            *(bot.delete_message(chat_id, message_id)
+              for message_id in message_ids),
+            return_exceptions=True
+        )
+
+
+registry = MessageRegistry()
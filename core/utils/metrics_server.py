@@ -0,0 +1,32 @@
+import logging
+
+from aiohttp import web
+
+from metrics import Metrics
+
+
+def create_metrics_app(metrics: Metrics) -> web.Application:
+    """
+    Создаёт aiohttp-приложение с метриками бота в формате Prometheus по
+    адресу "/metrics".
+    """
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=metrics.render(),
+                            content_type='text/plain', charset='utf-8')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    return app
+
+
+async def start_metrics_server(metrics: Metrics, host: str,
+                               port: int) -> web.AppRunner:
+    """
+    Поднимает HTTP-сервер метрик на host:port. Возвращает AppRunner,
+    сервер останавливается вызовом runner.cleanup().
+    """
+    runner = web.AppRunner(create_metrics_app(metrics))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
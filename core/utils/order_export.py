@@ -0,0 +1,37 @@
+import csv
+import json
+from typing import TextIO
+
+import sqlite_db
+
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+
+
+async def export_orders(file: TextIO, fmt: str = 'csv',
+                        chunk_size: int = 1000) -> int:
+    """
+    Записывает заказы из таблицы "orders" в текстовый файл file в формате
+    CSV (с заголовком) или JSONL (объект на строку). Заказы читаются из БД
+    порциями по chunk_size и сразу пишутся в файл, поэтому память не
+    зависит от числа заказов. Возвращает количество выгруженных заказов.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Неизвестный формат выгрузки: {fmt}')
+
+    columns = sqlite_db.ORDER_COLUMNS
+    writer = csv.writer(file)
+    if fmt == 'csv':
+        writer.writerow(columns)
+
+    count = 0
+    async for rows in sqlite_db.sql_iter_orders(chunk_size):
+        if fmt == 'csv':
+            writer.writerows(rows)
+        else:
+            file.writelines(
+                json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n'
+                for row in rows
+            )
+        count += len(rows)
+    return count
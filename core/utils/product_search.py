@@ -0,0 +1,65 @@
+from collections import OrderedDict
+
+import sqlite_db
+from catalog import Product, catalog
+from config import config
+
+
+class ProductSearch:
+    """
+    Поиск товаров с LRU-кэшем результатов. Страницы результатов кэшируются
+    по (версия каталога, запрос FTS5, смещение, размер страницы): изменение
+    каталога меняет версию, поэтому устаревшие страницы не выдаются и
+    вытесняются из кэша как давно неиспользуемые. Для постраничного вывода
+    команды /search запоминается последний запрос каждого чата.
+
+    :ivar max_size: Наибольшее количество страниц в кэше
+    :ivar hits: Количество ответов из кэша
+    :ivar misses: Количество запросов к БД
+    """
+    def __init__(self, max_size: int = 256, max_chats: int = 10_000) -> None:
+        self.max_size = max_size
+        self.max_chats = max_chats
+        self._cache: OrderedDict[tuple, tuple[int, list[Product]]] = \
+            OrderedDict()
+        self._queries: OrderedDict[int, str] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def search(
+            self,
+            text: str,
+            offset: int = 0,
+            limit: int = 5
+    ) -> tuple[int, list[Product]]:
+        """
+        Возвращает общее число найденных товаров и страницу результатов
+        (см. sqlite_db.sql_search_products).
+        """
+        key = (catalog.version, sqlite_db.search_query(text), offset, limit)
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        result = await sqlite_db.sql_search_products(text, limit, offset)
+        self._cache[key] = result
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def remember(self, chat_id: int, text: str) -> None:
+        """Запоминает последний запрос поиска в чате."""
+        self._queries[chat_id] = text
+        self._queries.move_to_end(chat_id)
+        if len(self._queries) > self.max_chats:
+            self._queries.popitem(last=False)
+
+    def last_query(self, chat_id: int) -> str | None:
+        """Последний запрос поиска в чате или None."""
+        return self._queries.get(chat_id)
+
+
+product_search = ProductSearch(config.search_cache_size)
@@ -0,0 +1,48 @@
+from collections import OrderedDict
+from typing import Callable
+
+from catalog import catalog
+from config import config
+
+
+class RenderCache:
+    """
+    LRU-кэш подписей карточек товаров для каруселей. Подпись не зависит от
+    чата, поэтому одна запись обслуживает всех пользователей, которые
+    открывают этот товар. Клавиатуры в кэш не входят: подпись
+    callback_data привязана к чату, и они строятся на каждый показ. Ключ -
+    (версия каталога, id товара, количество в корзине или None), поэтому
+    после изменения каталога подписи строятся заново, а устаревшие
+    вытесняются.
+
+    :ivar max_size: Наибольшее количество подписей в кэше
+    :ivar hits: Количество подписей, взятых из кэша
+    :ivar misses: Количество построенных подписей
+    """
+    def __init__(self, max_size: int = 4096) -> None:
+        self.max_size = max_size
+        self._captions: OrderedDict[tuple, str] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def caption(self, product_id: int, build: Callable[[], str],
+                quantity: int | None = None) -> str:
+        """
+        Возвращает подпись товара product_id (с количеством quantity - для
+        корзины) из кэша или строит её вызовом build().
+        """
+        key = (catalog.version, product_id, quantity)
+        caption = self._captions.get(key)
+        if caption is not None:
+            self._captions.move_to_end(key)
+            self.hits += 1
+            return caption
+
+        self.misses += 1
+        caption = self._captions[key] = build()
+        if len(self._captions) > self.max_size:
+            self._captions.popitem(last=False)
+        return caption
+
+
+render_cache = RenderCache(config.render_cache_size)
@@ -0,0 +1,198 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+"""Приоритет запросов текущей задачи (например, фоновой рассылки)"""
+request_priority: ContextVar[int | None] = ContextVar('request_priority',
+                                                      default=None)
+
+
+class TokenBucket:
+    """
+    Ведро токенов: не более rate запросов в секунду в среднем и не более
+    capacity запросов подряд. Токены можно брать в долг - тогда следующий
+    запрос дождётся погашения долга.
+
+    :ivar rate: Скорость пополнения (токенов в секунду)
+    :ivar capacity: Ёмкость ведра (максимальная серия запросов)
+    """
+    __slots__ = ('rate', 'capacity', '_tokens', '_updated_at')
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        """Начисляет токены за время, прошедшее с прошлого обращения."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def delay(self) -> float:
+        """Сколько секунд ждать до появления свободного токена."""
+        self._refill()
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def take(self) -> float:
+        """
+        Забирает токен (при необходимости в долг). Возвращает, сколько
+        секунд нужно подождать перед запросом.
+        """
+        delay = self.delay()
+        self._tokens -= 1
+        return delay
+
+    def block(self, seconds: float) -> None:
+        """Не выдаёт токены ближайшие seconds секунд (ответ retry_after)."""
+        self._refill()
+        self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+class RequestScheduler:
+    """
+    Планировщик исходящих запросов к Bot API. Ограничивает общую скорость
+    запросов (global-ведро) и скорость сообщений в каждый чат (ведро на
+    чат), а ожидающие запросы выпускает в порядке приоритета: высокий
+    приоритет (ответы на оплату) обгоняет обычный и низкий (удаление
+    сообщений).
+
+    :ivar requests: Количество выпущенных запросов
+    :ivar retries: Количество повторов после ответа retry_after
+    :ivar max_queue_depth: Наибольшая длина очереди
+    :ivar total_wait: Суммарное время ожидания запросов в секундах
+    :ivar max_wait: Наибольшее время ожидания запроса в секундах
+    """
+    def __init__(
+            self,
+            rate: float = 30,
+            burst: int = 30,
+            chat_rate: float = 1,
+            chat_burst: int = 3,
+            max_chats: int = 10_000
+    ) -> None:
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_chats = max_chats
+        self._global = TokenBucket(rate, burst)
+        self._chats: OrderedDict[int | str, TokenBucket] = OrderedDict()
+        self._queue: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self.requests = 0
+        self.retries = 0
+        self.max_queue_depth = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество запросов, ожидающих общий лимит."""
+        return len(self._queue)
+
+    async def acquire(
+            self,
+            chat_id: int | str | None = None,
+            priority: int = PRIORITY_NORMAL,
+            per_chat: bool = False
+    ) -> None:
+        """
+        Дожидается разрешения на запрос. При per_chat=True запрос также
+        учитывается в лимите чата chat_id.
+        """
+        started = time.monotonic()
+        if per_chat and chat_id is not None:
+            delay = self._chat_bucket(chat_id).take()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._counter), future))
+        self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        self._wakeup.set()
+        await future
+
+        wait = time.monotonic() - started
+        self.requests += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+
+    def retry_after(self, chat_id: int | str | None, seconds: float) -> None:
+        """
+        Учитывает ответ retry_after: приостанавливает запросы в чат chat_id,
+        а если чат не известен - все запросы.
+        """
+        self.retries += 1
+        if chat_id is None:
+            self._global.block(seconds)
+        else:
+            self._chat_bucket(chat_id).block(seconds)
+
+    def metrics(self) -> dict[str, int | float]:
+        """Снимок метрик планировщика."""
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'avg_wait': self.total_wait / self.requests if self.requests
+            else 0.0,
+            'max_wait': self.max_wait,
+        }
+
+    async def close(self) -> None:
+        """Останавливает планировщик, ожидающие запросы отменяются."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        while self._queue:
+            heapq.heappop(self._queue)[2].cancel()
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        """Возвращает ведро чата, давно неактивные чаты вытесняются."""
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate,
+                                                        self.chat_burst)
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    async def _run(self) -> None:
+        """Выпускает запросы из очереди по приоритету в пределах лимита."""
+        while True:
+            while not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+
+            delay = self._global.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            future = heapq.heappop(self._queue)[2]
+            if future.done():
+                continue
+            self._global.take()
+            future.set_result(None)
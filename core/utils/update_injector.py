@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import itertools
+import time
+from types import TracebackType
+from typing import Any, Type
+
+from aiohttp import ClientSession
+
+
+class UpdateInjector:
+    """
+    Локальная замена Telegram для проверки webhook-режима: формирует
+    синтетические обновления (сообщения, нажатия кнопок) и отправляет их
+    POST-запросом на webhook бота с секретным заголовком, как это делает
+    Telegram.
+
+    :ivar url: Полный адрес webhook бота
+    :ivar secret: Секретный токен webhook
+    """
+    def __init__(self, url: str, secret: str | None = None) -> None:
+        self.url = url
+        self.secret = secret
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._session: ClientSession | None = None
+
+    async def send(self, update: dict[str, Any]) -> int:
+        """Отправляет обновление на webhook. Возвращает HTTP-статус."""
+        if self._session is None:
+            self._session = ClientSession()
+        headers = {}
+        if self.secret:
+            headers['X-Telegram-Bot-Api-Secret-Token'] = self.secret
+        async with self._session.post(self.url, json=update,
+                                      headers=headers) as response:
+            return response.status
+
+    async def message(self, user_id: int, text: str,
+                      first_name: str = 'Test') -> int:
+        """Отправляет текстовое сообщение пользователя в личный чат."""
+        return await self.send({
+            'update_id': next(self._update_ids),
+            'message': self._message(user_id, first_name, text=text),
+        })
+
+    async def callback(self, user_id: int, data: str, message_id: int = 1,
+                       first_name: str = 'Test') -> int:
+        """Отправляет нажатие inline-кнопки с callback_data=data."""
+        message = self._message(user_id, first_name)
+        message['message_id'] = message_id
+        message['from'] = {'id': 1, 'is_bot': True, 'first_name': 'Bot'}
+        return await self.send({
+            'update_id': next(self._update_ids),
+            'callback_query': {
+                'id': str(next(self._update_ids)),
+                'from': self._user(user_id, first_name),
+                'chat_instance': str(user_id),
+                'message': message,
+                'data': data,
+            },
+        })
+
+    async def close(self) -> None:
+        """Закрывает HTTP-сессию."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> 'UpdateInjector':
+        return self
+
+    async def __aexit__(
+            self,
+            exc_type: Type[BaseException] | None,
+            exc: BaseException | None,
+            tb: TracebackType | None
+    ) -> None:
+        await self.close()
+
+    def _message(self, user_id: int, first_name: str,
+                 **fields: Any) -> dict[str, Any]:
+        """Формирует сообщение личного чата пользователя."""
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private',
+                     'first_name': first_name},
+            'from': self._user(user_id, first_name),
+            **fields,
+        }
+        if fields.get('text', '').startswith('/'):
+            command = fields['text'].split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0,
+                                    'length': len(command)}]
+        return message
+
+    @staticmethod
+    def _user(user_id: int, first_name: str) -> dict[str, Any]:
+        """Формирует пользователя Telegram."""
+        return {'id': user_id, 'is_bot': False, 'first_name': first_name}
+
+
+async def main() -> None:
+    """Отправка сообщений или нажатий кнопок на webhook из консоли."""
+    parser = argparse.ArgumentParser(
+        description='Отправка синтетических обновлений на webhook бота'
+    )
+    parser.add_argument('items', nargs='+',
+                        help='Тексты сообщений (или callback_data с -c)')
+    parser.add_argument('--url', default='http://127.0.0.1:8080/webhook')
+    parser.add_argument('--secret', default=None)
+    parser.add_argument('--user', type=int, default=1)
+    parser.add_argument('-c', '--callback', action='store_true',
+                        help='Отправлять нажатия кнопок')
+    args = parser.parse_args()
+
+    async with UpdateInjector(args.url, args.secret) as injector:
+        for item in args.items:
+            if args.callback:
+                status = await injector.callback(args.user, item)
+            else:
+                status = await injector.message(args.user, item)
+            print(f'{item!r}: HTTP {status}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import (
+    SimpleRequestHandler,
+    setup_application,
+)
+from aiohttp import web
+
+
+def create_webhook_app(
+        dispatcher: Dispatcher,
+        bot: Bot,
+        path: str,
+        secret: str | None = None
+) -> web.Application:
+    """
+    Создаёт aiohttp-приложение, которое принимает обновления Telegram по
+    адресу path и передаёт их в диспетчер. Запросы без верного заголовка
+    "X-Telegram-Bot-Api-Secret-Token" отклоняются (если задан secret).
+    """
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dispatcher,
+        bot=bot,
+        secret_token=secret or None
+    ).register(app, path=path)
+    setup_application(app, dispatcher, bot=bot)
+    return app
+
+
+async def run_webhook(
+        dispatcher: Dispatcher,
+        bot: Bot,
+        host: str,
+        port: int,
+        path: str,
+        url: str = '',
+        secret: str | None = None
+) -> None:
+    """
+    Запускает бота в режиме webhook: поднимает aiohttp-сервер на host:port
+    и, если задан внешний url, регистрирует webhook в Telegram по адресу
+    url + path (url - базовый адрес, path не дописывается, если url уже
+    оканчивается на него). Работает до отмены задачи. Webhook при остановке
+    не удаляется, чтобы остальные реплики за балансировщиком продолжали
+    получать обновления.
+    """
+    if not secret:
+        logging.warning("Webhook запущен без секретного токена")
+
+    runner = web.AppRunner(
+        create_webhook_app(dispatcher, bot, path, secret)
+    )
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+        logging.info(f"Webhook-сервер слушает {host}:{port}{path}")
+
+        if url:
+            url = url.rstrip('/')
+            if not url.endswith(path.rstrip('/')):
+                url += path
+            await bot.set_webhook(
+                url=url,
+                secret_token=secret or None,
+                allowed_updates=dispatcher.resolve_used_update_types()
+            )
+            logging.info(f"Webhook зарегистрирован: {url}")
+
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from typing import Iterable
+
+from aiogram.types import InputMediaPhoto
+
+
+THUMBNAIL = 'thumbnail'
+DETAIL = 'detail'
+FULL = 'full'
+
+"""Наибольшая ширина фото для контекста вывода (0 - самое большое фото)"""
+MAX_WIDTH = {
+    THUMBNAIL: 320,
+    DETAIL: 1280,
+    FULL: 0,
+}
+
+
+class ProductMedia:
+    """
+    Кэш фото товаров в памяти процесса. Для каждого товара хранятся file_id
+    всех размеров фото, загруженных администратором (таблица
+    "product_photos"), и размер выбирается по контексту: миниатюры для
+    списков, среднее фото для карточки товара, оригинал для админа.
+    Готовые объекты InputMediaPhoto кэшируются (LRU) и переиспользуются
+    при каждом выводе, без повторного создания pydantic-моделей.
+    Обновляется при добавлении и удалении товаров (write-through из
+    sqlite_db).
+
+    :ivar max_cached: Наибольшее количество объектов InputMediaPhoto в кэше
+    """
+    def __init__(self, max_cached: int = 1024) -> None:
+        self.max_cached = max_cached
+        self._sizes: dict[int, list[tuple[int, str]]] = {}
+        self._media: OrderedDict[tuple[str, str | None], InputMediaPhoto] = \
+            OrderedDict()
+
+    def load(self, rows: Iterable[tuple[int, int, int, str]]) -> None:
+        """
+        Заполняет кэш строками таблицы "product_photos" (id товара, ширина,
+        высота, file_id).
+        """
+        self._sizes = {}
+        for product_id, width, _, file_id in rows:
+            self._sizes.setdefault(product_id, []).append((width, file_id))
+        for sizes in self._sizes.values():
+            sizes.sort()
+
+    def add(self, product_id: int,
+            photos: Iterable[tuple[int, int, str]]) -> None:
+        """Запоминает размеры фото товара (ширина, высота, file_id)."""
+        sizes = sorted((width, file_id) for width, _, file_id in photos)
+        if sizes:
+            self._sizes[product_id] = sizes
+
+    def remove(self, product_id: int) -> None:
+        """Удаляет фото товара из кэша."""
+        self._sizes.pop(product_id, None)
+
+    def file_id(self, product_id: int, context: str = DETAIL,
+                default: str | None = None) -> str | None:
+        """
+        Возвращает file_id фото товара для контекста вывода: самое большое
+        фото не шире MAX_WIDTH[context] (или самое маленькое, если все
+        шире). default - если размеры фото товара неизвестны.
+        """
+        sizes = self._sizes.get(product_id)
+        if not sizes:
+            return default
+
+        max_width = MAX_WIDTH.get(context, 0)
+        if not max_width:
+            return sizes[-1][1]
+        chosen = sizes[0][1]
+        for width, file_id in sizes:
+            if width > max_width:
+                break
+            chosen = file_id
+        return chosen
+
+    def input_photo(self, file_id: str,
+                    caption: str | None = None) -> InputMediaPhoto:
+        """Готовый объект InputMediaPhoto (из кэша или новый)."""
+        key = (file_id, caption)
+        media = self._media.get(key)
+        if media is None:
+            media = self._media[key] = InputMediaPhoto(media=file_id,
+                                                       caption=caption)
+            if len(self._media) > self.max_cached:
+                self._media.popitem(last=False)
+        else:
+            self._media.move_to_end(key)
+        return media
+
+    def media_group(
+            self,
+            products: Iterable[tuple[int, str | None, str]],
+            context: str = THUMBNAIL
+    ) -> list[InputMediaPhoto]:
+        """
+        Альбом для вывода нескольких товаров (id, file_id по умолчанию,
+        подпись): не более 10 фото, как допускает Telegram. Товары без фото
+        пропускаются.
+        """
+        album = []
+        for product_id, img, caption in products:
+            file_id = self.file_id(product_id, context, img)
+            if file_id:
+                album.append(self.input_photo(file_id, caption))
+        return album[:10]
+
+
+media = ProductMedia()
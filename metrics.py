@@ -0,0 +1,237 @@
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+
+"""Границы корзин гистограмм времени (секунды)"""
+TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                2.5, 5.0, 10.0)
+
+"""Границы корзин гистограмм количества строк"""
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10_000)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Гистограмма с фиксированными корзинами (как histogram в Prometheus):
+    количество наблюдений не больше каждой границы, сумма и число
+    наблюдений. Квантили оцениваются по корзинам.
+
+    :ivar buckets: Верхние границы корзин по возрастанию
+    :ivar count: Количество наблюдений
+    :ivar sum: Сумма наблюдений
+    """
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets: tuple[float, ...] = TIME_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Добавляет наблюдение."""
+        self.count += 1
+        self.sum += value
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+                break
+
+    def quantile(self, q: float) -> float:
+        """
+        Оценка квантиля q (0..1) линейной интерполяцией внутри корзины.
+        Для наблюдений больше последней границы возвращается эта граница.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, in_bucket in zip(self.buckets, self.counts):
+            if in_bucket and seen + in_bucket >= rank:
+                return lower + (bound - lower) * (rank - seen) / in_bucket
+            seen += in_bucket
+            lower = bound
+        return self.buckets[-1]
+
+
+class Metrics:
+    """
+    Реестр метрик процесса: счётчики и гистограммы с метками. Выводится в
+    текстовом формате Prometheus (render) и сводкой с p50/p99 (summary).
+
+    :ivar prefix: Префикс имён метрик
+    """
+    def __init__(self, prefix: str = 'shop_bot') -> None:
+        self.prefix = prefix
+        self._counters: dict[str, dict[Labels, float]] = {}
+        self._histograms: dict[str, dict[Labels, Histogram]] = {}
+        self._buckets: dict[str, tuple[float, ...]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: Any) -> None:
+        """Увеличивает счётчик name с метками labels."""
+        series = self._counters.setdefault(name, {})
+        key = self._labels(labels)
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float,
+                buckets: tuple[float, ...] = TIME_BUCKETS,
+                **labels: Any) -> None:
+        """Добавляет наблюдение в гистограмму name с метками labels."""
+        series = self._histograms.setdefault(name, {})
+        self._buckets.setdefault(name, buckets)
+        key = self._labels(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(self._buckets[name])
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: Any) -> Iterator[None]:
+        """Замеряет время выполнения блока with в гистограмму name."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def counter(self, name: str) -> dict[Labels, float]:
+        """Значения счётчика name по сериям (меткам)."""
+        return dict(self._counters.get(name, {}))
+
+    def histogram(self, name: str) -> dict[Labels, Histogram]:
+        """Гистограммы name по сериям (меткам)."""
+        return dict(self._histograms.get(name, {}))
+
+    def render(self) -> str:
+        """Все метрики в текстовом формате Prometheus."""
+        lines = []
+        for name, series in sorted(self._counters.items()):
+            full_name = f'{self.prefix}_{name}'
+            lines.append(f'# TYPE {full_name} counter')
+            for labels, value in sorted(series.items()):
+                lines.append(f'{full_name}{self._format(labels)} {value:g}')
+
+        for name, series in sorted(self._histograms.items()):
+            full_name = f'{self.prefix}_{name}'
+            lines.append(f'# TYPE {full_name} histogram')
+            for labels, histogram in sorted(series.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(
+                        f'{full_name}_bucket'
+                        f'{self._format(labels + (("le", f"{bound:g}"),))} '
+                        f'{cumulative}'
+                    )
+                lines.append(
+                    f'{full_name}_bucket'
+                    f'{self._format(labels + (("le", "+Inf"),))} '
+                    f'{histogram.count}'
+                )
+                lines.append(f'{full_name}_sum{self._format(labels)} '
+                             f'{histogram.sum:g}')
+                lines.append(f'{full_name}_count{self._format(labels)} '
+                             f'{histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        """
+        Сводка гистограмм для лога: число наблюдений, среднее, p50 и p99
+        по каждой серии.
+        """
+        lines = []
+        for name, series in sorted(self._histograms.items()):
+            for labels, histogram in sorted(
+                    series.items(), key=lambda item: -item[1].sum
+            ):
+                lines.append(
+                    f'{name}{self._format(labels)}: n={histogram.count} '
+                    f'avg={histogram.sum / histogram.count:.4g} '
+                    f'p50={histogram.quantile(0.5):.4g} '
+                    f'p99={histogram.quantile(0.99):.4g}'
+                )
+        return '\n'.join(lines)
+
+    def reset(self) -> None:
+        """Сбрасывает все метрики."""
+        self._counters.clear()
+        self._histograms.clear()
+
+    @staticmethod
+    def _labels(labels: dict[str, Any]) -> Labels:
+        """Метки в виде ключа серии."""
+        return tuple(sorted((key, str(value))
+                            for key, value in labels.items()))
+
+    @staticmethod
+    def _format(labels: Labels) -> str:
+        """Метки в формате Prometheus: {key="value",...}."""
+        if not labels:
+            return ''
+        return '{' + ','.join(
+            '{}="{}"'.format(key, value.replace('\\', '\\\\')
+                             .replace('"', '\\"').replace('\n', '\\n'))
+            for key, value in labels
+        ) + '}'
+
+
+def count_rows(result: Any) -> int | None:
+    """
+    Количество строк в результате функции sqlite_db (None - функция ничего
+    не возвращает).
+    """
+    if result is None:
+        return None
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, tuple) and len(result) == 2 and \
+            isinstance(result[1], list):
+        return len(result[1])
+    return 1
+
+
+def instrument(namespace: dict[str, Any], metrics: 'Metrics',
+               prefix: str = 'sql_') -> None:
+    """
+    Оборачивает все асинхронные функции namespace (globals() модуля) с
+    именем на prefix: время каждого вызова пишется в гистограмму
+    "db_seconds", количество возвращённых строк - в "db_rows", ошибки - в
+    счётчик "db_errors_total" (с меткой function).
+    """
+    for name, function in list(namespace.items()):
+        if not name.startswith(prefix) or \
+                not inspect.iscoroutinefunction(function):
+            continue
+        namespace[name] = _timed(function, metrics)
+
+
+def _timed(function: Callable, metrics: 'Metrics') -> Callable:
+    """Обёртка функции sqlite_db с замером времени и строк."""
+    name = function.__name__
+
+    @functools.wraps(function)
+    async def wrapper(*args: Any, **kwargs: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            result = await function(*args, **kwargs)
+        except Exception:
+            metrics.inc('db_errors_total', function=name)
+            raise
+        finally:
+            metrics.observe('db_seconds', time.perf_counter() - started,
+                            function=name)
+        rows = count_rows(result)
+        if rows is not None:
+            metrics.observe('db_rows', rows, ROW_BUCKETS, function=name)
+        return result
+
+    return wrapper
+
+
+metrics = Metrics()
@@ -0,0 +1,520 @@
+import argparse
+import ast
+import asyncio
+import logging
+from typing import Awaitable, Callable, Iterable
+
+import aiosqlite
+
+
+class Migration:
+    """
+    Шаг миграции схемы БД.
+
+    :ivar version: Номер версии схемы после применения (PRAGMA user_version)
+    :ivar description: Описание изменений
+    :ivar statements: SQL-выражения миграции
+    :ivar function: Дополнительная функция миграции (перенос данных),
+        вызывается после statements с соединением в открытой транзакции
+    """
+    __slots__ = ('version', 'description', 'statements', 'function')
+
+    def __init__(
+            self,
+            version: int,
+            description: str,
+            statements: Iterable[str] = (),
+            function: Callable[[aiosqlite.Connection],
+                               Awaitable[None]] | None = None
+    ) -> None:
+        self.version = version
+        self.description = description
+        self.statements = tuple(statements)
+        self.function = function
+
+    async def apply(self, connection: aiosqlite.Connection) -> None:
+        """Выполняет миграцию на соединении connection."""
+        for statement in self.statements:
+            await connection.execute(statement)
+        if self.function is not None:
+            await self.function(connection)
+
+    def __repr__(self) -> str:
+        return f'Migration({self.version}, {self.description!r})'
+
+
+"""
+Таблица корзины: строка на товар с количеством. Шаблон с именем таблицы
+{name} - миграция 7 создаёт её под временным именем
+"""
+CART_TABLE = """
+    CREATE TABLE {name}(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL DEFAULT 1,
+        UNIQUE (user_id, product_id),
+        FOREIGN KEY (user_id) REFERENCES users(user_id),
+        FOREIGN KEY (product_id) REFERENCES products(id)
+            ON DELETE CASCADE
+    )
+"""
+
+"""Базовая схема (версия 0), на которую накатываются MIGRATIONS"""
+BASE_TABLES = {
+    'products': """
+        CREATE TABLE products(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            img TEXT,
+            name TEXT UNIQUE NOT NULL,
+            description TEXT,
+            price INTEGER NOT NULL
+        )
+    """,
+    'users': """
+        CREATE TABLE users(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER UNIQUE NOT NULL,
+            name TEXT
+        )
+    """,
+    'cart': CART_TABLE.format(name='cart'),
+    'orders': """
+        CREATE TABLE orders(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            order_id INTEGER UNIQUE NOT NULL,
+            order_info TEXT NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """,
+}
+
+
+async def missing_base_tables(connection: aiosqlite.Connection) -> list[str]:
+    """Имена таблиц BASE_TABLES, которых ещё нет в БД."""
+    async with connection.execute(
+            "SELECT name FROM sqlite_master WHERE type='table'"
+    ) as cursor:
+        existing = {row[0] for row in await cursor.fetchall()}
+    return [name for name in BASE_TABLES if name not in existing]
+
+
+async def create_base_tables(connection: aiosqlite.Connection) -> None:
+    """
+    Создаёт недостающие таблицы базовой схемы одной транзакцией. При
+    ошибке транзакция откатывается и вызывается RuntimeError.
+    """
+    try:
+        await connection.execute("BEGIN TRANSACTION")
+        for name in await missing_base_tables(connection):
+            await connection.execute(BASE_TABLES[name])
+            logging.info(f"Создана таблица: {name}")
+        await connection.commit()
+        logging.info("База данных успешно инициализирована")
+
+    except Exception as e:
+        await connection.rollback()
+        logging.error(
+            f"Откат создания БД из-за ошибки: {e}",
+            exc_info=True
+        )
+        raise RuntimeError(f"Ошибка создания таблиц БД: {e}") from e
+
+
+ORDER_FIELDS = (
+    'first_name', 'last_name', 'username', 'currency', 'total_amount',
+    'invoice_payload', 'shipping_option_id', 'name', 'phone_number', 'email',
+    'country_code', 'state', 'city', 'street_line1', 'street_line2',
+    'post_code',
+)
+
+"""
+Таблицы заказов после миграции 2. order_id - id запроса pre_checkout_query:
+непрозрачная строка Telegram, которая может не поместиться в INTEGER SQLite
+"""
+ORDERS_TABLE = """
+    CREATE TABLE {name}(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        order_id TEXT UNIQUE NOT NULL,
+        created_at INTEGER,
+        currency TEXT,
+        total_amount INTEGER,
+        invoice_payload TEXT,
+        shipping_option_id TEXT,
+        first_name TEXT,
+        last_name TEXT,
+        username TEXT,
+        name TEXT,
+        phone_number TEXT,
+        email TEXT,
+        country_code TEXT,
+        state TEXT,
+        city TEXT,
+        street_line1 TEXT,
+        street_line2 TEXT,
+        post_code TEXT,
+        FOREIGN KEY (user_id) REFERENCES users(user_id)
+    )
+"""
+
+ORDER_ITEMS_TABLE = """
+    CREATE TABLE order_items(
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_id TEXT NOT NULL,
+        product_id INTEGER,
+        quantity INTEGER NOT NULL,
+        unit_price INTEGER NOT NULL,
+        FOREIGN KEY (order_id) REFERENCES orders(order_id)
+            ON DELETE CASCADE
+    )
+"""
+
+ORDER_INDEXES = (
+    "CREATE INDEX idx_orders_user ON orders(user_id, created_at)",
+    "CREATE INDEX idx_orders_created ON orders(created_at)",
+    "CREATE INDEX idx_order_items_order ON order_items(order_id)",
+    "CREATE INDEX idx_order_items_product ON order_items(product_id)",
+)
+
+
+async def migrate_orders_structured(connection: aiosqlite.Connection,
+                                    chunk_size: int = 500) -> None:
+    """
+    Переносит заказы из строкового поля order_info (repr словаря) в
+    отдельные столбцы новой таблицы orders и создаёт таблицу позиций
+    заказов order_items. Старая таблица читается порциями по chunk_size
+    строк, поэтому память не зависит от числа заказов.
+    """
+    await connection.execute(ORDERS_TABLE.format(name='orders_new'))
+
+    columns = ('user_id', 'order_id') + ORDER_FIELDS
+    insert = (f"INSERT INTO orders_new ({', '.join(columns)}) "
+              f"VALUES ({', '.join('?' * len(columns))})")
+    moved = broken = 0
+
+    async with connection.execute(
+            "SELECT user_id, order_id, order_info FROM orders ORDER BY id"
+    ) as cursor:
+        while rows := await cursor.fetchmany(chunk_size):
+            values = []
+            for user_id, order_id, order_info in rows:
+                try:
+                    info = ast.literal_eval(order_info)
+                    if not isinstance(info, dict):
+                        raise ValueError(type(info).__name__)
+                except (ValueError, SyntaxError, TypeError, MemoryError):
+                    info = {}
+                    broken += 1
+                values.append((user_id, order_id,
+                               *(info.get(field) for field in ORDER_FIELDS)))
+            await connection.executemany(insert, values)
+            moved += len(values)
+
+    for statement in (
+            "DROP TABLE orders",
+            "ALTER TABLE orders_new RENAME TO orders",
+            ORDER_ITEMS_TABLE,
+            *ORDER_INDEXES,
+    ):
+        await connection.execute(statement)
+
+    logging.info(f"Перенесено заказов: {moved}, из них без разбора "
+                 f"order_info: {broken}")
+
+
+async def migrate_order_id_text(connection: aiosqlite.Connection) -> None:
+    """
+    Меняет тип order_id в "orders" и "order_items" с INTEGER на TEXT для
+    БД, перешедших на версию 2 до этого изменения. Позиции заказов
+    сохраняются во временной таблице без внешних ключей: иначе удаление
+    старой "orders" каскадно удалило бы их.
+    """
+    async with connection.execute("PRAGMA table_info(orders)") as cursor:
+        types = {row[1]: row[2].upper() for row in await cursor.fetchall()}
+    if types.get('order_id') == 'TEXT':
+        return
+
+    for statement in (
+            "CREATE TEMP TABLE order_items_old AS SELECT * FROM order_items",
+            "DROP TABLE order_items",
+            ORDERS_TABLE.format(name='orders_new'),
+            "INSERT INTO orders_new SELECT * FROM orders",
+            "DROP TABLE orders",
+            "ALTER TABLE orders_new RENAME TO orders",
+            ORDER_ITEMS_TABLE,
+            "INSERT INTO order_items SELECT * FROM order_items_old",
+            "DROP TABLE order_items_old",
+            *ORDER_INDEXES,
+    ):
+        await connection.execute(statement)
+
+
+async def migrate_cart_quantity(connection: aiosqlite.Connection) -> None:
+    """
+    Переводит таблицу "cart" со схемы "строка на единицу товара" на схему
+    с количеством (user_id, product_id, quantity). Таблицы, созданные уже
+    со столбцом quantity (новые БД и БД, переведённые до появления этой
+    миграции), не изменяются.
+    """
+    async with connection.execute("PRAGMA table_info(cart)") as cursor:
+        if 'quantity' in {row[1] for row in await cursor.fetchall()}:
+            return
+
+    moved = connection.total_changes
+    for statement in (
+            CART_TABLE.format(name='cart_new'),
+            """
+            INSERT INTO cart_new (user_id, product_id, quantity)
+            SELECT user_id, product_id, COUNT(*) FROM cart
+            GROUP BY user_id, product_id
+            """,
+    ):
+        await connection.execute(statement)
+    moved = connection.total_changes - moved
+
+    for statement in (
+            "DROP TABLE cart",
+            "ALTER TABLE cart_new RENAME TO cart",
+            "CREATE INDEX idx_cart_product ON cart(product_id)",
+    ):
+        await connection.execute(statement)
+
+    logging.info(f"Таблица cart переведена на хранение количества товара, "
+                 f"позиций: {moved}")
+
+
+"""Миграции схемы по возрастанию версии"""
+MIGRATIONS: list[Migration] = [
+    Migration(
+        1,
+        'Индексы корзины по товару и заказов по пользователю',
+        statements=(
+            "CREATE INDEX IF NOT EXISTS idx_cart_product ON cart(product_id)",
+            "CREATE INDEX IF NOT EXISTS idx_orders_user ON orders(user_id)",
+        )
+    ),
+    Migration(
+        2,
+        'Заказы в отдельных столбцах и позиции заказов в order_items',
+        function=migrate_orders_structured
+    ),
+    Migration(
+        3,
+        'Рассылки и статусы доставки по получателям',
+        statements=(
+            """
+            CREATE TABLE broadcasts(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                created_at INTEGER NOT NULL,
+                finished_at INTEGER
+            )
+            """,
+            """
+            CREATE TABLE broadcast_deliveries(
+                broadcast_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                PRIMARY KEY (broadcast_id, user_id),
+                FOREIGN KEY (broadcast_id) REFERENCES broadcasts(id)
+                    ON DELETE CASCADE
+            ) WITHOUT ROWID
+            """,
+        )
+    ),
+    Migration(
+        4,
+        'Полнотекстовый поиск товаров (FTS5) с синхронизацией триггерами',
+        statements=(
+            """
+            CREATE VIRTUAL TABLE products_fts USING fts5(
+                name, description,
+                content='products', content_rowid='id',
+                tokenize='unicode61'
+            )
+            """,
+            """
+            CREATE TRIGGER products_fts_insert AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts (rowid, name, description)
+                VALUES (new.id, new.name, new.description);
+            END
+            """,
+            """
+            CREATE TRIGGER products_fts_delete AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts (products_fts, rowid, name,
+                                          description)
+                VALUES ('delete', old.id, old.name, old.description);
+            END
+            """,
+            """
+            CREATE TRIGGER products_fts_update AFTER UPDATE ON products BEGIN
+                INSERT INTO products_fts (products_fts, rowid, name,
+                                          description)
+                VALUES ('delete', old.id, old.name, old.description);
+                INSERT INTO products_fts (rowid, name, description)
+                VALUES (new.id, new.name, new.description);
+            END
+            """,
+            "INSERT INTO products_fts (products_fts) VALUES ('rebuild')",
+        )
+    ),
+    Migration(
+        5,
+        'Категории и теги товаров, индексы для фильтров каталога',
+        statements=(
+            """
+            CREATE TABLE categories(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL
+            )
+            """,
+            """
+            ALTER TABLE products ADD COLUMN category_id INTEGER
+                REFERENCES categories(id) ON DELETE SET NULL
+            """,
+            """
+            CREATE TABLE tags(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE product_tags(
+                product_id INTEGER NOT NULL,
+                tag_id INTEGER NOT NULL,
+                PRIMARY KEY (product_id, tag_id),
+                FOREIGN KEY (product_id) REFERENCES products(id)
+                    ON DELETE CASCADE,
+                FOREIGN KEY (tag_id) REFERENCES tags(id) ON DELETE CASCADE
+            ) WITHOUT ROWID
+            """,
+            "CREATE INDEX idx_product_tags_tag ON product_tags(tag_id)",
+            """
+            CREATE INDEX idx_products_category_price
+                ON products(category_id, price)
+            """,
+            "CREATE INDEX idx_products_price ON products(price)",
+        )
+    ),
+    Migration(
+        6,
+        'Все размеры фото товаров (file_id) в product_photos',
+        statements=(
+            """
+            CREATE TABLE product_photos(
+                product_id INTEGER NOT NULL,
+                width INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                file_id TEXT NOT NULL,
+                PRIMARY KEY (product_id, width, height),
+                FOREIGN KEY (product_id) REFERENCES products(id)
+                    ON DELETE CASCADE
+            ) WITHOUT ROWID
+            """,
+            """
+            INSERT INTO product_photos (product_id, width, height, file_id)
+            SELECT id, 0, 0, img FROM products WHERE img IS NOT NULL
+            """,
+        )
+    ),
+    Migration(
+        7,
+        'Количество товара в корзине (строка на товар вместо строки на '
+        'единицу)',
+        function=migrate_cart_quantity
+    ),
+    Migration(
+        8,
+        'Строковый order_id заказов (id pre_checkout_query Telegram)',
+        function=migrate_order_id_text
+    ),
+]
+
+
+async def schema_version(connection: aiosqlite.Connection) -> int:
+    """Текущая версия схемы БД (PRAGMA user_version)."""
+    async with connection.execute("PRAGMA user_version") as cursor:
+        return (await cursor.fetchone())[0]
+
+
+async def migrate(
+        connection: aiosqlite.Connection,
+        migrations: list[Migration] | None = None,
+        dry_run: bool = False
+) -> list[Migration]:
+    """
+    Применяет по порядку миграции новее текущей версии схемы. Каждая
+    миграция выполняется в своей транзакции вместе с обновлением
+    user_version, при ошибке транзакция откатывается и миграция
+    прерывается (RuntimeError). При dry_run=True только возвращает список
+    миграций, которые были бы применены.
+    """
+    migrations = MIGRATIONS if migrations is None else migrations
+    current = await schema_version(connection)
+    pending = sorted((migration for migration in migrations
+                      if migration.version > current),
+                     key=lambda migration: migration.version)
+
+    for migration in pending:
+        if dry_run:
+            logging.info(f"Будет применена миграция {migration.version}: "
+                         f"{migration.description}")
+            continue
+
+        try:
+            await connection.execute("BEGIN TRANSACTION")
+            await migration.apply(connection)
+            await connection.execute(
+                f"PRAGMA user_version = {int(migration.version)}"
+            )
+            await connection.commit()
+            logging.info(f"Применена миграция {migration.version}: "
+                         f"{migration.description}")
+
+        except Exception as e:
+            await connection.rollback()
+            logging.error(
+                f"Откат миграции {migration.version}: {e}",
+                exc_info=True
+            )
+            raise RuntimeError(
+                f"Ошибка миграции {migration.version}: {e}"
+            ) from e
+
+    return pending
+
+
+async def main() -> None:
+    """Применение миграций к БД бота из консоли."""
+    from config import config
+    from sqlite_db import Database
+
+    parser = argparse.ArgumentParser(description='Миграции схемы БД')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Показать миграции, не применяя их')
+    parser.add_argument('--db', default=config.db_path)
+    args = parser.parse_args()
+
+    async with Database(args.db) as database:
+        missing = await missing_base_tables(database.connection)
+        if missing and not args.dry_run:
+            await create_base_tables(database.connection)
+        version = await schema_version(database.connection)
+        applied = await migrate(database.connection, dry_run=args.dry_run)
+        if missing:
+            print(f'{"[dry-run] " if args.dry_run else ""}'
+                  f'Базовые таблицы: {", ".join(missing)}')
+        print(f'Версия схемы: {version}')
+        for migration in applied:
+            print(f'{"[dry-run] " if args.dry_run else ""}'
+                  f'{migration.version}: {migration.description}')
+        if not applied:
+            print('Новых миграций нет')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,27 +1,71 @@
+import asyncio
 import logging
+import re
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 from types import TracebackType
-from typing import Type
+from typing import AsyncIterator, Type
 
 import aiosqlite
 
+import migrations
+from catalog import (
+    SORT_ID,
+    SORT_PRICE,
+    SORT_PRICE_DESC,
+    Product,
+    ProductFilter,
+    catalog,
+)
+from config import config
+from media import media
+from metrics import instrument, metrics
+
+
+PRAGMA_PROFILE: dict[str, str | int] = {
+    'journal_mode': config.db_journal_mode,
+    'synchronous': config.db_synchronous,
+    'busy_timeout': config.db_busy_timeout,
+    'cache_size': config.db_cache_size,
+    'mmap_size': config.db_mmap_size,
+    'temp_store': config.db_temp_store,
+    'foreign_keys': 'ON',
+}
+
 
 class Database:
     """
     Инициализация объекта базы данных.
 
     :ivar path: Путь к файлу базы данных SQLite
+    :ivar pragmas: Настройки PRAGMA, применяемые при подключении
+    :ivar cached_statements: Размер кэша скомпилированных SQL-выражений
+        соединения
     """
-    def __init__(self, path: str) -> None:
+    def __init__(
+            self,
+            path: str,
+            pragmas: dict[str, str | int] | None = None,
+            cached_statements: int = 128
+    ) -> None:
         self.path = path
+        self.pragmas = PRAGMA_PROFILE if pragmas is None else pragmas
+        self.cached_statements = cached_statements
         self.connection: aiosqlite.Connection | None = None
 
     async def connect(self) -> None:
         """
-        Устанавливает соединение с базой данных и включает поддержку внешних
-        ключей ("PRAGMA foreign_keys = ON;").
+        Устанавливает соединение с базой данных и применяет профиль PRAGMA
+        (режим журнала, синхронизация, кэш, внешние ключи и т.д.).
+        Скомпилированные выражения кэшируются соединением по тексту SQL,
+        поэтому неизменные запросы модуля компилируются один раз.
         """
-        self.connection = await aiosqlite.connect(self.path)
-        await self.connection.execute("PRAGMA foreign_keys = ON;")
+        self.connection = await aiosqlite.connect(
+            self.path,
+            cached_statements=self.cached_statements
+        )
+        for name, value in self.pragmas.items():
+            await self.connection.execute(f"PRAGMA {name} = {value};")
 
     async def close(self) -> None:
         """
@@ -31,6 +75,28 @@ class Database:
             await self.connection.close()
             self.connection = None
 
+    async def is_alive(self) -> bool:
+        """
+        Проверяет работоспособность соединения тестовым запросом "SELECT 1".
+        """
+        if self.connection is None:
+            return False
+        try:
+            async with self.connection.execute("SELECT 1") as cursor:
+                await cursor.fetchone()
+            return True
+        except (aiosqlite.Error, ValueError):
+            return False
+
+    async def reconnect(self) -> None:
+        """Пересоздаёт соединение с базой данных."""
+        try:
+            await self.close()
+        except Exception as e:
+            logging.warning(f"Ошибка закрытия соединения с БД: {e}")
+            self.connection = None
+        await self.connect()
+
     async def __aenter__(self) -> 'Database':
         """Вход в контекстный менеджер - устанавливаем соединение"""
         await self.connect()
@@ -46,130 +112,359 @@ class Database:
         await self.close()
 
 
-db = Database('data/shop.db')
+class ConnectionPool:
+    """
+    Пул долгоживущих соединений с базой данных. Запись выполняется через
+    единственное соединение (SQLite допускает только одного писателя),
+    чтение - через очередь из нескольких соединений. Соединения открываются
+    один раз при старте бота и закрываются при его остановке.
 
+    :ivar path: Путь к файлу базы данных SQLite
+    :ivar size: Количество соединений для чтения
+    :ivar cached_statements: Размер кэша выражений каждого соединения
+    """
+    def __init__(
+            self,
+            path: str,
+            size: int = 4,
+            cached_statements: int = 128
+    ) -> None:
+        self.path = path
+        self.size = max(size, 1)
+        self.cached_statements = cached_statements
+        self._writer: Database | None = None
+        self._writer_lock = asyncio.Lock()
+        self._readers: asyncio.Queue[Database] = asyncio.Queue()
+        self._borrowed = 0
+        self._drained = asyncio.Event()
+        self._drained.set()
+        self._closing = False
 
-async def sql_start() -> None:
-    """Подключение/создание БД и таблиц."""
-    async with db:
-        try:
-            await db.connection.execute("BEGIN TRANSACTION")
+    @property
+    def is_open(self) -> bool:
+        """Открыт ли пул (установлено ли соединение для записи)."""
+        return self._writer is not None and not self._closing
 
-            async with db.connection.cursor() as cursor:
-                await cursor.execute(
-                    "SELECT name FROM sqlite_master WHERE type='table'"
-                )
-                existing_tables = {row[0] for row in await cursor.fetchall()}
-
-                table_definitions = {
-                    'products': """
-                        CREATE TABLE products(
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            img TEXT,
-                            name TEXT UNIQUE NOT NULL,
-                            description TEXT,
-                            price INTEGER NOT NULL
-                        )
-                    """,
-                    'users': """
-                        CREATE TABLE users(
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            user_id INTEGER UNIQUE NOT NULL,
-                            name TEXT
-                        )
-                    """,
-                    'cart': """
-                        CREATE TABLE cart(
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            user_id INTEGER NOT NULL,
-                            product_id INTEGER NOT NULL,
-                            FOREIGN KEY (user_id) REFERENCES users(user_id),
-                            FOREIGN KEY (product_id) REFERENCES products(id)
-                                ON DELETE CASCADE
-                        )
-                    """,
-                    'orders': """
-                        CREATE TABLE orders(
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            user_id INTEGER NOT NULL,
-                            order_id INTEGER UNIQUE NOT NULL,
-                            order_info TEXT NOT NULL,
-                            FOREIGN KEY (user_id) REFERENCES users(user_id)
-                        )
-                    """
-                }
-
-                for table_name, ddl in table_definitions.items():
-                    if table_name not in existing_tables:
-                        try:
-                            await cursor.execute(ddl)
-                            logging.info(f"Создана таблица: {table_name}")
-                        except aiosqlite.Error as e:
-                            logging.error(
-                                f"Ошибка создания таблицы {table_name}: {e}",
-                                exc_info=True
-                            )
-                            raise RuntimeError(
-                                f"Ошибка создания таблицы {table_name}: {e}"
-                            ) from e
-
-            await db.connection.commit()
-            logging.info("База данных успешно инициализирована")
+    async def open(self) -> None:
+        """Открывает соединение для записи и соединения для чтения."""
+        if self._writer is not None:
+            return
 
-        except Exception as e:
-            await db.connection.rollback()
-            logging.error(
-                f"Откат создания БД из-за ошибки: {e}",
-                exc_info=True
+        self._closing = False
+        writer = Database(self.path,
+                          cached_statements=self.cached_statements)
+        await writer.connect()
+        self._writer = writer
+
+        for _ in range(self.size):
+            reader = Database(self.path,
+                              cached_statements=self.cached_statements)
+            await reader.connect()
+            self._readers.put_nowait(reader)
+
+        logging.info(
+            f"Пул соединений с БД открыт: 1 запись + {self.size} чтение"
+        )
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """
+        Закрывает пул. Новые запросы больше не выдаются, уже выданные
+        соединения дожидаются возврата (не дольше timeout секунд).
+        """
+        if self._writer is None:
+            return
+
+        self._closing = True
+        try:
+            await asyncio.wait_for(self._drained.wait(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(
+                f"Не дождались возврата {self._borrowed} соединений с БД"
             )
+
+        while not self._readers.empty():
+            await self._readers.get_nowait().close()
+        await self._writer.close()
+        self._writer = None
+        logging.info("Пул соединений с БД закрыт")
+
+    async def health_check(self) -> None:
+        """
+        Проверяет свободные соединения пула и переподключает неисправные.
+        """
+        if not self.is_open:
+            return
+
+        async with self._writer_lock:
+            if not await self._writer.is_alive():
+                await self._reconnect(self._writer)
+
+        for _ in range(self._readers.qsize()):
+            reader = self._readers.get_nowait()
+            try:
+                if not await reader.is_alive():
+                    await self._reconnect(reader)
+            finally:
+                self._readers.put_nowait(reader)
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Выдаёт соединение для чтения на время блока async with."""
+        self._check_open()
+        database = await self._readers.get()
+        self._borrow()
+        try:
+            yield database.connection
+        except (aiosqlite.Error, ValueError):
+            if not await database.is_alive():
+                await self._reconnect(database)
             raise
+        finally:
+            self._readers.put_nowait(database)
+            self._release()
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """
+        Выдаёт соединение для записи на время блока async with. Одновременно
+        соединение выдаётся только одному обработчику. Транзакция, которая
+        не была зафиксирована внутри блока (ошибка или пустой INSERT OR
+        IGNORE), откатывается, чтобы не удерживать блокировку записи.
+        """
+        self._check_open()
+        async with self._writer_lock:
+            database = self._writer
+            self._borrow()
+            try:
+                yield database.connection
+            finally:
+                try:
+                    await self._rollback(database)
+                finally:
+                    self._release()
 
+    def _check_open(self) -> None:
+        """Проверяет, что пул открыт и принимает запросы."""
+        if self._writer is None:
+            raise RuntimeError("Пул соединений с БД не открыт")
+        if self._closing:
+            raise RuntimeError("Пул соединений с БД закрывается")
 
-async def sql_add_user(data: tuple[int, str]) -> None:
+    def _borrow(self) -> None:
+        """Учитывает выданное соединение."""
+        self._borrowed += 1
+        self._drained.clear()
+
+    def _release(self) -> None:
+        """Учитывает возвращённое соединение."""
+        self._borrowed -= 1
+        if self._borrowed == 0:
+            self._drained.set()
+
+    @staticmethod
+    async def _reconnect(database: Database) -> None:
+        """Переподключает неисправное соединение."""
+        logging.warning("Соединение с БД неисправно, переподключение")
+        await database.reconnect()
+
+    @staticmethod
+    async def _rollback(database: Database) -> None:
+        """
+        Откатывает открытую транзакцию, а при сбое - переподключает
+        соединение.
+        """
+        try:
+            if database.connection.in_transaction:
+                await database.connection.rollback()
+        except (aiosqlite.Error, ValueError, AttributeError):
+            await ConnectionPool._reconnect(database)
+
+
+pool = ConnectionPool(config.db_path,
+                      size=config.db_pool_size,
+                      cached_statements=config.db_statement_cache)
+
+
+async def sql_start() -> None:
     """
-    Принимает кортеж из id и имени. Проверяет наличие id в БД и в случае
-    отсутствия добавление клиента(from_user.id) в таблицу "users"
-    (список клиентов по id тг).
+    Подключение/создание БД и базовых таблиц (migrations.BASE_TABLES),
+    затем применение миграций схемы (migrations.MIGRATIONS).
     """
-    async with db:
-        try:
-            async with db.connection.execute(
-                    """
-                    INSERT OR IGNORE INTO users (user_id, name) VALUES (?, ?)
-                    """,
-                    data
+    await pool.open()
+    async with pool.writer() as connection:
+        await migrations.create_base_tables(connection)
+        await migrations.migrate(connection)
+
+    await sql_load_catalog()
+
+
+async def sql_load_catalog() -> None:
+    """
+    Загрузка таблицы "products" в кэш каталога (catalog.catalog) и таблицы
+    "product_photos" в кэш фото (media.media).
+    """
+    catalog.load(await sql_select_products())
+    media.load(await sql_select_product_photos())
+    logging.info(f"Каталог загружен в кэш: {catalog.count} товаров")
+
+
+async def sql_close() -> None:
+    """
+    Закрытие пула соединений с БД. Дожидается завершения запросов,
+    которые уже выполняются.
+    """
+    await pool.close()
+
+
+async def sql_wal_checkpoint(mode: str = 'PASSIVE') -> None:
+    """
+    Переносит страницы из WAL-журнала в основной файл БД. Режим PASSIVE
+    не блокирует ни читателей, ни писателя.
+    """
+    if not pool.is_open or config.db_journal_mode.upper() != 'WAL':
+        return
+
+    try:
+        async with pool.writer() as connection:
+            async with connection.execute(
+                    f"PRAGMA wal_checkpoint({mode})"
             ) as cursor:
-                if cursor.rowcount > 0:
-                    await db.connection.commit()
-                    logging.info(f"Добавлен пользователь: {data[0]}")
+                busy, log_pages, checkpointed = await cursor.fetchone()
+                logging.debug(
+                    f"Контрольная точка WAL: {checkpointed}/{log_pages} "
+                    f"страниц, busy={busy}"
+                )
 
-        except Exception as e:
-            logging.error(
-                f"Ошибка добавления пользователя: {e}",
-                exc_info=True
-            )
+    except Exception as e:
+        logging.error(f"Ошибка контрольной точки WAL: {e}", exc_info=True)
 
 
-async def sql_add_product(data: dict[str, str | int | None]) -> None:
+async def sql_maintenance(interval: int) -> None:
     """
-    Принимает словарь из идентификатора изображения, имени, описания и цены.
-    Добавляет продукт в таблицу "products".
+    Фоновая задача обслуживания БД: раз в interval секунд выполняет
+    контрольную точку WAL и проверку соединений пула.
     """
-    async with db:
+    while True:
+        await asyncio.sleep(interval)
+        await sql_wal_checkpoint()
         try:
-            async with db.connection.execute(
+            await pool.health_check()
+        except Exception as e:
+            logging.error(f"Ошибка проверки соединений с БД: {e}",
+                          exc_info=True)
+
+
+async def sql_add_users(users: list[tuple[int, str]],
+                        chunk_size: int = 400) -> bool:
+    """
+    Принимает список кортежей из id и имени. Добавляет отсутствующих
+    клиентов в таблицу "users" одной транзакцией, многострочными INSERT по
+    chunk_size строк. Возвращает False, если транзакция не удалась.
+    """
+    if not users:
+        return True
+
+    try:
+        async with pool.writer() as connection:
+            added = 0
+            for start in range(0, len(users), chunk_size):
+                chunk = users[start:start + chunk_size]
+                async with connection.execute(
+                        f"""
+                        INSERT OR IGNORE INTO users (user_id, name)
+                        VALUES {', '.join(['(?, ?)'] * len(chunk))}
+                        """,
+                        [value for user in chunk for value in user]
+                ) as cursor:
+                    added += max(cursor.rowcount, 0)
+            await connection.commit()
+            if added:
+                logging.info(f"Добавлено пользователей: {added}")
+        return True
+
+    except Exception as e:
+        logging.error(
+            f"Ошибка добавления пользователей: {e}",
+            exc_info=True
+        )
+        return False
+
+
+async def sql_select_user_ids(limit: int) -> list[int]:
+    """
+    Возвращает id (из тг) не более limit последних зарегистрированных
+    пользователей из таблицы "users".
+    """
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    "SELECT user_id FROM users ORDER BY id DESC LIMIT ?",
+                    (limit,)
+            ) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    except Exception as e:
+        logging.error(f"Ошибка чтения пользователей: {e}", exc_info=True)
+        return []
+
+
+async def sql_add_product(data: dict[str, str | int | list | None]) -> None:
+    """
+    Принимает словарь из идентификатора изображения, имени, описания, цены и
+    (необязательно) id категории, списка названий тегов и списка размеров
+    фото (ширина, высота, file_id). Добавляет продукт в таблицу "products",
+    его теги - в "product_tags", размеры фото - в "product_photos", а
+    продукт - в кэш каталога и кэш фото.
+    """
+    try:
+        async with pool.writer() as connection:
+            async with connection.execute(
                 """
-                INSERT OR IGNORE INTO products (img, name, description, price) 
-                VALUES (?, ?, ?, ?)
+                INSERT OR IGNORE INTO products
+                    (img, name, description, price, category_id)
+                VALUES (?, ?, ?, ?, ?)
                 """,
-                tuple(data.values())
+                (data['photo'], data['name'], data['description'],
+                 data['price'], data.get('category_id'))
             ) as cursor:
-                if cursor.rowcount > 0:
-                    await db.connection.commit()
-                    logging.info(f"Продукт {data} успешно добавлен")
+                if cursor.rowcount == 0:
+                    return
+                product_id = cursor.lastrowid
 
-        except Exception as e:
-            logging.error(f"Ошибка добавления товара: {e}", exc_info=True)
+            if data.get('tags'):
+                await connection.executemany(
+                    "INSERT OR IGNORE INTO tags (name) VALUES (?)",
+                    [(tag,) for tag in data['tags']]
+                )
+                await connection.execute(
+                    f"""
+                    INSERT OR IGNORE INTO product_tags (product_id, tag_id)
+                    SELECT ?, id FROM tags
+                    WHERE name IN ({', '.join('?' * len(data['tags']))})
+                    """,
+                    (product_id, *data['tags'])
+                )
+            if data.get('photos'):
+                await connection.executemany(
+                    """
+                    INSERT OR IGNORE INTO product_photos
+                        (product_id, width, height, file_id)
+                    VALUES (?, ?, ?, ?)
+                    """,
+                    [(product_id, *photo) for photo in data['photos']]
+                )
+            await connection.commit()
+            media.add(product_id, data.get('photos') or ())
+            logging.info(f"Продукт {data['name']} успешно добавлен")
+
+            async with connection.execute(
+                    "SELECT * FROM products WHERE id = ?",
+                    (product_id,)
+            ) as cursor:
+                catalog.add(Product(*await cursor.fetchone()))
+
+    except Exception as e:
+        logging.error(f"Ошибка добавления товара: {e}", exc_info=True)
 
 
 async def sql_select_products() -> list[tuple]:
@@ -177,125 +472,652 @@ async def sql_select_products() -> list[tuple]:
     Чтение всей таблицы "products". Возвращает все товары в магазине
     (список кортежей).
     """
-    async with db:
-        try:
-            async with db.connection.execute(
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
                     "SELECT * FROM products"
             ) as cursor:
                 return await cursor.fetchall()
 
-        except Exception as e:
-            logging.error(f"Ошибка чтения товаров: {e}", exc_info=True)
-            return []
+    except Exception as e:
+        logging.error(f"Ошибка чтения товаров: {e}", exc_info=True)
+        return []
+
+
+async def sql_select_product_photos() -> list[tuple[int, int, int, str]]:
+    """
+    Чтение таблицы "product_photos". Возвращает размеры фото всех товаров
+    (id товара, ширина, высота, file_id).
+    """
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    """
+                    SELECT product_id, width, height, file_id
+                    FROM product_photos
+                    """
+            ) as cursor:
+                return await cursor.fetchall()
+
+    except Exception as e:
+        logging.error(f"Ошибка чтения фото товаров: {e}", exc_info=True)
+        return []
+
+
+async def sql_count_products() -> int:
+    """
+    Возвращает количество товаров в магазине. Значение берётся из кэша
+    каталога, к БД запрос выполняется, только если кэш не загружен.
+    """
+    if catalog.loaded:
+        return catalog.count
+
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    "SELECT COUNT(*) FROM products"
+            ) as cursor:
+                return (await cursor.fetchone())[0]
+
+    except Exception as e:
+        logging.error(f"Ошибка подсчёта товаров: {e}", exc_info=True)
+        return 0
+
+
+async def sql_select_product_next(product_id: int = 0) -> Product | None:
+    """
+    Принимает id товара. Возвращает товар, следующий за ним по id (keyset
+    пагинация), а после последнего товара - первый. Без аргумента
+    возвращает первый товар. None, если товаров нет.
+    """
+    if catalog.loaded:
+        return catalog.next_after(product_id)
+
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    """
+                    SELECT * FROM products WHERE id > ? ORDER BY id LIMIT 1
+                    """,
+                    (product_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+
+            if row is None:
+                async with connection.execute(
+                        "SELECT * FROM products ORDER BY id LIMIT 1"
+                ) as cursor:
+                    row = await cursor.fetchone()
+
+        return Product(*row) if row else None
+
+    except Exception as e:
+        logging.error(
+            f"Ошибка выборки товара после {product_id}: {e}",
+            exc_info=True
+        )
+
+
+async def sql_select_product_prev(product_id: int) -> Product | None:
+    """
+    Принимает id товара. Возвращает товар, предшествующий ему по id (keyset
+    пагинация), а перед первым товаром - последний. None, если товаров нет.
+    """
+    if catalog.loaded:
+        return catalog.prev_before(product_id)
+
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    """
+                    SELECT * FROM products WHERE id < ?
+                    ORDER BY id DESC LIMIT 1
+                    """,
+                    (product_id,)
+            ) as cursor:
+                row = await cursor.fetchone()
+
+            if row is None:
+                async with connection.execute(
+                        "SELECT * FROM products ORDER BY id DESC LIMIT 1"
+                ) as cursor:
+                    row = await cursor.fetchone()
+
+        return Product(*row) if row else None
+
+    except Exception as e:
+        logging.error(
+            f"Ошибка выборки товара перед {product_id}: {e}",
+            exc_info=True
+        )
 
 
 async def sql_delete_product(product_id: int) -> None:
     """
     Принимает значение id продукта. Выполняет удаление продукта из таблицы
-    "products".
+    "products" (вместе с его фото) и из кэшей каталога и фото.
     """
-    async with db:
-        try:
-            async with db.connection.execute(
+    try:
+        async with pool.writer() as connection:
+            async with connection.execute(
                     "DELETE FROM products WHERE id = ?",
                     (product_id,)
             ) as cursor:
                 if cursor.rowcount > 0:
-                    await db.connection.commit()
+                    await connection.commit()
+                    catalog.remove(int(product_id))
+                    media.remove(int(product_id))
                     logging.info(f"Продукт {product_id} успешно удалён")
 
-        except Exception as e:
-            logging.error(f"Ошибка удаления товара: {e}", exc_info=True)
+    except Exception as e:
+        logging.error(f"Ошибка удаления товара: {e}", exc_info=True)
 
 
-async def sql_add_cart(data: tuple[int, int]) -> None:
+async def sql_add_category(name: str) -> int | None:
     """
-    Принимает кортеж из id пользователя (id берётся из тг) и id товара.
-    Выполняет добавление товара в таблицу "cart".
+    Принимает название категории. Добавляет категорию в таблицу
+    "categories", если её ещё нет, и возвращает её id.
     """
-    async with db:
-        try:
-            async with db.connection.execute(
-                """
-                INSERT OR IGNORE INTO cart (user_id, product_id) VALUES (?, ?)
-                """,
-                data
+    try:
+        async with pool.writer() as connection:
+            async with connection.execute(
+                    "INSERT OR IGNORE INTO categories (name) VALUES (?)",
+                    (name,)
             ) as cursor:
                 if cursor.rowcount > 0:
-                    await db.connection.commit()
-                    logging.info(f"Товар {data} добавлен в корзину")
+                    await connection.commit()
+                    logging.info(f"Добавлена категория: {name}")
+                    return cursor.lastrowid
 
-        except Exception as e:
-            logging.error(
-                f"Ошибка добавления товара в корзину: {e}",
-                exc_info=True
+            async with connection.execute(
+                    "SELECT id FROM categories WHERE name = ?",
+                    (name,)
+            ) as cursor:
+                return (await cursor.fetchone())[0]
+
+    except Exception as e:
+        logging.error(f"Ошибка добавления категории: {e}", exc_info=True)
+
+
+async def sql_select_categories() -> list[tuple[int, str, int]]:
+    """
+    Возвращает категории (id, название, количество товаров) в порядке
+    названия. Категории без товаров не возвращаются.
+    """
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    """
+                    SELECT c.id, c.name, COUNT(*) FROM categories c
+                    JOIN products p ON p.category_id = c.id
+                    GROUP BY c.id ORDER BY c.name
+                    """
+            ) as cursor:
+                return await cursor.fetchall()
+
+    except Exception as e:
+        logging.error(f"Ошибка чтения категорий: {e}", exc_info=True)
+        return []
+
+
+async def sql_select_tag_id(name: str) -> int | None:
+    """Принимает название тега. Возвращает id тега или None."""
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    "SELECT id FROM tags WHERE name = ?",
+                    (name,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                return row[0] if row else None
+
+    except Exception as e:
+        logging.error(f"Ошибка чтения тега {name!r}: {e}", exc_info=True)
+
+
+"""
+Ключ keyset-пагинации для ProductFilter.sort: столбцы порядка (id -
+последний, он делает ключ уникальным) и признак порядка по убыванию
+"""
+PRODUCT_KEYSET = {
+    SORT_ID: (('id',), False),
+    SORT_PRICE: (('price', 'id'), False),
+    SORT_PRICE_DESC: (('price', 'id'), True),
+}
+
+"""Кэш количества товаров по фильтрам: (версия каталога, поля) -> число"""
+filter_counts: OrderedDict[tuple, int] = OrderedDict()
+FILTER_COUNTS_SIZE = 1024
+
+
+def product_filter_sql(
+        product_filter: ProductFilter
+) -> tuple[str, list[int]]:
+    """
+    Переводит фильтр каталога в условие WHERE с параметрами для выборки из
+    таблицы "products" (псевдоним p).
+    """
+    conditions, params = [], []
+    if product_filter.category_id:
+        conditions.append('p.category_id = ?')
+        params.append(product_filter.category_id)
+    if product_filter.tag_id:
+        conditions.append(
+            'EXISTS (SELECT 1 FROM product_tags t '
+            'WHERE t.product_id = p.id AND t.tag_id = ?)'
+        )
+        params.append(product_filter.tag_id)
+    if product_filter.min_price:
+        conditions.append('p.price >= ?')
+        params.append(product_filter.min_price)
+    if product_filter.max_price:
+        conditions.append('p.price <= ?')
+        params.append(product_filter.max_price)
+
+    return ' AND '.join(conditions) or '1', params
+
+
+def product_keyset_sql(sort: int, backward: bool = False) -> tuple[str, str]:
+    """
+    Условие "после товара с id ?" и выражение ORDER BY для keyset-пагинации
+    в порядке sort (backward=True - в обратную сторону). Значения столбцов
+    порядка берутся из строки товара по первичному ключу, поэтому кнопкам
+    достаточно передавать id.
+    """
+    columns, descending = PRODUCT_KEYSET.get(sort, PRODUCT_KEYSET[SORT_ID])
+    descending ^= backward
+    key = ', '.join(f'p.{column}' for column in columns)
+    after = (f"({key}) {'<' if descending else '>'} "
+             f"(SELECT {', '.join(columns)} FROM products WHERE id = ?)")
+    order = ', '.join(f"p.{column}{' DESC' if descending else ''}"
+                      for column in columns)
+    return after, order
+
+
+async def sql_count_products_filtered(product_filter: ProductFilter) -> int:
+    """
+    Принимает фильтр каталога. Возвращает количество подходящих товаров.
+    Значение кэшируется до следующего изменения каталога.
+    """
+    key = (catalog.version, *product_filter.fields())
+    count = filter_counts.get(key)
+    if count is not None:
+        filter_counts.move_to_end(key)
+        return count
+
+    where, params = product_filter_sql(product_filter)
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    f"SELECT COUNT(*) FROM products p WHERE {where}",
+                    params
+            ) as cursor:
+                count = filter_counts[key] = (await cursor.fetchone())[0]
+        if len(filter_counts) > FILTER_COUNTS_SIZE:
+            filter_counts.popitem(last=False)
+        return count
+
+    except Exception as e:
+        logging.error(
+            f"Ошибка подсчёта товаров по фильтру {product_filter}: {e}",
+            exc_info=True
+        )
+        return 0
+
+
+async def sql_select_product_filtered(
+        product_filter: ProductFilter,
+        product_id: int = 0,
+        backward: bool = False
+) -> Product | None:
+    """
+    Принимает фильтр каталога и id текущего товара. Возвращает товар,
+    следующий за ним в порядке фильтра (при backward=True - предыдущий),
+    keyset-пагинацией по индексам категории, тега и цены. После последнего
+    товара (или без product_id) возвращается первый, перед первым -
+    последний. None, если под фильтр ничего не подходит.
+    """
+    where, params = product_filter_sql(product_filter)
+    after, order = product_keyset_sql(product_filter.sort, backward)
+    try:
+        async with pool.reader() as connection:
+            row = None
+            if product_id:
+                async with connection.execute(
+                        f"""
+                        SELECT p.* FROM products p WHERE {where} AND {after}
+                        ORDER BY {order} LIMIT 1
+                        """,
+                        (*params, product_id)
+                ) as cursor:
+                    row = await cursor.fetchone()
+
+            if row is None:
+                async with connection.execute(
+                        f"""
+                        SELECT p.* FROM products p WHERE {where}
+                        ORDER BY {order} LIMIT 1
+                        """,
+                        params
+                ) as cursor:
+                    row = await cursor.fetchone()
+
+        return Product(*row) if row else None
+
+    except Exception as e:
+        logging.error(
+            f"Ошибка выборки товаров по фильтру {product_filter}: {e}",
+            exc_info=True
+        )
+        return None
+
+
+def search_query(text: str, max_terms: int = 8) -> str:
+    """
+    Переводит текст пользователя в запрос FTS5: каждое слово ищется как
+    префикс ("чай"* найдёт "чайник"), все слова должны встретиться в
+    названии или описании. Спецсимволы синтаксиса FTS5 отбрасываются.
+    """
+    terms = re.findall(r'\w+', text.lower())[:max_terms]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+async def sql_search_products(
+        text: str,
+        limit: int = 5,
+        offset: int = 0
+) -> tuple[int, list[Product]]:
+    """
+    Принимает строку поиска, размер и смещение страницы. Ищет товары по
+    названию и описанию в полнотекстовом индексе "products_fts" и
+    возвращает общее число найденных товаров и страницу товаров,
+    упорядоченных по релевантности (bm25).
+    """
+    query = search_query(text)
+    if not query:
+        return 0, []
+
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    "SELECT COUNT(*) FROM products_fts WHERE products_fts "
+                    "MATCH ?",
+                    (query,)
+            ) as cursor:
+                total = (await cursor.fetchone())[0]
+            if total <= offset:
+                return total, []
+
+            async with connection.execute(
+                    """
+                    SELECT p.* FROM products_fts f
+                    JOIN products p ON p.id = f.rowid
+                    WHERE products_fts MATCH ?
+                    ORDER BY f.rank LIMIT ? OFFSET ?
+                    """,
+                    (query, limit, offset)
+            ) as cursor:
+                return total, [Product(*row)
+                               for row in await cursor.fetchall()]
+
+    except Exception as e:
+        logging.error(f"Ошибка поиска товаров по запросу {text!r}: {e}",
+                      exc_info=True)
+        return 0, []
+
+
+async def sql_apply_cart_changes(
+        changes: list[tuple[int, int, int]],
+        deletions: list[tuple[int, int]] | None = None
+) -> bool:
+    """
+    Принимает список изменений корзины (id пользователя, id товара,
+    изменение количества) и применяет их одной транзакцией. Позиции из
+    deletions (id пользователя, id товара) предварительно удаляются целиком.
+    Позиции, у которых количество стало нулевым или отрицательным,
+    удаляются. Изменения пользователей, которых нет в таблице "users", и
+    товаров, которых уже нет в "products", пропускаются, чтобы одна такая
+    позиция не откатывала всю пачку. Возвращает False, если транзакция не
+    применилась (изменения нужно повторить).
+    """
+    if not changes and not deletions:
+        return True
+
+    try:
+        async with pool.writer() as connection:
+            if deletions:
+                await connection.executemany(
+                    "DELETE FROM cart WHERE user_id = ? AND product_id = ?",
+                    deletions
+                )
+            applied = connection.total_changes
+            await connection.executemany(
+                """
+                INSERT INTO cart (user_id, product_id, quantity)
+                SELECT ?1, ?2, ?3
+                WHERE EXISTS (SELECT 1 FROM users WHERE user_id = ?1)
+                  AND EXISTS (SELECT 1 FROM products WHERE id = ?2)
+                ON CONFLICT(user_id, product_id) DO UPDATE SET
+                    quantity = quantity + excluded.quantity
+                """,
+                changes
             )
+            applied = connection.total_changes - applied
+            await connection.executemany(
+                """
+                DELETE FROM cart
+                WHERE user_id = ? AND product_id = ? AND quantity <= 0
+                """,
+                [(user_id, product_id) for user_id, product_id, _ in changes]
+            )
+            await connection.commit()
+            logging.info(
+                f"Изменения корзины применены: {applied} изменений, "
+                f"{len(deletions or [])} удалений"
+            )
+            if applied < len(changes):
+                logging.warning(
+                    f"Пропущено изменений корзины без пользователя или "
+                    f"товара: {len(changes) - applied}"
+                )
+        return True
 
+    except Exception as e:
+        logging.error(
+            f"Ошибка изменения корзины: {e}",
+            exc_info=True
+        )
+        return False
 
-async def sql_select_cart_user(user_id: int) -> list[tuple[int, int]]:
+
+CART_LINE_QUERY = """
+    SELECT p.id, p.name, p.description, p.price, p.img, c.quantity
+    FROM cart c JOIN products p ON p.id = c.product_id
+"""
+
+
+async def sql_select_cart_lines(user_id: int) -> list[tuple]:
     """
-    Принимает id пользователя (id берётся из тг). Осуществляет выборку по
-    user_id из таблицы "cart". Возвращает список кортежей.
+    Принимает id пользователя (id берётся из тг). Возвращает корзину
+    пользователя одним запросом: список позиций (id товара, название,
+    описание, цена, изображение, количество).
     """
-    async with db:
-        try:
-            async with db.connection.execute(
-                    "SELECT id, product_id FROM cart WHERE user_id = ?",
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    f"""
+                    {CART_LINE_QUERY}
+                    WHERE c.user_id = ? ORDER BY c.product_id
+                    """,
                     (user_id,)
             ) as cursor:
                 return await cursor.fetchall()
 
-        except Exception as e:
-            logging.error(
-                f"Ошибка выборки товаров из корзины пользователя "
-                f"{user_id}: {e}",
-                exc_info=True
-            )
+    except Exception as e:
+        logging.error(
+            f"Ошибка выборки товаров из корзины пользователя "
+            f"{user_id}: {e}",
+            exc_info=True
+        )
+        return []
 
 
-async def sql_select_products_id(
-        product_id: int
-) -> tuple[int, str | None, str, str | None, int] | None:
+async def sql_select_cart_line(user_id: int, product_id: int) -> tuple | None:
     """
-    Принимает id продукта в таблице "products". Осуществляет выборку по id
-    из таблицы "products". Возвращает один конкретный товар, в форме кортежа
-    или None если запись не найдена.
+    Принимает id пользователя и id товара. Возвращает позицию корзины (в
+    формате sql_select_cart_lines) или None, если товара в корзине нет.
     """
-    async with db:
-        try:
-            async with db.connection.execute(
-                    "SELECT * FROM products WHERE id = ?",
-                    (product_id,)
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    f"""
+                    {CART_LINE_QUERY}
+                    WHERE c.user_id = ? AND c.product_id = ?
+                    """,
+                    (user_id, product_id)
             ) as cursor:
                 return await cursor.fetchone()
 
-        except Exception as e:
-            logging.error(
-                f"Ошибка выборки товара {product_id} из магазина: {e}",
-                exc_info=True
-            )
+    except Exception as e:
+        logging.error(
+            f"Ошибка выборки корзины пользователя {user_id}: {e}",
+            exc_info=True
+        )
 
 
-async def sql_delete_cart(cart_id: int) -> None:
+async def sql_count_cart(user_id: int) -> int:
     """
-    Принимает id (id из корзины) продукта в корзине. Удаление строки (продукта)
-    из таблицы 'cart'. Удаляет позицию из корзины по id записи в корзине.
+    Принимает id пользователя (id из тг). Возвращает количество позиций
+    (разных товаров) в корзине пользователя.
     """
-    async with db:
-        try:
-            async with db.connection.execute(
-                    "DELETE FROM cart WHERE id = ?",
-                    (cart_id,)
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    "SELECT COUNT(*) FROM cart WHERE user_id = ?",
+                    (user_id,)
             ) as cursor:
-                if cursor.rowcount > 0:
-                    await db.connection.commit()
-                    logging.info(f"Товар удалён из корзины")
+                return (await cursor.fetchone())[0]
 
-        except Exception as e:
-            logging.error(
-                f"Ошибка удаления товара из корзины: {e}",
-                exc_info=True
-            )
+    except Exception as e:
+        logging.error(
+            f"Ошибка подсчёта корзины пользователя {user_id}: {e}",
+            exc_info=True
+        )
+        return 0
+
+
+async def sql_select_cart_next(
+        user_id: int,
+        product_id: int = 0
+) -> tuple | None:
+    """
+    Принимает id пользователя и id товара. Возвращает следующую по id товара
+    позицию корзины пользователя (в формате sql_select_cart_lines), а после
+    последней - первую. Без product_id возвращает первую позицию. None, если
+    корзина пуста.
+    """
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    f"""
+                    {CART_LINE_QUERY}
+                    WHERE c.user_id = ? AND c.product_id > ?
+                    ORDER BY c.product_id LIMIT 1
+                    """,
+                    (user_id, product_id)
+            ) as cursor:
+                row = await cursor.fetchone()
+
+            if row is None:
+                async with connection.execute(
+                        f"""
+                        {CART_LINE_QUERY}
+                        WHERE c.user_id = ?
+                        ORDER BY c.product_id LIMIT 1
+                        """,
+                        (user_id,)
+                ) as cursor:
+                    row = await cursor.fetchone()
+
+        return row
+
+    except Exception as e:
+        logging.error(
+            f"Ошибка выборки корзины пользователя {user_id}: {e}",
+            exc_info=True
+        )
+
+
+async def sql_select_cart_prev(
+        user_id: int,
+        product_id: int
+) -> tuple | None:
+    """
+    Принимает id пользователя и id товара. Возвращает предыдущую по id товара
+    позицию корзины пользователя (в формате sql_select_cart_lines), а перед
+    первой - последнюю. None, если корзина пуста.
+    """
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    f"""
+                    {CART_LINE_QUERY}
+                    WHERE c.user_id = ? AND c.product_id < ?
+                    ORDER BY c.product_id DESC LIMIT 1
+                    """,
+                    (user_id, product_id)
+            ) as cursor:
+                row = await cursor.fetchone()
+
+            if row is None:
+                async with connection.execute(
+                        f"""
+                        {CART_LINE_QUERY}
+                        WHERE c.user_id = ?
+                        ORDER BY c.product_id DESC LIMIT 1
+                        """,
+                        (user_id,)
+                ) as cursor:
+                    row = await cursor.fetchone()
+
+        return row
+
+    except Exception as e:
+        logging.error(
+            f"Ошибка выборки корзины пользователя {user_id}: {e}",
+            exc_info=True
+        )
+
+
+async def sql_select_products_id(
+        product_id: int
+) -> tuple[int, str | None, str, str | None, int, int | None] | None:
+    """
+    Принимает id продукта в таблице "products". Осуществляет выборку по id
+    из таблицы "products". Возвращает один конкретный товар, в форме кортежа
+    или None если запись не найдена. Если кэш каталога загружен, товар
+    берётся из него.
+    """
+    if catalog.loaded:
+        product = catalog.get(product_id)
+        if product is None:
+            return None
+        return (product.id, product.img, product.name, product.description,
+                product.price, product.category_id)
+
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    "SELECT * FROM products WHERE id = ?",
+                    (product_id,)
+            ) as cursor:
+                return await cursor.fetchone()
+
+    except Exception as e:
+        logging.error(
+            f"Ошибка выборки товара {product_id} из магазина: {e}",
+            exc_info=True
+        )
 
 
 async def sql_delete_all_cart(user_id: int) -> None:
@@ -303,43 +1125,305 @@ async def sql_delete_all_cart(user_id: int) -> None:
     Принимает id пользователя (id из тг). Удаление всех строк (очистка
     корзины) из таблицы "cart".
     """
-    async with db:
-        try:
-            async with db.connection.execute(
+    try:
+        async with pool.writer() as connection:
+            async with connection.execute(
                     "DELETE FROM cart WHERE user_id = ?",
                     (user_id,)
             ) as cursor:
                 if cursor.rowcount > 0:
-                    await db.connection.commit()
+                    await connection.commit()
                     logging.info(f"Корзина {user_id} успешно очищена")
 
-        except Exception as e:
-            logging.error(
-                f"Ошибка очистки корзины {user_id}: {e}",
-                exc_info=True
+    except Exception as e:
+        logging.error(
+            f"Ошибка очистки корзины {user_id}: {e}",
+            exc_info=True
+        )
+
+
+ORDER_COLUMNS = (
+    'user_id', 'order_id', 'created_at', 'currency', 'total_amount',
+    'invoice_payload', 'shipping_option_id', 'first_name', 'last_name',
+    'username', 'name', 'phone_number', 'email', 'country_code', 'state',
+    'city', 'street_line1', 'street_line2', 'post_code',
+)
+
+
+async def sql_add_order(
+        order: dict[str, str | int | None],
+        items: list[tuple[int, int, int]]
+) -> None:
+    """
+    Принимает словарь с данными заказа (ключи - столбцы таблицы "orders") и
+    список позиций (id товара, количество, цена за единицу в копейках).
+    Добавляет заказ в таблицу "orders" и позиции в "order_items" одной
+    транзакцией. При ошибке транзакция откатывается и вызывается
+    RuntimeError: заказ, не записанный в БД, нельзя оплачивать.
+    """
+    columns = [column for column in ORDER_COLUMNS if column in order]
+    try:
+        async with pool.writer() as connection:
+            async with connection.execute(
+                f"""
+                INSERT OR IGNORE INTO orders ({', '.join(columns)})
+                VALUES ({', '.join('?' * len(columns))})
+                """,
+                [order[column] for column in columns]
+            ) as cursor:
+                if cursor.rowcount == 0:
+                    return
+
+            await connection.executemany(
+                """
+                INSERT INTO order_items
+                    (order_id, product_id, quantity, unit_price)
+                VALUES (?, ?, ?, ?)
+                """,
+                [(order['order_id'], *item) for item in items]
             )
+            await connection.commit()
+            logging.info(f"Заказ успешно добавлен")
+
+    except Exception as e:
+        logging.error(
+            f"Ошибка добавления заказа: {e}",
+            exc_info=True
+        )
+        raise RuntimeError(f"Ошибка добавления заказа: {e}") from e
 
 
-async def sql_add_order(data: tuple[int, int, str]) -> None:
+async def sql_iter_orders(
+        chunk_size: int = 1000
+) -> AsyncIterator[list[tuple]]:
     """
-    Принимает кортеж содержащий id клиента, id заказа и информацию по
-    заказу. Добавление заказа в таблицу "orders".
+    Читает таблицу "orders" порциями по chunk_size строк (столбцы
+    ORDER_COLUMNS, по возрастанию id). Вся таблица в память не загружается.
     """
-    async with db:
-        try:
-            async with db.connection.execute(
+    async with pool.reader() as connection:
+        async with connection.execute(
+                f"SELECT {', '.join(ORDER_COLUMNS)} FROM orders ORDER BY id"
+        ) as cursor:
+            while rows := await cursor.fetchmany(chunk_size):
+                yield rows
+
+
+async def sql_sales_report(
+        since: int | None = None,
+        top: int = 10
+) -> dict[str, list[tuple]]:
+    """
+    Принимает время начала периода (unix time, None - за всё время) и
+    размер топа товаров. Возвращает отчёт о продажах, посчитанный в SQL:
+    "totals" - число заказов и выручка по валютам, "days" - заказы и
+    выручка по дням, "products" - самые продаваемые товары (id, название,
+    количество, выручка в копейках). Условие на период добавляется только
+    при заданном since: так выборка идёт по индексу idx_orders_created, а
+    итоги за всё время учитывают и старые заказы без created_at. CROSS JOIN
+    фиксирует порядок соединения (сначала заказы периода, затем их
+    позиции), без статистики планировщик иначе перебирает все позиции.
+    """
+    since = since or 0
+    period, period_params = '', ()
+    if since:
+        period, period_params = "WHERE o.created_at >= ?", (since,)
+    report = {}
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    f"""
+                    SELECT currency, COUNT(*), SUM(total_amount) FROM orders o
+                    {period}
+                    GROUP BY currency ORDER BY 3 DESC
+                    """,
+                    period_params
+            ) as cursor:
+                report['totals'] = await cursor.fetchall()
+
+            async with connection.execute(
+                    """
+                    SELECT date(created_at, 'unixepoch') AS day, COUNT(*),
+                           SUM(total_amount)
+                    FROM orders WHERE created_at >= ?
+                    GROUP BY day ORDER BY day
+                    """,
+                    (since,)
+            ) as cursor:
+                report['days'] = await cursor.fetchall()
+
+            async with connection.execute(
+                    f"""
+                    SELECT i.product_id, p.name, SUM(i.quantity),
+                           SUM(i.quantity * i.unit_price)
+                    FROM orders o
+                    CROSS JOIN order_items i ON i.order_id = o.order_id
+                    LEFT JOIN products p ON p.id = i.product_id
+                    {period}
+                    GROUP BY i.product_id ORDER BY 3 DESC LIMIT ?
+                    """,
+                    (*period_params, top)
+            ) as cursor:
+                report['products'] = await cursor.fetchall()
+
+    except Exception as e:
+        logging.error(f"Ошибка построения отчёта о продажах: {e}",
+                      exc_info=True)
+    return report
+
+
+async def sql_add_broadcast(chat_id: int, text: str) -> int | None:
+    """
+    Принимает id чата администратора и текст рассылки. Добавляет рассылку
+    в таблицу "broadcasts" и возвращает её id.
+    """
+    try:
+        async with pool.writer() as connection:
+            async with connection.execute(
+                    """
+                    INSERT INTO broadcasts (chat_id, text, created_at)
+                    VALUES (?, ?, strftime('%s', 'now'))
+                    """,
+                    (chat_id, text)
+            ) as cursor:
+                await connection.commit()
+                logging.info(f"Создана рассылка {cursor.lastrowid}")
+                return cursor.lastrowid
+
+    except Exception as e:
+        logging.error(f"Ошибка создания рассылки: {e}", exc_info=True)
+
+
+async def sql_select_unfinished_broadcasts() -> list[tuple[int, int, str]]:
+    """
+    Возвращает незавершённые рассылки (id, чат администратора, текст),
+    например прерванные остановкой бота.
+    """
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    """
+                    SELECT id, chat_id, text FROM broadcasts
+                    WHERE finished_at IS NULL ORDER BY id
+                    """
+            ) as cursor:
+                return await cursor.fetchall()
+
+    except Exception as e:
+        logging.error(f"Ошибка выборки рассылок: {e}", exc_info=True)
+        return []
+
+
+async def sql_select_broadcast_recipients(
+        broadcast_id: int,
+        after_user_id: int = 0,
+        limit: int = 200
+) -> list[int]:
+    """
+    Принимает id рассылки и id пользователя. Возвращает до limit следующих
+    по id пользователей из таблицы "users", которым рассылка ещё не
+    доставлялась (keyset пагинация по after_user_id).
+    """
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    """
+                    SELECT u.user_id FROM users u
+                    WHERE u.user_id > ? AND NOT EXISTS (
+                        SELECT 1 FROM broadcast_deliveries d
+                        WHERE d.broadcast_id = ? AND d.user_id = u.user_id
+                    )
+                    ORDER BY u.user_id LIMIT ?
+                    """,
+                    (after_user_id, broadcast_id, limit)
+            ) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
+
+    except Exception as e:
+        logging.error(
+            f"Ошибка выборки получателей рассылки {broadcast_id}: {e}",
+            exc_info=True
+        )
+        return []
+
+
+async def sql_count_broadcast(broadcast_id: int) -> dict[str, int]:
+    """
+    Принимает id рассылки. Возвращает число пользователей ("total") и число
+    доставок рассылки по статусам.
+    """
+    try:
+        async with pool.reader() as connection:
+            async with connection.execute(
+                    "SELECT COUNT(*) FROM users"
+            ) as cursor:
+                counts = {'total': (await cursor.fetchone())[0]}
+            async with connection.execute(
+                    """
+                    SELECT status, COUNT(*) FROM broadcast_deliveries
+                    WHERE broadcast_id = ? GROUP BY status
+                    """,
+                    (broadcast_id,)
+            ) as cursor:
+                counts.update(await cursor.fetchall())
+            return counts
+
+    except Exception as e:
+        logging.error(
+            f"Ошибка подсчёта рассылки {broadcast_id}: {e}",
+            exc_info=True
+        )
+        return {'total': 0}
+
+
+async def sql_add_broadcast_deliveries(
+        broadcast_id: int,
+        deliveries: list[tuple[int, str]]
+) -> None:
+    """
+    Принимает id рассылки и список (id пользователя, статус доставки).
+    Записывает статусы в таблицу "broadcast_deliveries" одной транзакцией.
+    """
+    if not deliveries:
+        return
+
+    try:
+        async with pool.writer() as connection:
+            await connection.executemany(
                 """
-                INSERT OR IGNORE INTO orders (user_id, order_id, order_info) 
+                INSERT OR REPLACE INTO broadcast_deliveries
+                    (broadcast_id, user_id, status)
                 VALUES (?, ?, ?)
                 """,
-                data
-            ) as cursor:
-                if cursor.rowcount > 0:
-                    await db.connection.commit()
-                    logging.info(f"Заказ успешно добавлен")
+                [(broadcast_id, *delivery) for delivery in deliveries]
+            )
+            await connection.commit()
 
-        except Exception as e:
-            logging.error(
-                f"Ошибка добавления заказа: {e}",
-                exc_info=True
+    except Exception as e:
+        logging.error(
+            f"Ошибка записи доставок рассылки {broadcast_id}: {e}",
+            exc_info=True
+        )
+
+
+async def sql_finish_broadcast(broadcast_id: int) -> None:
+    """Принимает id рассылки и отмечает её завершённой."""
+    try:
+        async with pool.writer() as connection:
+            await connection.execute(
+                """
+                UPDATE broadcasts SET finished_at = strftime('%s', 'now')
+                WHERE id = ?
+                """,
+                (broadcast_id,)
             )
+            await connection.commit()
+            logging.info(f"Рассылка {broadcast_id} завершена")
+
+    except Exception as e:
+        logging.error(
+            f"Ошибка завершения рассылки {broadcast_id}: {e}",
+            exc_info=True
+        )
+
+
+instrument(globals(), metrics)
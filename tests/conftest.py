@@ -0,0 +1,4 @@
+import os
+
+for _name in ('BOT_TOKEN', 'CREATOR_ID', 'GROUP_ID', 'PAY_TOKEN', 'PROXY'):
+    os.environ.setdefault(_name, '1:test' if _name == 'BOT_TOKEN' else '0')
@@ -0,0 +1,154 @@
+import asyncio
+import time
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from core.utils.fsm_storage import create_storage
+
+
+KEY = StorageKey(bot_id=1, chat_id=2, user_id=2)
+OTHER_KEY = StorageKey(bot_id=1, chat_id=3, user_id=3)
+
+
+class FakeRedis:
+    """
+    Минимальный сервер протокола Redis (RESP2) в процессе теста: SET с
+    опцией EX, GET и DEL. На остальные команды (CLIENT SETINFO и т.п.)
+    отвечает +OK.
+    """
+    def __init__(self) -> None:
+        self.values: dict[bytes, tuple[bytes, float | None]] = {}
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self) -> str:
+        """Запускает сервер, возвращает URL для подключения."""
+        self._server = await asyncio.start_server(self._serve,
+                                                  '127.0.0.1', 0)
+        port = self._server.sockets[0].getsockname()[1]
+        return f'redis://127.0.0.1:{port}/0'
+
+    async def close(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader,
+                     writer: asyncio.StreamWriter) -> None:
+        try:
+            while (command := await self._read_command(reader)) is not None:
+                writer.write(self._execute(command))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> list | None:
+        """Читает команду - массив bulk-строк."""
+        line = await reader.readline()
+        if not line:
+            return None
+        arguments = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            arguments.append((await reader.readexactly(size + 2))[:-2])
+        return arguments
+
+    def _execute(self, command: list[bytes]) -> bytes:
+        name = command[0].upper()
+        if name == b'SET':
+            expires_at = None
+            if len(command) > 4 and command[3].upper() == b'EX':
+                expires_at = time.monotonic() + int(command[4])
+            self.values[command[1]] = (command[2], expires_at)
+            return b'+OK\r\n'
+        if name == b'GET':
+            value = self._get(command[1])
+            if value is None:
+                return b'$-1\r\n'
+            return b'$%d\r\n%s\r\n' % (len(value), value)
+        if name == b'DEL':
+            deleted = sum(self._get(key) is not None for key in command[1:])
+            for key in command[1:]:
+                self.values.pop(key, None)
+            return b':%d\r\n' % deleted
+        return b'+OK\r\n'
+
+    def _get(self, key: bytes) -> bytes | None:
+        value, expires_at = self.values.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.values[key]
+            return None
+        return value
+
+
+async def fill(storage) -> None:
+    """Записывает состояние и данные диалога и проверяет их чтение."""
+    await storage.set_state(KEY, 'FSMAdmin:name')
+    await storage.set_data(KEY, {'photo': 'file-id'})
+    assert await storage.get_state(KEY) == 'FSMAdmin:name'
+    assert await storage.get_data(KEY) == {'photo': 'file-id'}
+
+
+def test_redis_storage_expires_dialogs():
+    pytest.importorskip('redis')
+
+    async def scenario():
+        server = FakeRedis()
+        storage = await create_storage('redis', ttl=1,
+                                       redis_url=await server.start())
+        try:
+            await fill(storage)
+            await storage.set_state(OTHER_KEY, 'FSMAdmin:price')
+            await storage.set_state(OTHER_KEY, None)
+            assert await storage.get_state(OTHER_KEY) is None
+
+            await asyncio.sleep(1.1)
+            assert await storage.get_state(KEY) is None
+            assert await storage.get_data(KEY) == {}
+            assert server.values == {}
+        finally:
+            await storage.close()
+            await server.close()
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_storage_expires_dialogs(tmp_path):
+    async def scenario():
+        storage = await create_storage('sqlite', ttl=0.2,
+                                       db_path=str(tmp_path / 'fsm.db'))
+        try:
+            await fill(storage)
+            await storage.set_data(OTHER_KEY, {'name': 'x'})
+            await storage.set_data(OTHER_KEY, {})
+            assert await storage.get_data(OTHER_KEY) == {}
+
+            await asyncio.sleep(0.3)
+            assert await storage.get_state(KEY) is None
+            assert await storage.get_data(KEY) == {}
+
+            await storage.purge()
+            async with storage.database.connection.execute(
+                    "SELECT COUNT(*) FROM fsm_storage"
+            ) as cursor:
+                assert await cursor.fetchone() == (0,)
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
+
+
+def test_memory_storage_purges_abandoned_dialogs():
+    async def scenario():
+        storage = await create_storage('memory', ttl=0.2)
+        storage.purge_interval = 0
+        await fill(storage)
+
+        await asyncio.sleep(0.3)
+        await storage.set_state(OTHER_KEY, 'FSMAdmin:price')
+        assert await storage.get_state(KEY) is None
+        assert await storage.get_data(KEY) == {}
+        assert await storage.get_state(OTHER_KEY) == 'FSMAdmin:price'
+        assert list(storage.storage) == [OTHER_KEY]
+
+    asyncio.run(scenario())
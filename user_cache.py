@@ -0,0 +1,92 @@
+import asyncio
+import logging
+
+import sqlite_db
+from config import config
+
+
+class KnownUsers:
+    """
+    Кэш известных пользователей перед таблицей "users". При старте бота в
+    него загружаются id последних max_size пользователей, и повторные
+    /start известных пользователей к БД не обращаются. Новые пользователи
+    копятся в памяти и раз в window секунд добавляются в таблицу одной
+    транзакцией многострочными INSERT. При переполнении из кэша вытесняется
+    произвольный id - для такого пользователя будет лишь лишний
+    INSERT OR IGNORE.
+
+    :ivar window: Окно накопления новых пользователей в секундах
+    :ivar max_size: Наибольшее количество id в кэше
+    """
+    def __init__(self, window: float = 1.0, max_size: int = 1_000_000) -> None:
+        self.window = window
+        self.max_size = max_size
+        self._known: set[int] = set()
+        self._pending: dict[int, str] = {}
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.Task | None = None
+
+    @property
+    def pending(self) -> int:
+        """Количество новых пользователей, ещё не записанных в БД."""
+        return len(self._pending)
+
+    async def warm(self) -> None:
+        """Загружает id пользователей из БД в кэш."""
+        self._known.update(await sqlite_db.sql_select_user_ids(self.max_size))
+        logging.info(f"Кэш пользователей загружен: {len(self._known)} id")
+
+    def add(self, user_id: int, name: str) -> bool:
+        """
+        Регистрирует пользователя (запись в БД отложенная). Возвращает
+        True, если пользователя не было в кэше.
+        """
+        if user_id in self._known:
+            return False
+        if len(self._known) >= self.max_size:
+            self._known.pop()
+        self._known.add(user_id)
+        self._pending[user_id] = name
+        self._schedule()
+        return True
+
+    async def flush(self) -> bool:
+        """
+        Записывает накопленных новых пользователей в БД. Если запись не
+        удалась, пользователи возвращаются в очередь и запись повторяется
+        позже. Возвращает False при неудачной записи.
+        """
+        if not self._pending:
+            return True
+        async with self._lock:
+            pending, self._pending = self._pending, {}
+            if await sqlite_db.sql_add_users(list(pending.items())):
+                return True
+            self._pending = {**pending, **self._pending}
+            self._schedule()
+            return False
+
+    async def close(self) -> None:
+        """Останавливает таймер и записывает всех новых пользователей."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
+
+    def _schedule(self) -> None:
+        """Запускает отложенную запись, если она ещё не запланирована."""
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        """Записывает пользователей по истечении окна накопления."""
+        await asyncio.sleep(self.window)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logging.error(f"Ошибка записи новых пользователей: {e}",
+                          exc_info=True)
+
+
+known_users = KnownUsers(config.user_flush_window, config.user_cache_size)